@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+# benchmark_merge_regions.py
+"""Time the region merger in filter_epitopes.py on synthetic region tables."""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+from filter_epitopes import merge_overlapping_regions
+
+
+def synthetic_regions(n_regions, protein_length, seed=0):
+    """Random epitope regions scattered along a protein of the given length"""
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(1, protein_length, n_regions)
+    ends = starts + rng.integers(8, 30, n_regions)
+    return pd.DataFrame({
+        'region_id': np.arange(1, n_regions + 1),
+        'start': starts,
+        'end': ends,
+        'length': ends - starts + 1,
+        'b_cell_score': rng.random(n_regions),
+        'mhc_i_score': rng.random(n_regions),
+        'mhc_ii_score': rng.random(n_regions),
+        'combined_score': rng.random(n_regions),
+        'b_cell_count': 1,
+        'mhc_i_count': rng.integers(0, 5, n_regions),
+        'mhc_ii_count': rng.integers(0, 5, n_regions),
+        'protein_type': 'synthetic'
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark overlapping-region merging')
+    parser.add_argument('--regions', type=int, default=100000, help='Number of synthetic regions')
+    parser.add_argument('--protein-length', type=int, default=10000000,
+                        help='Span the regions are scattered over (larger = fewer overlaps)')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of timed runs')
+    args = parser.parse_args()
+
+    regions_df = synthetic_regions(args.regions, args.protein_length)
+
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        merged = merge_overlapping_regions(regions_df)
+        timings.append(time.perf_counter() - start)
+
+    print(f"Merged {len(regions_df)} regions into {len(merged)} in "
+          f"{min(timings):.3f} s (best of {args.repeats})")
+
+
+if __name__ == "__main__":
+    main()
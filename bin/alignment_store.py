@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+# alignment_store.py
+"""Compact memory-mapped alignment store: an N x L byte matrix plus a JSON sidecar index."""
+
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+from Bio import AlignIO, SeqIO
+
+STORE_VERSION = 2
+
+
+def store_paths(prefix, matrix_name=None):
+    """Paths of the byte matrix and sidecar index for a store prefix.
+
+    Each build writes its matrix under a content-addressed name recorded in the index; stores
+    written before that use <prefix>.u8.
+    """
+    matrix_path = os.path.join(os.path.dirname(prefix), matrix_name) if matrix_name else f"{prefix}.u8"
+    return matrix_path, f"{prefix}.json"
+
+
+def source_fingerprint(path):
+    """Cheap identity of a source alignment file (path, size, mtime) used to detect stale stores"""
+    stat = os.stat(path)
+    identity = f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+def iter_records(alignment_path, fmt='fasta'):
+    """Yield alignment records; FASTA is streamed, other formats go through AlignIO"""
+    if fmt == 'fasta':
+        return SeqIO.parse(alignment_path, 'fasta')
+    return iter(AlignIO.read(alignment_path, fmt))
+
+
+def build_store(alignment_path, prefix, fmt='fasta'):
+    """Convert a FASTA/CLUSTAL/... alignment into a memory-mappable store, one record at a time"""
+    _, index_path = store_paths(prefix)
+    directory = os.path.dirname(os.path.abspath(index_path))
+    os.makedirs(directory, exist_ok=True)
+
+    # Stream records straight to disk so the SeqRecord list is never held in memory
+    ids = []
+    length = None
+    digest = hashlib.sha256()
+    tmp_matrix = f"{prefix}.u8.tmp.{os.getpid()}"
+    with open(tmp_matrix, 'wb') as out:
+        for record in iter_records(alignment_path, fmt):
+            row = str(record.seq).encode('ascii', 'replace')
+            if length is None:
+                length = len(row)
+            elif len(row) != length:
+                os.remove(tmp_matrix)
+                raise ValueError(f"Record {record.id} has length {len(row)}, expected {length}")
+            out.write(row)
+            digest.update(row)
+            ids.append(record.id)
+
+    index = {
+        'version': STORE_VERSION,
+        'n_sequences': len(ids),
+        'alignment_length': length or 0,
+        'ids': ids,
+        'matrix': f"{os.path.basename(prefix)}.{digest.hexdigest()[:16]}.u8",
+        'source': os.path.realpath(alignment_path),
+        'fingerprint': source_fingerprint(alignment_path)
+    }
+    matrix_path, _ = store_paths(prefix, index['matrix'])
+    if os.path.getsize(tmp_matrix) != index['n_sequences'] * index['alignment_length']:
+        os.remove(tmp_matrix)
+        raise ValueError(f"Matrix for {prefix} does not match its {index['n_sequences']} x {index['alignment_length']} index")
+
+    # Publish atomically: the matrix goes to its own versioned name first and the index, which is what
+    # readers open, is swapped in last, so a reader never pairs an index with another build's matrix
+    previous = None
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            previous = json.load(f).get('matrix')
+    tmp_index = f"{index_path}.tmp.{os.getpid()}"
+    with open(tmp_index, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_matrix, matrix_path)
+    os.replace(tmp_index, index_path)
+
+    # The superseded matrix stays readable through memmaps that already have it open
+    if previous and previous != index['matrix']:
+        try:
+            os.remove(store_paths(prefix, previous)[0])
+        except FileNotFoundError:
+            pass
+    return index
+
+
+def open_store(prefix, retries=1):
+    """Open a store read-only; returns (index, N x L uint8 memmap)"""
+    _, index_path = store_paths(prefix)
+    with open(index_path) as f:
+        index = json.load(f)
+    matrix_path, _ = store_paths(prefix, index.get('matrix'))
+    shape = (index['n_sequences'], index['alignment_length'])
+    if shape[0] == 0 or shape[1] == 0:
+        return index, np.empty(shape, dtype=np.uint8)
+    try:
+        size = os.path.getsize(matrix_path)
+    except FileNotFoundError:
+        # A concurrent rebuild replaced the index and removed its matrix after we read the old index
+        if retries > 0:
+            return open_store(prefix, retries - 1)
+        raise
+    if size != shape[0] * shape[1]:
+        raise ValueError(f"Alignment store {prefix}: {matrix_path} does not match its {shape[0]} x {shape[1]} index")
+    return index, np.memmap(matrix_path, dtype=np.uint8, mode='r', shape=shape)
+
+
+def load_or_build(alignment_path, store_dir, fmt='fasta'):
+    """Open the store for an alignment, building (or rebuilding a stale) one in store_dir first"""
+    name = os.path.basename(alignment_path)
+    path_hash = hashlib.sha256(os.path.realpath(alignment_path).encode('utf-8')).hexdigest()[:12]
+    prefix = os.path.join(store_dir, f"{name}.{path_hash}")
+    _, index_path = store_paths(prefix)
+
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        if index.get('version') == STORE_VERSION and index.get('fingerprint') == source_fingerprint(alignment_path):
+            print(f"Reusing alignment store {prefix}")
+            return open_store(prefix)
+
+    print(f"Building alignment store {prefix}")
+    build_store(alignment_path, prefix, fmt)
+    return open_store(prefix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert an alignment into a memory-mapped byte matrix store')
+    parser.add_argument('--alignment', required=True, help='Multiple sequence alignment file')
+    parser.add_argument('--format', default='fasta', help='Alignment file format')
+    parser.add_argument('--output-prefix', required=True, help='Store prefix (writes <prefix>.<hash>.u8 and <prefix>.json)')
+    args = parser.parse_args()
+
+    index = build_store(args.alignment, args.output_prefix, args.format)
+    print(f"Stored {index['n_sequences']} sequences of length {index['alignment_length']} at {args.output_prefix}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,136 @@ import argparse
 import pandas as pd
 import numpy as np
 from Bio import AlignIO
-from collections import Counter
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from alignment_store import load_or_build, open_store
+from table_io import read_table, write_table
+
+# Conservation alphabet: the 20 standard amino acids (either case, so soft-masked alignments count
+# their real residues) plus one catch-all for non-standard symbols; gaps are counted apart
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+N_SYMBOLS = len(AMINO_ACIDS) + 1
+GAP_CODE = N_SYMBOLS
+
+CODE_TABLE = np.full(256, N_SYMBOLS - 1, dtype=np.uint8)
+for _code, _aa in enumerate(AMINO_ACIDS):
+    CODE_TABLE[ord(_aa)] = _code
+    CODE_TABLE[ord(_aa.lower())] = _code
+CODE_TABLE[ord('-')] = GAP_CODE
+
+def alignment_matrix(alignment):
+    """Pack an in-memory alignment into an N x L uint8 matrix of residue bytes"""
+    matrix = np.empty((len(alignment), alignment.get_alignment_length()), dtype=np.uint8)
+    for i, record in enumerate(alignment):
+        matrix[i] = np.frombuffer(str(record.seq).encode('ascii', 'replace'), dtype=np.uint8)
+    return matrix
+
+def alignment_rows(matrix):
+    """Yield each alignment row of a byte matrix as a string"""
+    for row in matrix:
+        yield row.tobytes().decode('ascii')
+
+def column_counts(matrix, chunk_rows=4096):
+    """Count every symbol (plus gaps) in every alignment column, one block of rows at a time.
+    
+    Works on in-memory matrices and memory-mapped stores alike; only one block is decoded at a time.
+    """
+    n_rows, n_cols = matrix.shape
+    width = N_SYMBOLS + 1
+    offsets = np.arange(n_cols, dtype=np.int64) * width
+    counts = np.zeros(n_cols * width, dtype=np.int64)
+    for first in range(0, n_rows, chunk_rows):
+        block = CODE_TABLE[matrix[first:first + chunk_rows]].astype(np.int64) + offsets
+        counts += np.bincount(block.ravel(), minlength=n_cols * width)
+    return counts.reshape(n_cols, width)
+
+def _count_shard(job):
+    """Worker: attach to the shared alignment matrix and count columns over one block of rows"""
+    kind, name, shape, first, last = job
+    if kind == 'memmap':
+        matrix = np.memmap(name, dtype=np.uint8, mode='r', shape=shape)
+        return column_counts(matrix[first:last])
+    
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        matrix = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        counts = column_counts(matrix[first:last])
+        del matrix
+        return counts
+    finally:
+        shm.close()
+
+def parallel_column_counts(matrix, workers):
+    """Shard the alignment by rows across a process pool and reduce the partial column counts.
+    
+    Memory-mapped stores are reopened by each worker (sharing the page cache); in-memory matrices are
+    copied once into a shared memory block. The summed counts are identical to column_counts().
+    """
+    n_rows = matrix.shape[0]
+    workers = max(1, min(workers, n_rows))
+    if workers == 1:
+        return column_counts(matrix)
+    
+    bounds = np.linspace(0, n_rows, workers + 1).astype(int)
+    shm = None
+    if isinstance(matrix, np.memmap) and matrix.filename:
+        source = ('memmap', matrix.filename)
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+        np.ndarray(matrix.shape, dtype=np.uint8, buffer=shm.buf)[:] = matrix
+        source = ('shm', shm.name)
+    
+    try:
+        jobs = [source + (matrix.shape, first, last) for first, last in zip(bounds[:-1], bounds[1:])]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return sum(pool.map(_count_shard, jobs))
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+def column_conservation(counts):
+    """Frequency of the most common non-gap symbol in each column (0 for all-gap columns)"""
+    residues = counts[:, :N_SYMBOLS]
+    non_gap = residues.sum(axis=1)
+    most_common = residues.max(axis=1)
+    return np.divide(most_common, non_gap, out=np.zeros(len(counts)), where=non_gap > 0)
+
+def region_conservation(conservation, starts, ends):
+    """Mean column conservation over 1-based inclusive regions, via a prefix-sum lookup"""
+    prefix = np.concatenate(([0.0], np.cumsum(conservation)))
+    starts = np.maximum(np.asarray(starts, dtype=np.int64), 1)
+    ends = np.asarray(ends, dtype=np.int64)
+    lengths = ends - starts + 1
+    totals = prefix[np.maximum(ends, starts - 1)] - prefix[starts - 1]
+    return np.divide(totals, lengths, out=np.zeros(len(lengths)), where=lengths > 0)
+
+def epitope_strain_coverage(epitopes, strains):
+    """Count how many strains contain each epitope (gaps removed from both), via a k-mer hash index.
+    
+    Epitopes are grouped by length into hash sets. Identical strains are collapsed first, then each
+    distinct strain is scanned once per epitope length and its k-mers are intersected with that set,
+    so all epitopes are matched in one pass instead of one str.find per epitope and strain.
+    """
+    queries = [seq.replace('-', '') if isinstance(seq, str) else None for seq in epitopes]
+    by_length = defaultdict(set)
+    for query in queries:
+        if query is not None:
+            by_length[len(query)].add(query)
+    
+    unique_strains = Counter(strain.replace('-', '') for strain in strains)
+    
+    coverage = Counter()
+    for strain, copies in unique_strains.items():
+        for k, patterns in by_length.items():
+            if k > len(strain):
+                continue
+            found = patterns.intersection(strain[i:i + k] for i in range(len(strain) - k + 1))
+            for query in found:
+                coverage[query] += copies
+    
+    return [coverage[query] if query is not None else 0 for query in queries]
 
 def main():
     # Parse command line arguments
@@ -14,13 +143,17 @@ def main():
     parser.add_argument('--protein-type', required=True, help='Protein type (e.g., hemagglutinin, neuraminidase)')
     parser.add_argument('--threshold', type=float, default=0.9, help='Conservation threshold (0-1)')
     parser.add_argument('--output', required=True, help='Output CSV file for conserved epitopes')
-    parser.add_argument('--format', default='fasta', help='Alignment file format')
+    parser.add_argument('--output-format', choices=['csv', 'parquet'], help='Output table format (default: from the output extension, CSV unless .parquet)')
+    parser.add_argument('--format', default='fasta',
+                        help="Alignment file format, or 'store' if --alignment is a prefix written by alignment_store.py")
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes sharing the column counting')
+    parser.add_argument('--store-dir', help='Convert the alignment once into a memory-mapped store in this directory and reuse it')
     
     args = parser.parse_args()
     
     # Read epitope data
     try:
-        epitopes_df = pd.read_csv(args.epitopes)
+        epitopes_df = read_table(args.epitopes)
         print(f"Loaded {len(epitopes_df)} epitope regions")
     except Exception as e:
         print(f"Error loading epitope file: {e}")
@@ -28,94 +161,56 @@ def main():
     
     # Read multiple sequence alignment
     try:
-        alignment = AlignIO.read(args.alignment, args.format)
-        print(f"Loaded alignment with {len(alignment)} sequences, each of length {alignment.get_alignment_length()}")
+        if args.format == 'store':
+            _, matrix = open_store(args.alignment)
+        elif args.store_dir:
+            _, matrix = load_or_build(args.alignment, args.store_dir, args.format)
+        else:
+            matrix = alignment_matrix(AlignIO.read(args.alignment, args.format))
+        n_sequences, alignment_length = matrix.shape
+        print(f"Loaded alignment with {n_sequences} sequences, each of length {alignment_length}")
     except Exception as e:
         print(f"Error loading alignment file: {e}")
         return
     
-    # Function to calculate conservation score for a position
-    def calculate_position_conservation(position, alignment):
-        # Extract all amino acids at this position
-        column = [record.seq[position] for record in alignment]
-        
-        # Count occurrences of each amino acid
-        counts = Counter(column)
-        
-        # Remove gaps from consideration
-        if '-' in counts:
-            gap_count = counts['-']
-            del counts['-']
-        else:
-            gap_count = 0
-        
-        # Calculate conservation as frequency of most common amino acid
-        if len(column) - gap_count > 0:
-            most_common = counts.most_common(1)
-            if most_common:
-                return most_common[0][1] / (len(column) - gap_count)
-            return 0
-        return 0
-    
-    # Function to calculate conservation score for a region
-    def calculate_region_conservation(start, end, alignment):
-        scores = [calculate_position_conservation(pos, alignment) for pos in range(start-1, end)]
-        return np.mean(scores) if scores else 0
-    
     # Analyze conservation for each epitope region
     conserved_epitopes = []
+    # Columns added to each conserved epitope, so an empty output keeps the same header
+    added_columns = ['conservation_score']
     
     # Process epitopes with start/end positions
     if 'start' in epitopes_df.columns and 'end' in epitopes_df.columns:
-        for _, epitope in epitopes_df.iterrows():
-            # Make sure positions are within alignment range
-            if epitope['start'] <= alignment.get_alignment_length() and epitope['end'] <= alignment.get_alignment_length():
-                conservation_score = calculate_region_conservation(epitope['start'], epitope['end'], alignment)
-                
-                # Check if conservation is above threshold
-                if conservation_score >= args.threshold:
-                    # Create a new row with conservation data
-                    epitope_dict = epitope.to_dict()
-                    epitope_dict['conservation_score'] = conservation_score
-                    conserved_epitopes.append(epitope_dict)
+        # Count symbols per column once, so each epitope is a constant-time prefix-sum lookup
+        conservation = column_conservation(parallel_column_counts(matrix, args.workers))
+        
+        # Make sure positions are within alignment range
+        in_range = (epitopes_df['start'] <= alignment_length) & (epitopes_df['end'] <= alignment_length)
+        in_range_df = epitopes_df[in_range]
+        scores = region_conservation(conservation, in_range_df['start'], in_range_df['end'])
+        
+        for (_, epitope), conservation_score in zip(in_range_df.iterrows(), scores):
+            # Check if conservation is above threshold
+            if conservation_score >= args.threshold:
+                # Create a new row with conservation data
+                epitope_dict = epitope.to_dict()
+                epitope_dict['conservation_score'] = conservation_score
+                conserved_epitopes.append(epitope_dict)
     
     # Process epitopes without positions but with sequences
     elif 'sequence' in epitopes_df.columns:
-        # Function to find a sequence in alignment
-        def find_sequence_positions(seq, reference_seq):
-            seq = seq.replace('-', '')  # Remove gaps from query
-            ref_str = str(reference_seq)
-            
-            # Find all occurrences of the sequence
-            positions = []
-            start = 0
-            while True:
-                start = ref_str.find(seq, start)
-                if start == -1:
-                    break
-                positions.append((start + 1, start + len(seq)))
-                start += 1
-            
-            return positions
-            
-        # For each epitope, try to find it in each alignment sequence
-        for _, epitope in epitopes_df.iterrows():
-            seq = epitope['sequence']
-            conservation_counts = 0
-            
-            # Count how many sequences contain this epitope
-            for record in alignment:
-                positions = find_sequence_positions(seq, record.seq)
-                if positions:
-                    conservation_counts += 1
-            
+        # Match every epitope against each distinct ungapped strain in a single k-mer pass
+        strain_counts = epitope_strain_coverage(epitopes_df['sequence'].tolist(), alignment_rows(matrix))
+        added_columns = ['strain_count', 'conservation_score']
+        
+        for (_, epitope), strain_count in zip(epitopes_df.iterrows(), strain_counts):
             # Calculate conservation rate
-            conservation_score = conservation_counts / len(alignment) if len(alignment) > 0 else 0
+            conservation_score = strain_count / n_sequences if n_sequences > 0 else 0
             
             # Check if conservation is above threshold
             if conservation_score >= args.threshold:
                 # Add to conserved epitopes
                 epitope_dict = epitope.to_dict()
+                epitope_dict['strain_count'] = strain_count
                 epitope_dict['conservation_score'] = conservation_score
                 conserved_epitopes.append(epitope_dict)
     
@@ -124,15 +219,16 @@ def main():
     # Create DataFrame and save to CSV
     if conserved_epitopes:
         conserved_df = pd.DataFrame(conserved_epitopes)
-        conserved_df.to_csv(args.output, index=False)
+        write_table(conserved_df, args.output, args.output_format)
         print(f"Saved conserved epitopes to {args.output}")
     else:
-        # Create empty DataFrame with same columns as input plus conservation_score
+        # Create empty DataFrame with same columns as input plus the conservation columns
         conserved_df = epitopes_df.copy()
         if len(conserved_df) > 0:
             conserved_df = conserved_df.head(0)  # Empty but keep columns
-        conserved_df['conservation_score'] = None
-        conserved_df.to_csv(args.output, index=False)
+        for column in added_columns:
+            conserved_df[column] = None
+        write_table(conserved_df, args.output, args.output_format)
         print(f"No conserved epitopes found. Created empty output file.")
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+# construct_ordering.py
+"""Junction-aware ordering of epitopes in a vaccine construct (open-path TSP over junction penalties)."""
+
+import math
+import random
+from functools import lru_cache
+
+import numpy as np
+
+from score_tracks import propensity_windows
+
+
+@lru_cache(maxsize=65536)
+def junction_penalty(left, right, linker, window_size=9, threshold=0.5):
+    """Summed score of the linker-spanning windows that the local B-cell scale calls epitopes.
+
+    Only windows that cross the junction are scored (the last window_size - 1 residues of `left`,
+    the linker and the first window_size - 1 of `right`), on the same halved propensity scale as
+    the predict_bcell.py fallback. Results are cached per (left, right, linker) junction.
+    """
+    if window_size <= 1:
+        return 0.0
+    tail = left[-(window_size - 1):] if left else ''
+    junction = tail + linker + right[:window_size - 1]
+    _, scores = propensity_windows(junction, window_size, threshold)
+    return float(scores.sum())
+
+
+def construct_penalty(sequences, linker, leading_seq='', trailing_seq='', window_size=9, threshold=0.5):
+    """Junction penalty of a construct with the epitopes in the given order"""
+    if not sequences:
+        return 0.0
+    total = sum(junction_penalty(left, right, linker, window_size, threshold)
+                for left, right in zip(sequences[:-1], sequences[1:]))
+    if leading_seq:
+        total += junction_penalty(leading_seq, sequences[0], '', window_size, threshold)
+    if trailing_seq:
+        total += junction_penalty(sequences[-1], trailing_seq, '', window_size, threshold)
+    return float(total)
+
+
+def penalty_matrix(sequences, linker, window_size=9, threshold=0.5):
+    """N x N matrix of junction penalties for placing sequence i directly before sequence j"""
+    n = len(sequences)
+    matrix = np.zeros((n, n))
+    for i, left in enumerate(sequences):
+        for j, right in enumerate(sequences):
+            if i != j:
+                matrix[i, j] = junction_penalty(left, right, linker, window_size, threshold)
+    return matrix
+
+
+def path_cost(order, matrix, start_costs, end_costs):
+    """Total penalty of visiting the epitopes in `order`, including the flank junctions"""
+    if not order:
+        return 0.0
+    inner = matrix[order[:-1], order[1:]].sum() if len(order) > 1 else 0.0
+    return float(start_costs[order[0]] + inner + end_costs[order[-1]])
+
+
+def two_opt(order, matrix, start_costs, end_costs):
+    """Reverse segments while that lowers the cost (costs are asymmetric, so segments are re-scored)"""
+    order = list(order)
+    best = path_cost(order, matrix, start_costs, end_costs)
+    evaluated = 0
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                cost = path_cost(candidate, matrix, start_costs, end_costs)
+                evaluated += 1
+                if cost < best - 1e-12:
+                    order, best, improved = candidate, cost, True
+    return order, best, evaluated
+
+
+def anneal(order, matrix, start_costs, end_costs, iterations=5000, seed=0):
+    """Simulated annealing over segment reversals and single-epitope moves; returns the best order seen"""
+    rng = random.Random(seed)
+    n = len(order)
+    current = list(order)
+    current_cost = path_cost(current, matrix, start_costs, end_costs)
+    best, best_cost = list(current), current_cost
+    if n < 2 or iterations <= 0:
+        return best, best_cost, 0
+
+    positive = matrix[matrix > 0]
+    start_temp = float(positive.mean()) if len(positive) else 1.0
+    end_temp = start_temp * 1e-3
+    for step in range(iterations):
+        temp = start_temp * (end_temp / start_temp) ** (step / iterations)
+        i, j = sorted(rng.sample(range(n), 2))
+        if rng.random() < 0.5:
+            candidate = current[:i] + current[i:j + 1][::-1] + current[j + 1:]
+        else:
+            candidate = current[:i] + current[i + 1:]
+            candidate.insert(j, current[i])
+        cost = path_cost(candidate, matrix, start_costs, end_costs)
+        if cost <= current_cost or rng.random() < math.exp((current_cost - cost) / temp):
+            current, current_cost = candidate, cost
+            if cost < best_cost - 1e-12:
+                best, best_cost = list(candidate), cost
+    return best, best_cost, iterations
+
+
+def optimize_order(sequences, linker, leading_seq='', trailing_seq='', iterations=5000, seed=0,
+                   window_size=9, threshold=0.5):
+    """Order epitopes to minimize junctional epitope penalties.
+
+    Starts from the given (score) order, anneals, then polishes with 2-opt. The input order is kept
+    unless a strictly better one is found. Returns a dict with the order (positions into `sequences`),
+    its penalty, the input order's penalty and the number of permutations evaluated.
+    """
+    sequences = list(sequences)
+    n = len(sequences)
+    matrix = penalty_matrix(sequences, linker, window_size, threshold)
+
+    # The flanks join the first and last epitope directly, without a linker
+    start_costs = np.array([junction_penalty(leading_seq, s, '', window_size, threshold) if leading_seq else 0.0
+                            for s in sequences])
+    end_costs = np.array([junction_penalty(s, trailing_seq, '', window_size, threshold) if trailing_seq else 0.0
+                          for s in sequences])
+
+    baseline = list(range(n))
+    baseline_cost = path_cost(baseline, matrix, start_costs, end_costs)
+    order, cost, evaluated = anneal(baseline, matrix, start_costs, end_costs, iterations, seed)
+    polished, polished_cost, polish_evaluated = two_opt(order, matrix, start_costs, end_costs)
+    evaluated += polish_evaluated
+    if polished_cost < cost:
+        order, cost = polished, polished_cost
+    if cost >= baseline_cost - 1e-12:
+        order, cost = baseline, baseline_cost
+
+    return {
+        'order': order,
+        'penalty': cost,
+        'baseline_penalty': baseline_cost,
+        'evaluated': evaluated
+    }
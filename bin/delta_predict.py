@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+# delta_predict.py
+"""Incremental re-prediction of sequence variants against a cached reference prediction."""
+
+import numpy as np
+from Bio import SeqIO
+from Bio.Align import PairwiseAligner, substitution_matrices
+
+from table_io import read_table
+
+
+def variant_mapping(reference, variant):
+    """Map every variant position to its identical reference position (-1 where there is none).
+
+    The variant is globally aligned to the reference (BLOSUM62, affine gaps, free end gaps), which
+    places insertions and deletions even when they leave the length unchanged.
+    """
+    ref = np.frombuffer(reference.upper().encode('ascii', 'replace'), dtype=np.uint8)
+    var = np.frombuffer(variant.upper().encode('ascii', 'replace'), dtype=np.uint8)
+    ref_pos = np.full(len(var), -1, dtype=np.int64)
+
+    if reference.upper() == variant.upper():
+        ref_pos[:] = np.arange(len(var))
+    elif len(ref) and len(var):
+        aligner = PairwiseAligner(mode='global', substitution_matrix=substitution_matrices.load('BLOSUM62'),
+                                  open_gap_score=-10, extend_gap_score=-0.5)
+        # Query-end gaps are common for truncated isolates and should not be penalised
+        aligner.end_gap_score = 0
+        alignment = aligner.align(reference.upper(), variant.upper())[0]
+        for (t0, t1), (q0, q1) in zip(*alignment.aligned):
+            ref_pos[q0:q1] = np.arange(t0, t1)
+
+    anchored = ref_pos >= 0
+    ref_pos[anchored] = np.where(ref[ref_pos[anchored]] == var[anchored], ref_pos[anchored], -1)
+    return ref_pos
+
+
+def changed_positions(ref_pos, reference_length):
+    """Boolean mask of variant positions whose neighbourhood differs from the reference.
+
+    Substituted and inserted residues are changed; so are both residues at a deletion junction and
+    a terminus that no longer matches the reference terminus.
+    """
+    changed = ref_pos < 0
+    if len(ref_pos):
+        breaks = (ref_pos[1:] >= 0) & (ref_pos[:-1] >= 0) & (ref_pos[1:] != ref_pos[:-1] + 1)
+        changed[1:] |= breaks
+        changed[:-1] |= breaks
+        changed[0] |= ref_pos[0] != 0
+        changed[-1] |= ref_pos[-1] != reference_length - 1
+    return changed
+
+
+def dirty_windows(changed, length, context=0):
+    """Mask of window starts (0-based) whose window, widened by `context` on both sides, holds a change"""
+    n_windows = len(changed) - length + 1
+    if n_windows <= 0:
+        return np.zeros(0, dtype=bool)
+    counts = np.concatenate(([0], np.cumsum(changed)))
+    starts = np.arange(n_windows)
+    lo = np.maximum(starts - context, 0)
+    hi = np.minimum(starts + length + context, len(changed))
+    return counts[hi] - counts[lo] > 0
+
+
+def fragments(dirty, length, context, sequence_length):
+    """Merge runs of dirty window starts into (start, end) sequence slices to re-predict.
+
+    Each slice covers its windows plus `context` residues on both sides; runs whose slices would
+    overlap are merged, so every dirty window is re-scored in exactly one fragment.
+    """
+    starts = np.flatnonzero(dirty)
+    if not len(starts):
+        return []
+    # A new run begins where the previous window's slice ends before this one's begins
+    gaps = np.flatnonzero(starts[1:] - starts[:-1] > length + 2 * context - 1) + 1
+    runs = np.split(starts, gaps)
+    return [(max(int(run[0]) - context, 0), min(int(run[-1]) + length + context, sequence_length)) for run in runs]
+
+
+class DeltaReference:
+    """A reference sequence and its prediction table, reused for near-identical variants.
+
+    `predict` re-scores only the windows touched by mutations (plus `context` residues on each side,
+    for methods that smooth over neighbouring residues) and carries every other row over from the
+    reference, shifted to the variant's coordinates. The reference table must come from the same
+    predictor settings (method, alleles, lengths, threshold).
+    """
+
+    def __init__(self, sequence, rows, sequence_id=None, max_changed_fraction=0.5):
+        self.sequence = sequence
+        self.sequence_id = sequence_id
+        self.rows = [row for row in rows if row.get('start', 0) > 0]
+        self.max_changed_fraction = max_changed_fraction
+
+    @classmethod
+    def load(cls, fasta, table, max_changed_fraction=0.5):
+        """Reference from the first record of a FASTA file and the predictor's table for it.
+
+        Batch tables are restricted to the rows of that record's sequence_id.
+        """
+        record = next(SeqIO.parse(fasta, 'fasta'))
+        df = read_table(table)
+        if 'sequence_id' in df.columns:
+            df = df[df['sequence_id'] == record.id].drop(columns='sequence_id')
+        rows = [{key: value for key, value in row.items() if not (isinstance(value, float) and np.isnan(value))}
+                for row in df.to_dict('records')]
+        print(f"Delta reference {record.id}: {len(record.seq)} residues, {len(rows)} predicted rows")
+        return cls(str(record.seq), rows, record.id, max_changed_fraction)
+
+    def predict(self, sequence, predict, lengths, context=0, sort_key=None):
+        """Rows for `sequence`: reference rows where unchanged, `predict(fragment)` rows elsewhere.
+
+        `lengths` are the window lengths the predictor reports; rows are returned sorted by
+        `sort_key` (window start by default).
+        """
+        sort_key = sort_key or (lambda row: row['start'])
+        ref_pos = variant_mapping(self.sequence, sequence)
+        changed = changed_positions(ref_pos, len(self.sequence))
+        if not len(changed) or changed.mean() > self.max_changed_fraction:
+            print(f"  Delta: {int(changed.sum())} of {len(sequence)} positions differ from the reference; "
+                  f"predicting the whole sequence")
+            return sorted(predict(sequence), key=sort_key)
+
+        dirty = {length: dirty_windows(changed, length, context) for length in lengths}
+
+        # Reference rows whose window (and context) is unchanged move to the variant's coordinates
+        var_pos = np.full(len(self.sequence), -1, dtype=np.int64)
+        var_pos[ref_pos[ref_pos >= 0]] = np.flatnonzero(ref_pos >= 0)
+        carried = []
+        for row in self.rows:
+            start = int(var_pos[int(row['start']) - 1])
+            end = int(var_pos[int(row['end']) - 1])
+            length = int(row['end']) - int(row['start']) + 1
+            mask = dirty.get(length)
+            if start < 0 or end - start + 1 != length or mask is None or start >= len(mask) or mask[start]:
+                continue
+            carried.append({**row, 'start': start + 1, 'end': end + 1})
+
+        # Re-predict the dirty windows, one fragment per merged run of them
+        union = np.zeros(max(len(sequence) - min(lengths) + 1, 0), dtype=bool)
+        for mask in dirty.values():
+            union[:len(mask)] |= mask
+        slices = fragments(union, max(lengths), context, len(sequence))
+        rescored = []
+        for lo, hi in slices:
+            for row in predict(sequence[lo:hi]):
+                if row.get('start', 0) <= 0:
+                    continue
+                start = int(row['start']) - 1 + lo
+                mask = dirty.get(int(row['end']) - int(row['start']) + 1)
+                if mask is not None and start < len(mask) and mask[start]:
+                    rescored.append({**row, 'start': start + 1, 'end': int(row['end']) + lo})
+
+        print(f"  Delta: {int(changed.sum())} changed positions; re-predicted {len(slices)} fragments "
+              f"({sum(hi - lo for lo, hi in slices)} of {len(sequence)} residues), "
+              f"carried over {len(carried)} reference rows")
+        return sorted(carried + rescored, key=sort_key)
+
+
+def add_delta_arguments(parser):
+    """Register the shared delta-mode options on a predictor's argument parser"""
+    parser.add_argument('--reference-fasta', help='Reference sequence already predicted (delta mode; first record is used)')
+    parser.add_argument('--reference-table', help="This predictor's output table for the reference sequence (delta mode)")
+    parser.add_argument('--delta-max-changed', type=float, default=0.5,
+                        help='Predict the whole sequence when more than this fraction of positions differ from the reference')
+
+
+def open_delta(args):
+    """The DeltaReference configured by add_delta_arguments, or None if delta mode is off"""
+    if not args.reference_fasta and not args.reference_table:
+        return None
+    if not (args.reference_fasta and args.reference_table):
+        raise ValueError('Delta mode needs both --reference-fasta and --reference-table')
+    return DeltaReference.load(args.reference_fasta, args.reference_table, args.delta_max_changed)
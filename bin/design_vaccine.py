@@ -3,38 +3,17 @@
 import sys
 import subprocess
 import argparse
+import csv
+import itertools
+import os
 from datetime import datetime
 
-def calculate_similarity(seq1, seq2):
-    """Calculate sequence similarity between two peptides"""
-    # For shorter sequences, check if one is contained in the other
-    if len(seq1) <= len(seq2) and seq1 in seq2:
-        return 1.0
-    if len(seq2) <= len(seq1) and seq2 in seq1:
-        return 1.0
-    
-    # For sequences of same length, calculate percent identity
-    if len(seq1) == len(seq2):
-        matches = sum(a == b for a, b in zip(seq1, seq2))
-        return matches / len(seq1)
-    
-    # For different length sequences, use a sliding window approach
-    min_len = min(len(seq1), len(seq2))
-    max_similarity = 0
-    
-    # Check if shorter sequence is similar to any part of longer sequence
-    if len(seq1) < len(seq2):
-        shorter, longer = seq1, seq2
-    else:
-        shorter, longer = seq2, seq1
-        
-    for i in range(len(longer) - len(shorter) + 1):
-        substring = longer[i:i+len(shorter)]
-        matches = sum(a == b for a, b in zip(shorter, substring))
-        similarity = matches / len(shorter)
-        max_similarity = max(max_similarity, similarity)
-    
-    return max_similarity
+# Columns of the sweep comparison table
+SWEEP_COLUMNS = [
+    'variant', 'linker', 'max_epitopes', 'similarity_threshold', 'n_epitopes', 'meets_minimum', 'length',
+    'total_score', 'mean_score', 'b_cell', 'mhc_i', 'mhc_ii', 'junction_penalty',
+    'molecular_weight', 'theoretical_pi', 'instability_index', 'gravy', 'aromaticity', 'sequences'
+]
 
 def main():
     # Parse command line arguments
@@ -49,6 +28,20 @@ def main():
     parser.add_argument('--output-fasta', required=True, help='Output FASTA file for vaccine construct')
     parser.add_argument('--output-report', required=True, help='Output HTML report file')
     parser.add_argument('--similarity-threshold', type=float, default=0.7, help='Similarity threshold for epitope diversity (0-1)')
+    parser.add_argument('--selection-engine', choices=['greedy', 'exact'], default='greedy', help='Epitope selection: greedy per-type split, or exact branch-and-bound optimum')
+    parser.add_argument('--type-max', default='', help='Exact engine: maximum epitopes per type, e.g. B-cell=4,MHC-I=4')
+    parser.add_argument('--type-min', default='', help='Exact engine: minimum epitopes per type, e.g. MHC-II=2')
+    parser.add_argument('--max-length', type=int, default=0, help='Exact engine: maximum construct length in amino acids (0 for no limit)')
+    parser.add_argument('--time-budget', type=float, default=10.0, help='Exact engine: search time budget in seconds')
+    parser.add_argument('--ordering', choices=['score', 'junction'], default='score', help='Epitope order in the construct: by score, or optimized against junctional epitopes')
+    parser.add_argument('--ordering-iterations', type=int, default=5000, help='Simulated annealing steps for junction-aware ordering')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for junction-aware ordering')
+    parser.add_argument('--kmer-prefilter', action='store_true', help='Skip similarity comparisons that a shared k-mer index rules out')
+    parser.add_argument('--sweep-linkers', default='', help='Sweep mode: comma-separated linkers to try')
+    parser.add_argument('--sweep-max-epitopes', default='', help='Sweep mode: comma-separated maximum epitope counts to try')
+    parser.add_argument('--sweep-similarity-thresholds', default='', help='Sweep mode: comma-separated similarity thresholds to try')
+    parser.add_argument('--report-data', help='Structured report sidecar (.json or .parquet; default: next to the output report)')
+    parser.add_argument('--sweep-table', help='Sweep mode: comparison CSV (default: next to the output report)')
     
     args = parser.parse_args()
     
@@ -67,45 +60,232 @@ def main():
         from Bio.Seq import Seq
         from Bio import SeqIO
     
+    from epitope_index import EpitopeIndex
+    from epitope_similarity import SimilarityIndex, select_diverse
+    from epitope_selection import conflict_lists, parse_type_counts, solve_selection
+    from construct_ordering import construct_penalty, optimize_order
+    from report_writer import HtmlReport, Sidecar
+    from physchem import evaluate_sequences
+    from table_io import read_table
+    
+    # Parameter grid for sweep mode; dimensions that are not swept keep their single value
+    sweep_grid = []
+    if args.sweep_linkers or args.sweep_max_epitopes or args.sweep_similarity_thresholds:
+        linkers = args.sweep_linkers.split(',') if args.sweep_linkers else [args.linker]
+        counts = [int(v) for v in args.sweep_max_epitopes.split(',')] if args.sweep_max_epitopes else [args.max_epitopes]
+        thresholds = [float(v) for v in args.sweep_similarity_thresholds.split(',')] if args.sweep_similarity_thresholds else [args.similarity_threshold]
+        sweep_grid = list(itertools.product(linkers, counts, thresholds))
+    
     # Define select_diverse_epitopes function inside main to access pandas
-    def select_diverse_epitopes(epitopes_df, max_epitopes, similarity_threshold=0.7):
+    def select_diverse_epitopes(epitopes_df, max_epitopes, similarity_threshold=0.7, similarity=None):
         """Select diverse set of epitopes based on score and sequence diversity"""
-        selected = []
-        
         # Sort by score descending
         sorted_epitopes = epitopes_df.sort_values('consensus_score', ascending=False)
         
-        for _, epitope in sorted_epitopes.iterrows():
-            seq = epitope['sequence']
-            
-            # Check if this sequence is too similar to already selected ones
-            too_similar = False
-            for selected_epitope in selected:
-                similarity = calculate_similarity(seq, selected_epitope['sequence'])
-                if similarity > similarity_threshold:
-                    too_similar = True
-                    break
-                    
-            # Only add if not too similar to existing selections
-            if not too_similar:
-                selected.append(epitope)
-                
-                # Stop once we have enough epitopes
-                if len(selected) >= max_epitopes:
-                    break
+        # The same peptide appears once per allele. A later row of a peptide is identical to its
+        # first (best-scoring) row, so it can only be picked when identical peptides are allowed
+        candidates = np.arange(len(sorted_epitopes))
+        if similarity_threshold < 1.0:
+            candidates = np.sort(EpitopeIndex(sorted_epitopes).first_rows())
+        sequences = sorted_epitopes['sequence'].iloc[candidates].tolist()
+        
+        # Greedy selection, comparing candidates against the selected set in vectorized batches
+        # (or against similarity rows shared across a parameter sweep)
+        if similarity is not None:
+            positions = similarity.select_diverse(sequences, max_epitopes, similarity_threshold)
+        else:
+            positions = select_diverse(sequences, max_epitopes, similarity_threshold, prefilter=args.kmer_prefilter)
                     
-        return pd.DataFrame(selected) if selected else pd.DataFrame(columns=epitopes_df.columns)
+        return sorted_epitopes.iloc[candidates[positions]] if positions else pd.DataFrame(columns=epitopes_df.columns)
+    
+    def choose_epitopes(epitopes_df, max_epitopes, similarity_threshold, linker, similarity=None, conflicts=None):
+        """Select the construct epitopes; returns (epitopes in score order, selection summary).
+
+        The epitopes are None when the exact engine finds no selection meeting the per-type minimums.
+        """
+        selection_summary = ''
+        
+        # Calculate target counts for each epitope type
+        total_epitopes = min(max_epitopes, len(epitopes_df))
+        
+        if args.selection_engine == 'exact':
+            # Maximize the summed score subject to counts, type quotas, similarity and construct length
+            result = solve_selection(
+                epitopes_df['sequence'].tolist(),
+                epitopes_df['consensus_score'].to_numpy(dtype=float),
+                epitopes_df['type'].tolist(),
+                total_epitopes,
+                similarity_threshold,
+                type_max=parse_type_counts(args.type_max),
+                type_min=parse_type_counts(args.type_min),
+                max_length=args.max_length,
+                linker_length=len(linker),
+                fixed_length=len(args.leading_seq) + len(args.trailing_seq),
+                time_budget=args.time_budget,
+                conflicts=conflicts
+            )
+            selection_summary = result.summary()
+            print(selection_summary)
+            if not result.feasible:
+                return None, selection_summary
+            combined_df = epitopes_df.iloc[result.positions]
+        else:
+            # Two-step selection for diversity:
+            # 1. First select diverse epitopes within each type
+            b_cell_df = epitopes_df[epitopes_df['type'] == 'B-cell']
+            mhc_i_df = epitopes_df[epitopes_df['type'] == 'MHC-I']
+            mhc_ii_df = epitopes_df[epitopes_df['type'] == 'MHC-II']
+        
+            # Calculate proportional allocations
+            b_cell_count = min(total_epitopes // 3, len(b_cell_df)) if len(b_cell_df) > 0 else 0
+            mhc_i_count = min(total_epitopes // 3, len(mhc_i_df)) if len(mhc_i_df) > 0 else 0
+            mhc_ii_count = min(total_epitopes - b_cell_count - mhc_i_count, len(mhc_ii_df)) if len(mhc_ii_df) > 0 else 0
+        
+            print(f"Allocating epitopes: B-cell: {b_cell_count}, MHC-I: {mhc_i_count}, MHC-II: {mhc_ii_count}")
+        
+            # Select diverse epitopes from each type
+            bcell_epitopes = select_diverse_epitopes(b_cell_df, b_cell_count, similarity_threshold, similarity) if b_cell_count > 0 else pd.DataFrame(columns=epitopes_df.columns)
+            mhci_epitopes = select_diverse_epitopes(mhc_i_df, mhc_i_count, similarity_threshold, similarity) if mhc_i_count > 0 else pd.DataFrame(columns=epitopes_df.columns)
+            mhcii_epitopes = select_diverse_epitopes(mhc_ii_df, mhc_ii_count, similarity_threshold, similarity) if mhc_ii_count > 0 else pd.DataFrame(columns=epitopes_df.columns)
+        
+            # 2. Now combine and ensure diversity across the entire set
+            combined_df = pd.concat([bcell_epitopes, mhci_epitopes, mhcii_epitopes])
+        
+            # If we don't have enough epitopes after the first round, try to fill from remaining
+            if len(combined_df) < total_epitopes:
+                remaining_count = total_epitopes - len(combined_df)
+                print(f"Only selected {len(combined_df)} epitopes in first round, attempting to select {remaining_count} more")
+            
+                # Get sequences we've already selected
+                selected_sequences = combined_df['sequence'].tolist()
+            
+                # Find epitopes we haven't selected yet
+                remaining_df = epitopes_df[~epitopes_df['sequence'].isin(selected_sequences)]
+            
+                if len(remaining_df) > 0:
+                    # Select additional diverse epitopes from remaining
+                    additional_epitopes = select_diverse_epitopes(remaining_df, remaining_count, similarity_threshold, similarity)
+                    combined_df = pd.concat([combined_df, additional_epitopes])
+        
+        # Final selection
+        return combined_df.sort_values('consensus_score', ascending=False).head(total_epitopes), selection_summary
     
-    import os
+    def order_epitopes(selected_epitopes, linker):
+        """Apply the configured epitope ordering; returns (ordered epitopes, ordering summary)"""
+        if args.ordering != 'junction' or len(selected_epitopes) < 2:
+            return selected_epitopes, ''
+        
+        # Reorder epitopes to avoid creating epitopes across the linker junctions
+        ordering = optimize_order(selected_epitopes['sequence'].tolist(), linker, args.leading_seq, args.trailing_seq,
+                                  iterations=args.ordering_iterations, seed=args.seed)
+        ordering_summary = (f"(junction penalty {ordering['baseline_penalty']:.3f} -> {ordering['penalty']:.3f}, "
+                            f"{ordering['evaluated']} orders evaluated)")
+        return selected_epitopes.iloc[ordering['order']], ordering_summary
+    
+    def run_sweep(epitopes_df, sweep_grid):
+        """Design one construct per parameter combination, streaming constructs and comparison rows"""
+        print(f"Sweep mode: {len(sweep_grid)} parameter combinations")
+        
+        # Similarity rows (greedy) and conflict lists (exact) are computed once and reused
+        similarity = SimilarityIndex(epitopes_df['sequence'].tolist())
+        conflicts = {}
+        
+        table_path = args.sweep_table or os.path.splitext(args.output_report)[0] + '_comparison.csv'
+        report_data = args.report_data or os.path.splitext(args.output_report)[0] + '.json'
+        summary = {
+            'protein_type': args.protein_type,
+            'combinations': len(sweep_grid),
+            'selection_engine': args.selection_engine,
+            'ordering': args.ordering,
+            'min_epitopes': args.min_epitopes
+        }
+        
+        with open(args.output_fasta, 'w') as fasta, open(table_path, 'w', newline='') as table, \
+                HtmlReport(args.output_report, f"{args.protein_type} Vaccine Design Sweep",
+                           f"H5N1 {args.protein_type.capitalize()} Vaccine Design Sweep",
+                           datetime.now().strftime('%Y-%m-%d %H:%M:%S')) as report, \
+                Sidecar(report_data, summary) as sidecar:
+            writer = csv.DictWriter(table, fieldnames=SWEEP_COLUMNS, restval='')
+            writer.writeheader()
+            report.stats('Sweep Settings', [
+                ('Combinations', len(sweep_grid)),
+                ('Selection engine', args.selection_engine),
+                ('Epitope order', args.ordering)
+            ])
+            report.heading('Construct Comparison')
+            written = 0
+            report.start_table([column for column in SWEEP_COLUMNS if column != 'sequences'], sequence_columns=['linker'])
+            
+            for number, (linker, max_epitopes, similarity_threshold) in enumerate(sweep_grid, 1):
+                variant = f"v{number:03d}"
+                print(f"[{variant}] linker={linker} max_epitopes={max_epitopes} similarity_threshold={similarity_threshold}")
+                
+                if args.selection_engine == 'exact' and similarity_threshold not in conflicts:
+                    conflicts[similarity_threshold] = conflict_lists(epitopes_df['sequence'].tolist(), similarity_threshold)
+                selected, selection_summary = choose_epitopes(epitopes_df, max_epitopes, similarity_threshold, linker,
+                                                              similarity, conflicts.get(similarity_threshold))
+                if selected is None:
+                    # Leave the variant out rather than write an empty construct
+                    print(f"WARNING: [{variant}] skipped: {selection_summary}")
+                    continue
+                selected, _ = order_epitopes(selected, linker)
+                sequences = selected['sequence'].tolist()
+                
+                if len(sequences) >= args.min_epitopes:
+                    construct = args.leading_seq + linker.join(sequences) + args.trailing_seq
+                else:
+                    construct = (args.leading_seq + args.trailing_seq) or "M"
+                
+                SeqIO.write(SeqRecord(
+                    Seq(construct),
+                    id=f"{args.protein_type}_vaccine_{variant}",
+                    description=f"linker={linker} max_epitopes={max_epitopes} similarity_threshold={similarity_threshold}"
+                ), fasta, "fasta")
+                
+                row = {
+                    'variant': variant,
+                    'linker': linker,
+                    'max_epitopes': max_epitopes,
+                    'similarity_threshold': similarity_threshold,
+                    'n_epitopes': len(sequences),
+                    'meets_minimum': len(sequences) >= args.min_epitopes,
+                    'length': len(construct),
+                    'total_score': float(selected['consensus_score'].sum()) if len(sequences) else 0.0,
+                    'mean_score': float(selected['consensus_score'].mean()) if len(sequences) else 0.0,
+                    'b_cell': int((selected['type'] == 'B-cell').sum()) if len(sequences) else 0,
+                    'mhc_i': int((selected['type'] == 'MHC-I').sum()) if len(sequences) else 0,
+                    'mhc_ii': int((selected['type'] == 'MHC-II').sum()) if len(sequences) else 0,
+                    'junction_penalty': construct_penalty(sequences, linker, args.leading_seq, args.trailing_seq),
+                    'sequences': ';'.join(sequences)
+                }
+                
+                # Local physicochemical properties, as in evaluate_vaccine.py
+                properties = evaluate_sequences([construct])
+                row.update({name: float(properties[name][0]) for name in
+                            ('molecular_weight', 'theoretical_pi', 'instability_index', 'gravy', 'aromaticity')})
+                
+                writer.writerow(row)
+                report.row(row)
+                sidecar.row(row)
+                written += 1
+            
+            report.end_table()
+        
+        print(f"Sweep comparison table saved to {table_path}")
+        print(f"{written} vaccine constructs saved to {args.output_fasta}")
+        print(f"Vaccine design sweep report saved to {args.output_report} (structured data: {sidecar.path})")
     
     print(f"Designing vaccine construct for {args.protein_type}")
     print(f"Using linker sequence: {args.linker}")
     print(f"Maximum number of epitopes: {args.max_epitopes}")
     print(f"Similarity threshold: {args.similarity_threshold}")
+    print(f"Selection engine: {args.selection_engine}")
+    selection_summary = ''
+    ordering_summary = ''
     
     # Read the combined epitopes
     try:
-        epitopes_df = pd.read_csv(args.combined_epitopes)
+        epitopes_df = read_table(args.combined_epitopes)
         print(f"Loaded {len(epitopes_df)} epitopes from {args.combined_epitopes}")
     except Exception as e:
         print(f"Error reading epitope file: {e}")
@@ -132,58 +312,32 @@ def main():
                     # Default score if missing
                     epitopes_df['consensus_score'] = 0.5
             
+            # Non-numeric scores (e.g. 'N/A') rank last instead of breaking selection and the report
+            epitopes_df['consensus_score'] = pd.to_numeric(epitopes_df['consensus_score'], errors='coerce')
+            
             # Ensure 'type' column exists
             if 'type' not in epitopes_df.columns:
                 # Default to 'unknown' type
                 epitopes_df['type'] = 'unknown'
             
-            # Calculate target counts for each epitope type
-            total_epitopes = min(args.max_epitopes, len(epitopes_df))
-            
-            # Two-step selection for diversity:
-            # 1. First select diverse epitopes within each type
-            b_cell_df = epitopes_df[epitopes_df['type'] == 'B-cell']
-            mhc_i_df = epitopes_df[epitopes_df['type'] == 'MHC-I']
-            mhc_ii_df = epitopes_df[epitopes_df['type'] == 'MHC-II']
-            
-            # Calculate proportional allocations
-            b_cell_count = min(total_epitopes // 3, len(b_cell_df)) if len(b_cell_df) > 0 else 0
-            mhc_i_count = min(total_epitopes // 3, len(mhc_i_df)) if len(mhc_i_df) > 0 else 0
-            mhc_ii_count = min(total_epitopes - b_cell_count - mhc_i_count, len(mhc_ii_df)) if len(mhc_ii_df) > 0 else 0
-            
-            print(f"Allocating epitopes: B-cell: {b_cell_count}, MHC-I: {mhc_i_count}, MHC-II: {mhc_ii_count}")
-            
-            # Select diverse epitopes from each type
-            bcell_epitopes = select_diverse_epitopes(b_cell_df, b_cell_count, args.similarity_threshold) if b_cell_count > 0 else pd.DataFrame(columns=epitopes_df.columns)
-            mhci_epitopes = select_diverse_epitopes(mhc_i_df, mhc_i_count, args.similarity_threshold) if mhc_i_count > 0 else pd.DataFrame(columns=epitopes_df.columns)
-            mhcii_epitopes = select_diverse_epitopes(mhc_ii_df, mhc_ii_count, args.similarity_threshold) if mhc_ii_count > 0 else pd.DataFrame(columns=epitopes_df.columns)
-            
-            # 2. Now combine and ensure diversity across the entire set
-            combined_df = pd.concat([bcell_epitopes, mhci_epitopes, mhcii_epitopes])
+            # Parameter sweep: design every combination from the one loaded table
+            if sweep_grid:
+                run_sweep(epitopes_df, sweep_grid)
+                return
             
-            # If we don't have enough epitopes after the first round, try to fill from remaining
-            if len(combined_df) < total_epitopes:
-                remaining_count = total_epitopes - len(combined_df)
-                print(f"Only selected {len(combined_df)} epitopes in first round, attempting to select {remaining_count} more")
-                
-                # Get sequences we've already selected
-                selected_sequences = combined_df['sequence'].tolist()
-                
-                # Find epitopes we haven't selected yet
-                remaining_df = epitopes_df[~epitopes_df['sequence'].isin(selected_sequences)]
-                
-                if len(remaining_df) > 0:
-                    # Select additional diverse epitopes from remaining
-                    additional_epitopes = select_diverse_epitopes(remaining_df, remaining_count, args.similarity_threshold)
-                    combined_df = pd.concat([combined_df, additional_epitopes])
+            selected_epitopes, selection_summary = choose_epitopes(epitopes_df, args.max_epitopes,
+                                                                   args.similarity_threshold, args.linker)
+            if selected_epitopes is None:
+                sys.stderr.write(f"ERROR: {selection_summary}\n")
+                sys.exit(1)
+            print(f"Selected {len(selected_epitopes)} diverse epitopes for the vaccine construct")
             
-            # Final selection
-            selected_epitopes = combined_df.sort_values('consensus_score', ascending=False).head(total_epitopes)
+            selected_epitopes, ordering_summary = order_epitopes(selected_epitopes, args.linker)
+            if ordering_summary:
+                print(f"Junction-aware ordering {ordering_summary}")
             
             # Extract sequences
             epitope_sequences = selected_epitopes['sequence'].tolist()
-            
-            print(f"Selected {len(epitope_sequences)} diverse epitopes for the vaccine construct")
     
     # Construct the vaccine sequence with linkers
     if len(epitope_sequences) >= args.min_epitopes:
@@ -216,126 +370,66 @@ def main():
     SeqIO.write(vaccine_record, args.output_fasta, "fasta")
     print(f"Vaccine construct saved to {args.output_fasta}")
     
-    # Generate HTML report
-    with open(args.output_report, 'w') as f:
-        f.write(f'''<!DOCTYPE html>
-    <html>
-    <head>
-        <title>{args.protein_type} Vaccine Design Report</title>
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 20px; }}
-            h1, h2 {{ color: #2c3e50; }}
-            table {{ border-collapse: collapse; width: 100%; }}
-            th, td {{ padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }}
-            th {{ background-color: #f2f2f2; }}
-            .sequence {{ font-family: monospace; word-break: break-all; }}
-            .stats {{ margin: 20px 0; padding: 10px; background-color: #f8f9fa; border-radius: 5px; }}
-            .warning {{ color: #e74c3c; }}
-        </style>
-    </head>
-    <body>
-        <h1>H5N1 {args.protein_type.capitalize()} Epitope-Based Vaccine Design Report</h1>
-        <p>Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-        
-        <div class="stats">
-            <h2>Vaccine Statistics</h2>
-            <p><strong>Protein:</strong> {args.protein_type}</p>
-            <p><strong>Number of epitopes:</strong> {len(epitope_sequences)}</p>
-            <p><strong>Linker sequence:</strong> {args.linker}</p>
-            <p><strong>Total length:</strong> {len(vaccine_sequence)} amino acids</p>
-            <p><strong>Similarity threshold:</strong> {args.similarity_threshold}</p>
-            
-            ''')
-        
-        # Add warning if insufficient epitopes
-        if len(epitope_sequences) < args.min_epitopes:
-            f.write(f'''
-            <p class="warning"><strong>Warning:</strong> Only {len(epitope_sequences)} epitopes found, which is less than the minimum required ({args.min_epitopes}).</p>
-            ''')
-            
-        f.write(f'''
-        </div>
-        
-        <h2>Final Vaccine Construct</h2>
-        <p class="sequence">{vaccine_sequence}</p>
+    # Generate HTML report (written section by section) and its structured sidecar
+    report_data = args.report_data or os.path.splitext(args.output_report)[0] + '.json'
+    insufficient = len(epitope_sequences) < args.min_epitopes
+    summary = {
+        'protein_type': args.protein_type,
+        'n_epitopes': len(epitope_sequences),
+        'min_epitopes': args.min_epitopes,
+        'linker': args.linker,
+        'leading_seq': args.leading_seq,
+        'trailing_seq': args.trailing_seq,
+        'length': len(vaccine_sequence),
+        'similarity_threshold': args.similarity_threshold,
+        'selection_engine': args.selection_engine,
+        'selection_summary': selection_summary,
+        'ordering': args.ordering,
+        'ordering_summary': ordering_summary,
+        'construct': vaccine_sequence
+    }
+    
+    with HtmlReport(args.output_report, f"{args.protein_type} Vaccine Design Report",
+                    f"H5N1 {args.protein_type.capitalize()} Epitope-Based Vaccine Design Report",
+                    datetime.now().strftime('%Y-%m-%d %H:%M:%S')) as report, Sidecar(report_data, summary) as sidecar:
+        report.stats('Vaccine Statistics', [
+            ('Protein', args.protein_type),
+            ('Number of epitopes', len(epitope_sequences)),
+            ('Linker sequence', args.linker),
+            ('Total length', f"{len(vaccine_sequence)} amino acids"),
+            ('Similarity threshold', str(args.similarity_threshold)),
+            ('Selection engine', f"{args.selection_engine} {selection_summary}"),
+            ('Epitope order', f"{args.ordering} {ordering_summary}")
+        ], warning=(f"Only {len(epitope_sequences)} epitopes found, which is less than the minimum required ({args.min_epitopes})."
+                    if insufficient else None))
         
-        <h2>Construct Components</h2>
-        <table>
-            <tr>
-                <th>Component</th>
-                <th>Sequence</th>
-                <th>Length</th>
-            </tr>
-        ''')
+        report.heading('Final Vaccine Construct')
+        report.paragraph(vaccine_sequence, css_class='sequence')
         
-        # Add leading sequence if present
+        # Leading sequence, epitopes with linkers and trailing sequence, when present
+        report.heading('Construct Components')
+        report.start_table(['Component', 'Sequence', 'Length'], sequence_columns=['Sequence'])
         if args.leading_seq:
-            f.write(f'''
-            <tr>
-                <td>Leading sequence</td>
-                <td class="sequence">{args.leading_seq}</td>
-                <td>{len(args.leading_seq)}</td>
-            </tr>
-            ''')
-            
-        # Add epitopes section
+            report.row(['Leading sequence', args.leading_seq, len(args.leading_seq)])
         if epitope_sequences:
-            f.write(f'''
-            <tr>
-                <td>Epitopes with linkers</td>
-                <td class="sequence">{args.linker.join(epitope_sequences)}</td>
-                <td>{len(args.linker.join(epitope_sequences))}</td>
-            </tr>
-            ''')
-        
-        # Add trailing sequence if present    
+            middle_sequence = args.linker.join(epitope_sequences)
+            report.row(['Epitopes with linkers', middle_sequence, len(middle_sequence)])
         if args.trailing_seq:
-            f.write(f'''
-            <tr>
-                <td>Trailing sequence</td>
-                <td class="sequence">{args.trailing_seq}</td>
-                <td>{len(args.trailing_seq)}</td>
-            </tr>
-            ''')
-            
-        f.write('''
-        </table>
-        
-        <h2>Selected Epitopes</h2>
-        <table>
-            <tr>
-                <th>Sequence</th>
-                <th>Type</th>
-                <th>HLA Restriction</th>
-                <th>Score</th>
-            </tr>
-        ''')
+            report.row(['Trailing sequence', args.trailing_seq, len(args.trailing_seq)])
+        report.end_table()
         
-        # Add each epitope to the table
+        # Add each epitope to the table, in construct order
+        report.heading('Selected Epitopes')
+        report.start_table(['Sequence', 'Type', 'HLA Restriction', 'Score'], sequence_columns=['Sequence'])
         if len(epitope_sequences) > 0:
-            for _, row in selected_epitopes.iterrows():
-                hla = row.get('hla', 'N/A')
-                f.write(f'''
-                <tr>
-                    <td class="sequence">{row['sequence']}</td>
-                    <td>{row['type']}</td>
-                    <td>{hla}</td>
-                    <td>{row.get('consensus_score', 'N/A'):.3f}</td>
-                </tr>
-                ''')
+            for position, epitope in enumerate(selected_epitopes.to_dict('records'), 1):
+                report.row([epitope['sequence'], epitope.get('type'), epitope.get('hla'), epitope.get('consensus_score')])
+                sidecar.row({'position': position, **epitope})
         else:
-            f.write(f'''
-            <tr>
-                <td colspan="4">No epitopes selected.</td>
-            </tr>
-            ''')
-        
-        f.write('''
-        </table>
-    </body>
-    </html>
-        ''')
+            report.empty_row('No epitopes selected.')
+        report.end_table()
     
+    print(f"Structured report data saved to {sidecar.path}")
     print(f"Vaccine design report saved to {args.output_report}")
 
 if __name__ == "__main__":
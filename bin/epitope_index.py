@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+# epitope_index.py
+"""Canonical epitope table: one integer ID per unique peptide, with per-allele rows kept alongside."""
+
+import numpy as np
+import pandas as pd
+
+
+class EpitopeIndex:
+    """Integer IDs for the distinct epitopes of a prediction table.
+
+    Predictors write one row per peptide and allele (or method), so the same peptide repeats many
+    times. `ids` maps every row to its epitope (IDs follow first appearance) and `table` holds one row
+    of key values per epitope; the per-allele data stays in the caller's rows, joined through `ids`.
+    Epitopes are keyed by sequence by default; any columns can be used (e.g. start and end).
+    """
+
+    def __init__(self, rows, keys=('sequence',)):
+        keys = list(keys)
+        codes, uniques = pd.MultiIndex.from_frame(rows[keys]).factorize()
+        self.keys = keys
+        self.ids = np.asarray(codes, dtype=np.int64)
+        self.table = uniques.to_frame(index=False)
+        self.table.columns = keys
+        self._row_order = None
+        self._row_bounds = None
+
+    def __len__(self):
+        return len(self.table)
+
+    @property
+    def peptides(self):
+        """Values of the first key column (the sequences, by default), one per epitope"""
+        return self.table[self.keys[0]].tolist()
+
+    def multiplicity(self):
+        """Number of rows (alleles, methods) behind each epitope"""
+        return np.bincount(self.ids, minlength=len(self))
+
+    def first_rows(self):
+        """Row position at which each epitope first appears"""
+        first = np.full(len(self), len(self.ids), dtype=np.int64)
+        np.minimum.at(first, self.ids, np.arange(len(self.ids)))
+        return first
+
+    def rows_of(self, epitope_ids):
+        """Row positions of the given epitopes, in row order"""
+        if self._row_order is None:
+            self._row_order = np.argsort(self.ids, kind='stable')
+            self._row_bounds = np.concatenate(([0], np.cumsum(self.multiplicity())))
+        parts = [self._row_order[self._row_bounds[i]:self._row_bounds[i + 1]] for i in epitope_ids]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def reduce(self, values, how='sum'):
+        """Collapse a per-row array to one value per epitope ('sum', 'mean', 'max' or 'min')"""
+        values = np.asarray(values, dtype=float)
+        if how == 'sum':
+            return np.bincount(self.ids, weights=values, minlength=len(self))
+        if how == 'mean':
+            return np.bincount(self.ids, weights=values, minlength=len(self)) / np.maximum(self.multiplicity(), 1)
+        if how in ('max', 'min'):
+            result = np.full(len(self), -np.inf if how == 'max' else np.inf)
+            (np.maximum if how == 'max' else np.minimum).at(result, self.ids, values)
+            return result
+        raise ValueError(f"Unknown reduction '{how}'")
+
+    def expand(self, values):
+        """Broadcast a per-epitope array back to the rows"""
+        return np.asarray(values)[self.ids]
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+# epitope_selection.py
+"""Exact epitope set selection by branch-and-bound under count, type, similarity and length constraints."""
+
+import time
+
+import numpy as np
+
+from epitope_similarity import PeptideSet
+
+
+class SelectionResult:
+    """Selected candidate positions plus how close the search got to the proven optimum"""
+
+    def __init__(self, positions, score, upper_bound, nodes, elapsed, complete, feasible=True):
+        self.positions = positions
+        self.score = score
+        self.upper_bound = upper_bound
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.complete = complete
+        self.feasible = feasible
+        # Per-type minimums as {type: (minimum, candidates available)}, for reporting infeasible searches
+        self.minimums = {}
+
+    @property
+    def gap(self):
+        """Relative gap between the best set found and the best bound (0 when proven optimal)"""
+        if self.complete or self.upper_bound <= 0:
+            return 0.0
+        return max(0.0, (self.upper_bound - self.score) / self.upper_bound)
+
+    def unmet_minimums(self):
+        """'TYPE>=MIN (N candidates)' for every per-type minimum of the search"""
+        return ', '.join(f"{name}>={minimum} ({available} candidates)"
+                         for name, (minimum, available) in sorted(self.minimums.items()))
+
+    def summary(self):
+        if not self.feasible:
+            status = 'infeasible' if self.complete else 'no feasible selection found within the time budget'
+            return (f"No selection meets the per-type minimums {self.unmet_minimums() or '(none)'}: "
+                    f"{status} ({self.nodes} nodes in {self.elapsed:.2f}s)")
+        status = 'optimal' if self.complete else f"time budget reached, gap {self.gap:.2%}"
+        return (f"Selected {len(self.positions)} epitopes, total score {self.score:.4f} "
+                f"(upper bound {self.upper_bound:.4f}; {status}; {self.nodes} nodes in {self.elapsed:.2f}s)")
+
+
+def parse_type_counts(text):
+    """Parse 'B-cell=3,MHC-I=3' into {'B-cell': 3, 'MHC-I': 3}"""
+    counts = {}
+    if not text:
+        return counts
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        name, _, value = item.partition('=')
+        if not value:
+            raise ValueError(f"Expected TYPE=COUNT, got '{item}'")
+        counts[name.strip()] = int(value)
+    return counts
+
+
+def conflict_lists(sequences, similarity_threshold):
+    """For each sequence, the indices of the others whose similarity exceeds the threshold.
+
+    Only a threshold test is needed, so the k-mer prefilter (exact for that test) keeps this
+    close to linear in the number of candidates instead of comparing every pair. Repeated
+    sequences (the same peptide predicted for several alleles) are compared once.
+    """
+    unique, inverse = np.unique(np.asarray(sequences, dtype=object), return_inverse=True)
+    unique = unique.tolist()
+    members = [[] for _ in unique]
+    for i, u in enumerate(inverse.tolist()):
+        members[u].append(i)
+    members = [np.asarray(m, dtype=np.int64) for m in members]
+
+    peptides = PeptideSet(unique, prefilter=True)
+    conflicts = [None] * len(sequences)
+    for u, sequence in enumerate(unique):
+        similar = np.flatnonzero(peptides.similarities(sequence, similarity_threshold) > similarity_threshold)
+        indices = np.concatenate([members[v] for v in similar]) if len(similar) else np.empty(0, dtype=np.int64)
+        for i in members[u]:
+            conflicts[i] = indices[indices != i]
+    return conflicts
+
+
+def clique_partition(conflicts):
+    """Greedily cover the conflict graph with cliques (mutually similar candidates), in index order"""
+    neighbours = [set(c.tolist()) for c in conflicts]
+    clique_of = np.empty(len(conflicts), dtype=np.int64)
+    cliques = []
+    for v, adjacent in enumerate(neighbours):
+        for c in sorted({int(clique_of[u]) for u in adjacent if u < v}):
+            if all(u in adjacent for u in cliques[c]):
+                cliques[c].append(v)
+                clique_of[v] = c
+                break
+        else:
+            clique_of[v] = len(cliques)
+            cliques.append([v])
+    return clique_of
+
+
+class _Search:
+    """Depth-first branch-and-bound over candidates sorted by descending score"""
+
+    def __init__(self, scores, lengths, type_codes, conflicts, max_count, type_max, type_min, length_budget):
+        self.scores = scores
+        self.gains = np.maximum(scores, 0.0)
+        self.lengths = lengths
+        self.type_codes = type_codes
+        self.conflicts = conflicts
+        self.max_count = max_count
+        self.type_max = type_max
+        self.type_min = type_min
+        self.length_budget = length_budget
+        self.n_types = len(type_max)
+        self.type_masks = [type_codes == t for t in range(self.n_types)]
+        self.clique_of = clique_partition(conflicts).tolist()
+        # Candidates by score per residue, for the fractional knapsack bound on construct length
+        self.density_order = np.argsort(-self.gains / np.maximum(lengths, 1), kind='stable')
+
+    def allowed(self, chosen, start, used_length):
+        """Mask of candidates from `start` on that could still be added to the chosen set"""
+        n = len(self.scores)
+        blocked = np.zeros(n, dtype=bool)
+        blocked[:start] = True
+        for i in chosen:
+            blocked[self.conflicts[i]] = True
+        counts = np.bincount(self.type_codes[list(chosen)], minlength=self.n_types) if chosen else np.zeros(self.n_types, dtype=np.int64)
+        # Once the remaining slots are all needed for per-type minimums, only those types may be added
+        missing = np.maximum(self.type_min - counts, 0)
+        reserved = missing.sum() >= self.max_count - len(chosen)
+        for t in range(self.n_types):
+            if counts[t] >= self.type_max[t] or (reserved and missing[t] == 0):
+                blocked |= self.type_masks[t]
+        if self.length_budget is not None:
+            blocked |= self.lengths > self.length_budget - used_length
+        return ~blocked, counts
+
+    def bound(self, chosen, score, used_length, allowed, counts):
+        """Upper bound on the score of any completion of the chosen set.
+
+        Slots reserved for per-type minimums are worth at most that type's best remaining gains; the
+        other slots at most the best remaining gains overall (under type caps, and one per conflict
+        clique). Returns None when the per-type minimums can no longer be met.
+        """
+        slots = self.max_count - len(chosen)
+        needed = 0
+        required = 0.0
+        gains = []
+        for t in range(self.n_types):
+            available = np.flatnonzero(allowed & self.type_masks[t])
+            missing = max(0, self.type_min[t] - counts[t])
+            if len(available) < missing:
+                return None
+            needed += missing
+            # Candidates are in score order, so each type's best are its first allowed entries
+            required += float(self.gains[available[:missing]].sum())
+            gains.append(self.gains[available[:self.type_max[t] - counts[t]]])
+        if needed > slots:
+            return None
+
+        free = slots - needed
+        gains = np.concatenate(gains) if gains else np.empty(0)
+        if free <= 0 or len(gains) == 0:
+            return score + required
+        if len(gains) > free:
+            gains = np.partition(gains, len(gains) - free)[-free:]
+        bound = score + required + min(float(gains.sum()), self.clique_bound(allowed, free))
+        if self.length_budget is None:
+            return bound
+        return min(bound, score + self.knapsack_bound(allowed, used_length))
+
+    def clique_bound(self, allowed, slots):
+        """At most one epitope per conflict clique: the best remaining gain of each, top `slots` of them"""
+        # Candidates are in score order, so the first candidate seen from each clique is its best
+        seen = set()
+        total = 0.0
+        candidates = np.flatnonzero(allowed)
+        for first in range(0, len(candidates), 256):
+            for v in candidates[first:first + 256].tolist():
+                if self.gains[v] <= 0:
+                    return total
+                c = self.clique_of[v]
+                if c not in seen:
+                    seen.add(c)
+                    total += self.gains[v]
+                    if len(seen) >= slots:
+                        return total
+        return total
+
+    def knapsack_bound(self, allowed, used_length):
+        """Fractional knapsack over the remaining length budget (ignores counts and types)"""
+        order = self.density_order[allowed[self.density_order]]
+        remaining = self.length_budget - used_length
+        lengths = self.lengths[order]
+        gains = self.gains[order]
+        filled = np.cumsum(lengths)
+        whole = int(np.searchsorted(filled, remaining, side='right'))
+        total = float(gains[:whole].sum())
+        if whole < len(order):
+            room = remaining - (filled[whole - 1] if whole else 0)
+            total += gains[whole] * room / lengths[whole]
+        return total
+
+    def feasible(self, chosen):
+        counts = np.bincount(self.type_codes[list(chosen)], minlength=self.n_types) if chosen else np.zeros(self.n_types, dtype=np.int64)
+        return bool((counts >= self.type_min).all())
+
+    def greedy(self):
+        """Score-order greedy fill that meets the per-type minimums first, used as the starting incumbent"""
+        chosen = []
+        used_length = 0
+        phases = [(self.type_masks[t], self.type_min[t]) for t in range(self.n_types) if self.type_min[t] > 0]
+        phases.append((self.scores > 0, self.max_count))
+        for mask, target in phases:
+            for _ in range(target):
+                if len(chosen) >= self.max_count:
+                    break
+                allowed, _ = self.allowed(chosen, 0, used_length)
+                allowed[chosen] = False
+                candidates = np.flatnonzero(allowed & mask)
+                if len(candidates) == 0:
+                    break
+                j = int(candidates[0])
+                chosen.append(j)
+                used_length += self.lengths[j]
+        return sorted(chosen), float(self.scores[chosen].sum())
+
+    def run(self, time_budget):
+        started = time.monotonic()
+        best, best_score = self.greedy()
+        if not self.feasible(best):
+            best, best_score = None, -np.inf
+
+        # Each stack entry is an unexplored subtree: (next index, chosen, score, used length)
+        stack = [(0, (), 0.0, 0)]
+        nodes = 0
+        while stack:
+            if time_budget is not None and time.monotonic() - started > time_budget:
+                break
+            start, chosen, score, used_length = stack.pop()
+            nodes += 1
+
+            if score > best_score and self.feasible(chosen):
+                best, best_score = list(chosen), score
+
+            if len(chosen) >= self.max_count:
+                continue
+            allowed, counts = self.allowed(chosen, start, used_length)
+            bound = self.bound(chosen, score, used_length, allowed, counts)
+            if bound is None or bound <= best_score + 1e-12:
+                continue
+
+            candidates = np.flatnonzero(allowed)
+            if len(candidates) == 0:
+                continue
+            j = int(candidates[0])
+
+            # Explore "include j" first so good sets are found early; "exclude j" waits on the stack
+            stack.append((j + 1, chosen, score, used_length))
+            stack.append((j + 1, chosen + (j,), score + self.scores[j], used_length + self.lengths[j]))
+
+        complete = not stack
+        upper_bound = best_score if best is not None else 0.0
+        for start, chosen, score, used_length in stack:
+            allowed, counts = self.allowed(chosen, start, used_length)
+            bound = self.bound(chosen, score, used_length, allowed, counts)
+            if bound is not None:
+                upper_bound = max(upper_bound, bound)
+
+        return SelectionResult(sorted(best or []), float(best_score) if best is not None else 0.0,
+                               float(upper_bound), nodes, time.monotonic() - started, complete,
+                               feasible=best is not None)
+
+
+def solve_selection(sequences, scores, types, max_count, similarity_threshold=0.7, type_max=None,
+                    type_min=None, max_length=None, linker_length=0, fixed_length=0, time_budget=10.0,
+                    conflicts=None):
+    """Choose the subset of candidates with the highest summed score.
+
+    Constraints: at most `max_count` epitopes, per-type maximum/minimum counts, no pair more similar
+    than `similarity_threshold`, and a construct (epitopes + linkers + fixed flanks) no longer than
+    `max_length`. The search stops after `time_budget` seconds and reports the remaining gap.
+    `conflicts` may pass in conflict_lists(sequences, similarity_threshold) to reuse it across calls.
+    Returned positions index into the input sequences.
+    """
+    sequences = list(sequences)
+    scores = np.nan_to_num(np.asarray(scores, dtype=float))
+    type_max = type_max or {}
+    type_min = type_min or {}
+    type_names = sorted(set(types) | set(type_min))
+    type_index = {name: t for t, name in enumerate(type_names)}
+
+    # Search in descending score order (stable, so ties keep input order)
+    order = np.argsort(-scores, kind='stable')
+    sorted_sequences = [sequences[i] for i in order]
+    type_codes = np.array([type_index[types[i]] for i in order], dtype=np.int64)
+    if conflicts is None:
+        conflicts = conflict_lists(sequences, similarity_threshold)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    sorted_conflicts = [rank[conflicts[i]] for i in order]
+
+    # Every epitope costs its own length plus one linker; the first linker is refunded in the budget
+    lengths = np.array([len(s) + linker_length for s in sorted_sequences], dtype=np.int64)
+    length_budget = None
+    if max_length:
+        length_budget = max_length - fixed_length + linker_length
+
+    search = _Search(
+        scores[order], lengths, type_codes,
+        sorted_conflicts,
+        max_count,
+        np.array([type_max.get(name, max_count) for name in type_names], dtype=np.int64),
+        np.array([type_min.get(name, 0) for name in type_names], dtype=np.int64),
+        length_budget
+    )
+    result = search.run(time_budget)
+    result.positions = sorted(int(order[i]) for i in result.positions)
+    available = np.bincount(type_codes, minlength=len(type_names))
+    result.minimums = {name: (minimum, int(available[type_index[name]])) for name, minimum in type_min.items() if minimum > 0}
+    return result
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+# epitope_similarity.py
+"""Vectorized peptide similarity (max windowed identity) and diversity selection."""
+
+from collections import defaultdict
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def encode_peptide(peptide):
+    """Peptide string as a uint8 array of residue bytes"""
+    return np.frombuffer(peptide.encode('ascii', 'replace'), dtype=np.uint8)
+
+
+def pairwise_identity(queries, matrix):
+    """Similarity of every row of a C x m query matrix to every row of a K x n peptide matrix.
+
+    Similarity is the best identity of the shorter peptide over every offset in the longer one
+    (matches / shorter length), which is 1.0 whenever one peptide contains the other.
+    """
+    m = queries.shape[1]
+    n = matrix.shape[1]
+    if m == 0 or n == 0:
+        return np.ones((len(queries), len(matrix)))
+
+    if m <= n:
+        # Slide each query along each (longer or equal) member: C x K x offsets x m
+        windows = sliding_window_view(matrix, m, axis=1)
+        matches = (windows[None, :, :, :] == queries[:, None, None, :]).sum(axis=3)
+        return matches.max(axis=2) / m
+
+    # Slide each (shorter) member along each query
+    windows = sliding_window_view(queries, n, axis=1)
+    matches = (windows[:, None, :, :] == matrix[None, :, None, :]).sum(axis=3)
+    return matches.max(axis=2) / n
+
+
+def max_identity(query, matrix):
+    """Similarity of one peptide to every row of a same-length peptide matrix"""
+    query = encode_peptide(query) if isinstance(query, str) else query
+    return pairwise_identity(query[None, :], matrix)[0]
+
+
+def peptide_matrix(peptides, length):
+    """Stack same-length peptides into an N x length uint8 matrix"""
+    return (np.frombuffer(''.join(peptides).encode('ascii', 'replace'), dtype=np.uint8)
+            .reshape(len(peptides), length))
+
+
+def min_matching_residues(length, threshold):
+    """Smallest match count whose identity over `length` residues exceeds the threshold"""
+    for matches in range(length + 1):
+        if matches / length > threshold:
+            return matches
+    return None
+
+
+def prefilter_kmer_size(length, threshold):
+    """k such that any pair above the threshold must share a k-mer (0 if no useful bound exists).
+
+    With at most d mismatches over the shorter peptide's `length` residues, splitting it into d + 1
+    blocks leaves one block without a mismatch (the q-gram lemma).
+    """
+    if length == 0:
+        return 0
+    matches = min_matching_residues(length, threshold)
+    if matches is None:
+        return length + 1
+    return length // (length - matches + 1)
+
+
+def kmers(peptide, k):
+    return {peptide[i:i + k] for i in range(len(peptide) - k + 1)}
+
+
+class PeptideSet:
+    """Peptides bucketed by length as uint8 matrices, for vectorized similarity queries.
+
+    With `prefilter` enabled, an inverted k-mer index skips rows that cannot exceed the threshold.
+    """
+
+    def __init__(self, peptides=(), prefilter=False):
+        self.prefilter = prefilter
+        self._rows = defaultdict(list)
+        self._ids = defaultdict(list)
+        self._matrices = {}
+        self._id_arrays = {}
+        self._kmer_index = {}
+        self.size = 0
+        for peptide in peptides:
+            self.add(peptide)
+
+    def add(self, peptide):
+        """Add a peptide; returns its id (insertion order)"""
+        ident = self.size
+        length = len(peptide)
+        self._rows[length].append(peptide)
+        self._ids[length].append(ident)
+        self._matrices.pop(length, None)
+        self._id_arrays.pop(length, None)
+        for (group_length, k), index in self._kmer_index.items():
+            if group_length == length:
+                for kmer in kmers(peptide, k):
+                    index[kmer].append(len(self._rows[length]) - 1)
+        self.size += 1
+        return ident
+
+    def _matrix(self, length):
+        if length not in self._matrices:
+            self._matrices[length] = peptide_matrix(self._rows[length], length)
+        return self._matrices[length]
+
+    def _id_array(self, length):
+        if length not in self._id_arrays:
+            self._id_arrays[length] = np.asarray(self._ids[length], dtype=np.int64)
+        return self._id_arrays[length]
+
+    def _candidate_rows(self, query, length, threshold):
+        """Rows of one length bucket that may exceed the threshold (all rows without prefilter)"""
+        n_rows = len(self._rows[length])
+        if not self.prefilter or threshold is None:
+            return np.arange(n_rows)
+
+        k = prefilter_kmer_size(min(len(query), length), threshold)
+        if k == 0:
+            return np.arange(n_rows)
+        if k > min(len(query), length):
+            return np.empty(0, dtype=np.int64)
+
+        key = (length, k)
+        if key not in self._kmer_index:
+            index = defaultdict(list)
+            for row, peptide in enumerate(self._rows[length]):
+                for kmer in kmers(peptide, k):
+                    index[kmer].append(row)
+            self._kmer_index[key] = index
+
+        index = self._kmer_index[key]
+        rows = set()
+        for kmer in kmers(query, k):
+            rows.update(index.get(kmer, ()))
+        return np.array(sorted(rows), dtype=np.int64)
+
+    def similarities(self, query, threshold=None):
+        """Similarity of a peptide to every member, indexed by id.
+
+        With the prefilter on and a threshold given, members that provably cannot exceed the
+        threshold are reported as 0 without being compared.
+        """
+        result = np.zeros(self.size)
+        encoded = encode_peptide(query)
+        for length in self._ids:
+            rows = self._candidate_rows(query, length, threshold)
+            if len(rows) == 0:
+                continue
+            result[self._id_array(length)[rows]] = max_identity(encoded, self._matrix(length)[rows])
+        return result
+
+    def similarity_matrix(self, queries, threshold=None, chunk_size=256):
+        """Similarity of each query peptide (rows) to every member (columns, indexed by id).
+
+        Queries are compared in length-bucketed blocks. With the prefilter on and a threshold given,
+        each query is instead compared only against its own k-mer candidates (others reported as 0).
+        """
+        result = np.zeros((len(queries), self.size))
+        if self.size == 0 or len(queries) == 0:
+            return result
+
+        if self.prefilter and threshold is not None:
+            for position, query in enumerate(queries):
+                result[position] = self.similarities(query, threshold)
+            return result
+
+        by_length = defaultdict(list)
+        for position, query in enumerate(queries):
+            by_length[len(query)].append(position)
+
+        for query_length, positions in by_length.items():
+            for first in range(0, len(positions), chunk_size):
+                block = positions[first:first + chunk_size]
+                encoded = peptide_matrix([queries[p] for p in block], query_length)
+                for length, ids in self._ids.items():
+                    result[np.ix_(block, ids)] = pairwise_identity(encoded, self._matrix(length))
+        return result
+
+    def any_above(self, query, threshold):
+        """True if any member is more similar to the peptide than the threshold"""
+        return self.size > 0 and bool((self.similarities(query, threshold) > threshold).any())
+
+
+def select_diverse(sequences, max_count, similarity_threshold=0.7, prefilter=False, batch_size=256):
+    """Greedily pick sequences in the given (score) order, skipping any too similar to one already picked.
+
+    Returns the positions of the selected sequences, identical to comparing each candidate against every
+    selected peptide one pair at a time. Candidates are screened in batches against the whole selected
+    set at once; a peptide selected mid-batch is then compared against the rest of its batch in one go.
+    """
+    selected = PeptideSet(prefilter=prefilter)
+    positions = []
+
+    for first in range(0, len(sequences), batch_size):
+        batch = list(sequences[first:first + batch_size])
+        blocked = (selected.similarity_matrix(batch, similarity_threshold) > similarity_threshold).any(axis=1)
+
+        for j, sequence in enumerate(batch):
+            if blocked[j]:
+                continue
+            selected.add(sequence)
+            positions.append(first + j)
+
+            # Stop once we have enough epitopes
+            if len(positions) >= max_count:
+                return positions
+
+            # The new selection may rule out later candidates in this batch
+            rest = batch[j + 1:]
+            if rest:
+                blocked[j + 1:] |= PeptideSet(rest, prefilter=prefilter).similarities(
+                    sequence, similarity_threshold) > similarity_threshold
+
+    return positions
+
+
+class SimilarityIndex:
+    """Exact similarity rows over a fixed peptide pool, computed on demand and kept for reuse.
+
+    Lets many selections over the same candidates (e.g. a parameter sweep) share one set of
+    comparisons: a row is only computed the first time its peptide is selected.
+    """
+
+    def __init__(self, peptides):
+        self.peptides = list(dict.fromkeys(peptides))
+        self.ids = {peptide: i for i, peptide in enumerate(self.peptides)}
+        self._pool = PeptideSet(self.peptides)
+        self._rows = {}
+
+    def row(self, ident):
+        """Similarity of pool peptide `ident` to every pool peptide"""
+        if ident not in self._rows:
+            self._rows[ident] = self._pool.similarities(self.peptides[ident])
+        return self._rows[ident]
+
+    def select_diverse(self, sequences, max_count, similarity_threshold=0.7):
+        """Same greedy selection as select_diverse(), for sequences drawn from the pool"""
+        ids = np.array([self.ids[sequence] for sequence in sequences], dtype=np.int64)
+        blocked = np.zeros(len(ids), dtype=bool)
+        positions = []
+        position = 0
+        while position < len(ids):
+            positions.append(position)
+
+            # Stop once we have enough epitopes
+            if len(positions) >= max_count:
+                break
+
+            # Similarity is symmetric, so the new peptide's row rules out later candidates directly
+            blocked |= self.row(ids[position])[ids] > similarity_threshold
+            remaining = np.flatnonzero(~blocked[position + 1:])
+            if len(remaining) == 0:
+                break
+            position += 1 + int(remaining[0])
+        return positions
@@ -6,6 +6,32 @@ import subprocess
 import argparse
 import time
 import textwrap
+import json
+import re
+import numpy as np
+from physchem import AMINO_ACIDS, PROPERTY_NAMES, amino_acid_composition, evaluate_sequences
+from prediction_cache import add_cache_arguments, open_cache
+from score_tracks import segment_regions
+
+# Residue weights of the rule-based allergenicity model
+ALLERGEN_WEIGHTS = {
+    'E': 1.5,  # Glutamic acid - high in many allergens
+    'D': 1.5,  # Aspartic acid
+    'K': 1.3,  # Lysine
+    'R': 1.3,  # Arginine
+    'Q': 1.2,  # Glutamine
+    'N': 1.2,  # Asparagine
+    'Y': 1.1,  # Tyrosine
+    'F': 1.1,  # Phenylalanine
+    'W': 1.1   # Tryptophan
+}
+
+# Columns of the batch properties table, one row per construct
+BATCH_COLUMNS = [
+    'construct_id', 'length', 'molecular_weight', 'theoretical_pi', 'instability_index', 'gravy',
+    'aromaticity', 'epitope_count', 'allergenicity_score', 'allergenicity_prediction',
+    'helix_fraction', 'turn_fraction', 'sheet_fraction', 'antigenic_regions', 'report'
+]
 
 def main():
     # Parse command line arguments
@@ -14,9 +40,14 @@ def main():
     parser.add_argument('--protein-type', required=True, help='Protein type (e.g., hemagglutinin, neuraminidase)')
     parser.add_argument('--linker', default='GPGPG', help='Linker sequence used in the vaccine')
     parser.add_argument('--iedb-api-url', default='http://tools-api.iedb.org/tools_api/', help='IEDB API URL')
-    parser.add_argument('--output-evaluation', required=True, help='Output evaluation report file')
-    parser.add_argument('--output-properties', required=True, help='Output properties CSV file')
+    parser.add_argument('--output-evaluation', required=True, help='Output evaluation report file (batch summary with --batch)')
+    parser.add_argument('--output-properties', required=True, help='Output properties CSV file (one row per construct with --batch)')
     parser.add_argument('--output-colabfold', required=True, help='Output FASTA file for ColabFold')
+    parser.add_argument('--batch', action='store_true',
+                       help='Evaluate every construct in a multi-FASTA in one process')
+    parser.add_argument('--report-dir', default='construct_reports', help='Directory for per-construct reports (batch mode)')
+    parser.add_argument('--workers', type=int, default=4, help='Number of IEDB requests kept in flight (batch mode)')
+    add_cache_arguments(parser)
     
     args = parser.parse_args()
     
@@ -25,7 +56,6 @@ def main():
         import pandas as pd
         import numpy as np
         from Bio import SeqIO
-        from Bio.SeqUtils.ProtParam import ProteinAnalysis
         import requests
         import json
     except ImportError:
@@ -33,9 +63,13 @@ def main():
         import pandas as pd
         import numpy as np
         from Bio import SeqIO
-        from Bio.SeqUtils.ProtParam import ProteinAnalysis
         import requests
         import json
+    from iedb_client import IEDBClient
+    
+    if args.batch:
+        run_batch(args)
+        return
     
     print(f"Evaluating {args.protein_type} vaccine construct")
     
@@ -48,141 +82,28 @@ def main():
         print(f"Error reading vaccine file: {e}")
         vaccine_seq = "M"
     
-    # ====== PART 1: Use BioPython's ProtParam (local, lightweight) ======
-    try:
-        analysis = ProteinAnalysis(vaccine_seq)
-        
-        # Core properties
-        mol_weight = analysis.molecular_weight()
-        theoretical_pi = analysis.isoelectric_point()
-        instability_index = analysis.instability_index()
-        gravy = analysis.gravy()
-        aromaticity = analysis.aromaticity()
-        aa_composition = analysis.get_amino_acids_percent()
-        secondary_structure = analysis.secondary_structure_fraction()
-        
-        print("Completed BioPython ProtParam analysis")
-    except Exception as e:
-        print(f"Error in ProtParam analysis: {e}")
-        # Fallback values
-        mol_weight = 0
-        theoretical_pi = 0
-        instability_index = 0
-        gravy = 0
-        aromaticity = 0
-        aa_composition = {}
-        secondary_structure = (0, 0, 0)
+    # ====== PART 1: ProtParam properties (local, vectorized lookup tables) ======
+    properties = physicochemical_properties([vaccine_seq])[0]
     
     # ====== PART 2: IEDB API for epitope prediction (uses web service) ======
+    # API requests with retry logic and exponential backoff; cached responses skip the network
+    client = IEDBClient(workers=1, cache=open_cache(args), offline=args.offline)
     try:
-        # IEDB API for BepiPred-2.0
-        print("Predicting B-cell epitopes via IEDB API...")
-        
-        iedb_url = f"{args.iedb_api_url.rstrip('/')}{'/' if not args.iedb_api_url.endswith('/') else ''}bcell/"
-        data = {
-            "sequence_text": vaccine_seq,
-            "method": "bepipred",
-            "window_size": 7
-        }
-        
-        # API requests with retry logic
-        max_retries = 3
-        wait_time = 5  # seconds
-        bepipred_results = []
-        
-        for attempt in range(max_retries):
-            try:
-                response = requests.post(iedb_url, data=data)
-                if response.status_code == 200:
-                    bepipred_results = response.json()
-                    break
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    print(f"IEDB API attempt {attempt+1} failed. Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                    wait_time *= 2  # Exponential backoff
-                else:
-                    print(f"All IEDB API attempts failed: {e}")
-                    bepipred_results = []
-        
-        # Process epitope results
-        antigenic_regions = []
-        threshold = 0.5
-        in_region = False
-        start_pos = 0
-        
-        if isinstance(bepipred_results, list) and bepipred_results:
-            for i, result in enumerate(bepipred_results):
-                position = result.get('Position')
-                score = result.get('Score')
-                
-                if position is None or score is None:
-                    continue
-                    
-                if score > threshold and not in_region:
-                    in_region = True
-                    start_pos = position
-                elif (score <= threshold or i == len(bepipred_results) - 1) and in_region:
-                    in_region = False
-                    end_pos = position - 1 if score <= threshold else position
-                    
-                    # Calculate average score for this region
-                    region_scores = [r.get('Score', 0) for r in bepipred_results 
-                                   if r.get('Position') and start_pos <= r.get('Position') <= end_pos]
-                    avg_score = sum(region_scores) / len(region_scores) if region_scores else 0
-                    
-                    if end_pos - start_pos + 1 >= 8:  # Only regions with reasonable length
-                        antigenic_regions.append({
-                            "start": start_pos,
-                            "end": end_pos,
-                            "score": avg_score,
-                            "method": "BepiPred-2.0"
-                        })
-        
-        print(f"Found {len(antigenic_regions)} antigenic regions")
-        
-    except Exception as e:
-        print(f"Error in IEDB epitope prediction: {e}")
-        antigenic_regions = []
+        antigenic_regions = predict_antigenic_regions([vaccine_seq], args.iedb_api_url, client)[0]
+    finally:
+        client.close()
     
     # ====== PART 3: Allergenicity prediction (simple local model) ======
-    try:
-        print("Running allergenicity assessment...")
-        
-        # Known allergenic properties
-        allergen_aa = {
-            'E': 1.5,  # Glutamic acid - high in many allergens
-            'D': 1.5,  # Aspartic acid
-            'K': 1.3,  # Lysine
-            'R': 1.3,  # Arginine
-            'Q': 1.2,  # Glutamine
-            'N': 1.2,  # Asparagine
-            'Y': 1.1,  # Tyrosine
-            'F': 1.1,  # Phenylalanine
-            'W': 1.1   # Tryptophan
-        }
-        
-        # Calculate allergenicity score
-        allergen_count = sum(allergen_aa.get(aa, 0) for aa in vaccine_seq)
-        allergenicity_score = allergen_count / len(vaccine_seq) if len(vaccine_seq) > 0 else 0
-        allergenicity_score = min(1.0, allergenicity_score / 10)  # Scale to 0-1
-        
-        # Classify prediction
-        if allergenicity_score < 0.3:
-            allergenicity_prediction = "Probable Non-Allergen"
-        elif allergenicity_score < 0.6:
-            allergenicity_prediction = "Uncertain"
-        else:
-            allergenicity_prediction = "Probable Allergen"
-            
-    except Exception as e:
-        print(f"Error in allergenicity prediction: {e}")
-        allergenicity_score = 0.5
-        allergenicity_prediction = "Unknown"
+    allergenicity_score, allergenicity_prediction = assess_allergenicity([vaccine_seq])[0]
     
-    # Count epitopes based on linkers
-    linker = args.linker
-    epitope_count = vaccine_seq.count(linker) + 1 if linker in vaccine_seq else 1
+    evaluation = {
+        'sequence': vaccine_seq,
+        'epitope_count': count_epitopes(vaccine_seq, args.linker),
+        'allergenicity_score': allergenicity_score,
+        'allergenicity_prediction': allergenicity_prediction,
+        'antigenic_regions': antigenic_regions,
+        **properties
+    }
     
     # ====== PART 4: Create FASTA file for ColabFold ======
     with open(args.output_colabfold, "w") as f:
@@ -191,7 +112,226 @@ def main():
     print(f"Created FASTA file for ColabFold analysis: {args.output_colabfold}")
     
     # Compile all properties into a DataFrame
-    properties = {
+    pd.DataFrame(properties_table(evaluation)).to_csv(args.output_properties, index=False)
+    print(f"Properties saved to {args.output_properties}")
+    
+    # Create a detailed evaluation report
+    write_report(args.output_evaluation, evaluation, args.protein_type, os.path.basename(args.output_colabfold))
+    print(f"Evaluation report saved to {args.output_evaluation}")
+
+def run_batch(args):
+    """Evaluate every construct of a multi-FASTA in one process.
+    
+    Physicochemistry and allergenicity are computed for all constructs at once and the BepiPred
+    requests run through one worker pool. Writes one properties row per construct, a report per
+    construct in --report-dir, a batch summary and a multi-FASTA for ColabFold.
+    """
+    import pandas as pd
+    from Bio import SeqIO
+    from iedb_client import IEDBClient
+    
+    try:
+        records = list(SeqIO.parse(args.vaccine, "fasta"))
+    except Exception as e:
+        sys.stderr.write(f"ERROR: Could not parse FASTA file: {e}\n")
+        sys.exit(1)
+    if not records:
+        sys.stderr.write(f"ERROR: No constructs found in {args.vaccine}\n")
+        sys.exit(1)
+    
+    ids = [record.id for record in records]
+    sequences = [str(record.seq) for record in records]
+    print(f"Evaluating {len(records)} {args.protein_type} vaccine constructs")
+    
+    properties = physicochemical_properties(sequences, labels=ids)
+    
+    client = IEDBClient(workers=args.workers, cache=open_cache(args), offline=args.offline)
+    try:
+        regions = predict_antigenic_regions(sequences, args.iedb_api_url, client, labels=ids)
+    finally:
+        client.close()
+    
+    allergenicity = assess_allergenicity(sequences)
+    
+    os.makedirs(args.report_dir, exist_ok=True)
+    rows = []
+    with open(args.output_colabfold, "w") as colabfold:
+        for construct_id, name, sequence, props, construct_regions, (score, prediction) in zip(
+                ids, report_names(ids), sequences, properties, regions, allergenicity):
+            evaluation = {
+                'sequence': sequence,
+                'epitope_count': count_epitopes(sequence, args.linker),
+                'allergenicity_score': score,
+                'allergenicity_prediction': prediction,
+                'antigenic_regions': construct_regions,
+                **props
+            }
+            report = os.path.join(args.report_dir, f"{name}_evaluation.txt")
+            write_report(report, evaluation, args.protein_type, os.path.basename(args.output_colabfold))
+            if sequence:
+                colabfold.write(f">{args.protein_type}_{name}\n{sequence}\n")
+            
+            # ProtParam's secondary structure fractions are (helix, turn, sheet)
+            helix, turn, sheet = evaluation['secondary_structure']
+            rows.append({
+                'construct_id': construct_id,
+                'length': len(sequence),
+                'molecular_weight': evaluation['mol_weight'],
+                'theoretical_pi': evaluation['theoretical_pi'],
+                'instability_index': evaluation['instability_index'],
+                'gravy': evaluation['gravy'],
+                'aromaticity': evaluation['aromaticity'],
+                'epitope_count': evaluation['epitope_count'],
+                'allergenicity_score': score,
+                'allergenicity_prediction': prediction,
+                'helix_fraction': helix,
+                'turn_fraction': turn,
+                'sheet_fraction': sheet,
+                'antigenic_regions': len(construct_regions),
+                'report': report
+            })
+    
+    table = pd.DataFrame(rows, columns=BATCH_COLUMNS)
+    table.to_csv(args.output_properties, index=False)
+    print(f"Properties of {len(table)} constructs saved to {args.output_properties}")
+    
+    write_batch_summary(args.output_evaluation, table, args.protein_type)
+    print(f"Per-construct reports saved to {args.report_dir}; batch summary saved to {args.output_evaluation}")
+
+def report_names(ids):
+    """File-safe, unique names for construct IDs (duplicates get a numeric suffix)"""
+    names = []
+    seen = {}
+    for construct_id in ids:
+        name = re.sub(r'[^A-Za-z0-9_.-]', '_', construct_id) or 'construct'
+        seen[name] = seen.get(name, 0) + 1
+        names.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    return names
+
+def physicochemical_properties(sequences, labels=None):
+    """ProtParam properties of every construct, computed in one vectorized pass.
+    
+    Constructs ProtParam cannot analyse (empty, non-standard residues) get zero values, as before.
+    """
+    labels = labels or [''] * len(sequences)
+    values = evaluate_sequences(sequences)
+    composition = amino_acid_composition(sequences)
+    
+    results = []
+    failed = 0
+    for i, label in enumerate(labels):
+        prefix = f"[{label}] " if label else ""
+        if np.isnan([values[name][i] for name in PROPERTY_NAMES[1:]]).any():
+            print(f"{prefix}Error in ProtParam analysis: sequence is empty or contains non-standard residues")
+            failed += 1
+            # Fallback values
+            results.append({
+                'mol_weight': 0, 'theoretical_pi': 0, 'instability_index': 0, 'gravy': 0, 'aromaticity': 0,
+                'aa_composition': {}, 'secondary_structure': (0, 0, 0)
+            })
+            continue
+        results.append({
+            'mol_weight': float(values['molecular_weight'][i]),
+            'theoretical_pi': float(values['theoretical_pi'][i]),
+            'instability_index': float(values['instability_index'][i]),
+            'gravy': float(values['gravy'][i]),
+            'aromaticity': float(values['aromaticity'][i]),
+            'aa_composition': dict(zip(AMINO_ACIDS, composition[i].tolist())),
+            'secondary_structure': (float(values['helix_fraction'][i]), float(values['turn_fraction'][i]),
+                                    float(values['sheet_fraction'][i]))
+        })
+    
+    if failed < len(results):
+        print("Completed ProtParam analysis")
+    return results
+
+def predict_antigenic_regions(sequences, api_url, client, labels=None):
+    """BepiPred-2.0 antigenic regions of every construct via the IEDB API.
+    
+    Requests go through the client's worker pool; results keep the input order, with an empty
+    list for constructs whose prediction failed.
+    """
+    from iedb_client import json_response
+    
+    print("Predicting B-cell epitopes via IEDB API...")
+    iedb_url = f"{api_url.rstrip('/')}{'/' if not api_url.endswith('/') else ''}bcell/"
+    payloads = [{
+        "sequence_text": sequence,
+        "method": "bepipred",
+        "window_size": 7
+    } for sequence in sequences]
+    
+    try:
+        responses = client.post_all(iedb_url, payloads, labels=labels, validate=json_response)
+    except Exception as e:
+        print(f"Error in IEDB epitope prediction: {e}")
+        return [[] for _ in sequences]
+    
+    results = []
+    for label, response_text in zip(labels or [''] * len(sequences), responses):
+        prefix = f"[{label}] " if label else ""
+        try:
+            if response_text is None:
+                print(f"{prefix}All IEDB API attempts failed")
+                antigenic_regions = []
+            else:
+                antigenic_regions = parse_antigenic_regions(json.loads(response_text))
+            print(f"{prefix}Found {len(antigenic_regions)} antigenic regions")
+        except Exception as e:
+            print(f"{prefix}Error in IEDB epitope prediction: {e}")
+            antigenic_regions = []
+        results.append(antigenic_regions)
+    return results
+
+def parse_antigenic_regions(bepipred_results, threshold=0.5, min_length=8):
+    """Runs of residues scoring above the threshold in a BepiPred result list, min_length+ residues long"""
+    if not isinstance(bepipred_results, list) or not bepipred_results:
+        return []
+    scored = [(r.get('Position'), r.get('Score')) for r in bepipred_results]
+    scored = [(position, score) for position, score in scored if position is not None and score is not None]
+    if not scored:
+        return []
+    positions, scores = np.array(scored, dtype=float).T
+    starts, ends, means = segment_regions(scores, threshold, min_length=min_length,
+                                          positions=positions.astype(np.int64))
+    return [
+        {"start": start, "end": end, "score": score, "method": "BepiPred-2.0"}
+        for start, end, score in zip(starts.tolist(), ends.tolist(), means.tolist())
+    ]
+
+def assess_allergenicity(sequences):
+    """Rule-based allergenicity (score, prediction) for every construct"""
+    print("Running allergenicity assessment...")
+    results = []
+    for sequence in sequences:
+        try:
+            # Calculate allergenicity score
+            allergen_count = sum(ALLERGEN_WEIGHTS.get(aa, 0) for aa in sequence)
+            allergenicity_score = allergen_count / len(sequence) if len(sequence) > 0 else 0
+            allergenicity_score = min(1.0, allergenicity_score / 10)  # Scale to 0-1
+            
+            # Classify prediction
+            if allergenicity_score < 0.3:
+                allergenicity_prediction = "Probable Non-Allergen"
+            elif allergenicity_score < 0.6:
+                allergenicity_prediction = "Uncertain"
+            else:
+                allergenicity_prediction = "Probable Allergen"
+        except Exception as e:
+            print(f"Error in allergenicity prediction: {e}")
+            allergenicity_score = 0.5
+            allergenicity_prediction = "Unknown"
+        results.append((allergenicity_score, allergenicity_prediction))
+    return results
+
+def count_epitopes(sequence, linker):
+    """Count epitopes based on linkers"""
+    return sequence.count(linker) + 1 if linker in sequence else 1
+
+def properties_table(evaluation):
+    """The Property/Value/Unit/Interpretation table of one construct"""
+    secondary_structure = evaluation['secondary_structure']
+    return {
         "Property": [
             "Length", "Molecular Weight", "Theoretical pI", 
             "Instability Index", "GRAVY", "Aromaticity",
@@ -199,9 +339,9 @@ def main():
             "Helix Fraction", "Sheet Fraction", "Coil Fraction"
         ],
         "Value": [
-            len(vaccine_seq), f"{mol_weight:.2f}", f"{theoretical_pi:.2f}",
-            f"{instability_index:.2f}", f"{gravy:.4f}", f"{aromaticity:.4f}",
-            epitope_count, f"{allergenicity_score:.4f}",
+            len(evaluation['sequence']), f"{evaluation['mol_weight']:.2f}", f"{evaluation['theoretical_pi']:.2f}",
+            f"{evaluation['instability_index']:.2f}", f"{evaluation['gravy']:.4f}", f"{evaluation['aromaticity']:.4f}",
+            evaluation['epitope_count'], f"{evaluation['allergenicity_score']:.4f}",
             f"{secondary_structure[0]:.4f}", f"{secondary_structure[1]:.4f}", f"{secondary_structure[2]:.4f}"
         ],
         "Unit": [
@@ -221,32 +361,32 @@ def main():
             "Random coil content"
         ]
     }
-    
-    pd.DataFrame(properties).to_csv(args.output_properties, index=False)
-    print(f"Properties saved to {args.output_properties}")
-    
-    # Create a detailed evaluation report
-    with open(args.output_evaluation, "w") as f:
-        f.write(f"{args.protein_type.upper()} Vaccine Construct Evaluation\n")
-        f.write("=" * (len(args.protein_type) + 33) + "\n\n")
+
+def write_report(path, evaluation, protein_type, colabfold_name):
+    """Write the detailed evaluation report of one construct"""
+    vaccine_seq = evaluation['sequence']
+    secondary_structure = evaluation['secondary_structure']
+    with open(path, "w") as f:
+        f.write(f"{protein_type.upper()} Vaccine Construct Evaluation\n")
+        f.write("=" * (len(protein_type) + 33) + "\n\n")
         f.write(f"Sequence Length: {len(vaccine_seq)} amino acids\n")
-        f.write(f"Molecular Weight: {mol_weight:.2f} Da\n")
-        f.write(f"Theoretical pI: {theoretical_pi:.2f}\n")
-        f.write(f"Instability Index: {instability_index:.2f} (<40 suggests a stable protein)\n")
-        f.write(f"Grand Average of Hydropathy (GRAVY): {gravy:.4f}\n")
-        f.write(f"Aromaticity: {aromaticity:.4f}\n")
-        f.write(f"Number of Epitopes: {epitope_count}\n")
-        f.write(f"Allergenicity Prediction: {allergenicity_prediction}\n")
-        f.write(f"Allergenicity Score: {allergenicity_score:.4f} (<0.3 suggests non-allergen)\n")
+        f.write(f"Molecular Weight: {evaluation['mol_weight']:.2f} Da\n")
+        f.write(f"Theoretical pI: {evaluation['theoretical_pi']:.2f}\n")
+        f.write(f"Instability Index: {evaluation['instability_index']:.2f} (<40 suggests a stable protein)\n")
+        f.write(f"Grand Average of Hydropathy (GRAVY): {evaluation['gravy']:.4f}\n")
+        f.write(f"Aromaticity: {evaluation['aromaticity']:.4f}\n")
+        f.write(f"Number of Epitopes: {evaluation['epitope_count']}\n")
+        f.write(f"Allergenicity Prediction: {evaluation['allergenicity_prediction']}\n")
+        f.write(f"Allergenicity Score: {evaluation['allergenicity_score']:.4f} (<0.3 suggests non-allergen)\n")
         f.write(f"Secondary Structure: {secondary_structure[0]:.2f} helix, {secondary_structure[1]:.2f} sheet, {secondary_structure[2]:.2f} coil\n\n")
         
         f.write("Amino Acid Composition:\n")
-        for aa, percentage in sorted(aa_composition.items()):
+        for aa, percentage in sorted(evaluation['aa_composition'].items()):
             f.write(f"  {aa}: {percentage:.2f}%\n")
         
         f.write("\nPredicted Antigenic Regions:\n")
-        if antigenic_regions:
-            for region in antigenic_regions:
+        if evaluation['antigenic_regions']:
+            for region in evaluation['antigenic_regions']:
                 f.write(f"  Region {region['start']}-{region['end']}: Score {region['score']:.3f} ({region['method']})\n")
         else:
             f.write("  No significant antigenic regions detected or prediction failed\n")
@@ -261,14 +401,27 @@ def main():
         f.write(f"  * IEDB API for antigenicity prediction\n")
         f.write(f"  * Rule-based model for allergenicity assessment\n")
         f.write("- For 3D structure prediction, please use the generated FASTA file with Google Colab and ColabFold:\n")
-        f.write(f"  * Upload the file '{os.path.basename(args.output_colabfold)}' to Google Drive\n")
+        f.write(f"  * Upload the file '{colabfold_name}' to Google Drive\n")
         f.write(f"  * Use a ColabFold notebook for structure prediction\n")
         f.write("- For a more comprehensive evaluation, consider:\n")
         f.write("  1. Experimental validation of immunogenicity\n")
         f.write("  2. Testing against diverse HLA alleles\n")
         f.write("  3. Comparison with known effective vaccine epitopes\n")
-    
-    print(f"Evaluation report saved to {args.output_evaluation}")
+
+def write_batch_summary(path, table, protein_type):
+    """Write a one-line-per-construct overview of a batch evaluation"""
+    title = f"{protein_type.upper()} Vaccine Construct Batch Evaluation"
+    with open(path, "w") as f:
+        f.write(f"{title}\n")
+        f.write("=" * len(title) + "\n\n")
+        f.write(f"Constructs evaluated: {len(table)}\n\n")
+        for row in table.itertuples(index=False):
+            f.write(f"{row.construct_id}: {row.length} aa, MW {row.molecular_weight:.2f} Da, "
+                    f"pI {row.theoretical_pi:.2f}, instability {row.instability_index:.2f}, "
+                    f"GRAVY {row.gravy:.4f}, {row.epitope_count} epitopes, "
+                    f"{row.antigenic_regions} antigenic regions, {row.allergenicity_prediction} "
+                    f"({row.allergenicity_score:.4f})\n")
+            f.write(f"  Report: {row.report}\n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
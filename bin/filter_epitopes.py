@@ -5,6 +5,90 @@ import pandas as pd
 import numpy as np
 from collections import defaultdict
 
+from epitope_index import EpitopeIndex
+from table_io import read_table, write_table
+
+def find_overlaps(query_starts, query_ends, starts, ends, threshold):
+    """For each query interval, return the indices of target intervals overlapping it by >= threshold residues.
+    
+    Targets are sorted by start once. Because no target is longer than the longest one, each query only
+    has to binary-search the slice of starts that could reach the required overlap and filter that slice
+    on end position, giving an O((n + m) log n) join plus output size. Indices are returned in row order.
+    """
+    query_starts = np.asarray(query_starts, dtype=float)
+    query_ends = np.asarray(query_ends, dtype=float)
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    
+    # Any overlap must cover at least one residue
+    k = max(threshold, 1)
+    
+    # Only targets with valid coordinates that are long enough can ever qualify
+    candidates = np.flatnonzero(~np.isnan(starts) & ~np.isnan(ends) & (ends - starts + 1 >= k))
+    empty = np.empty(0, dtype=np.int64)
+    if len(candidates) == 0:
+        return [empty for _ in range(len(query_starts))]
+    
+    order = candidates[np.argsort(starts[candidates], kind='stable')]
+    sorted_starts = starts[order]
+    sorted_ends = ends[order]
+    max_length = np.max(sorted_ends - sorted_starts + 1)
+    
+    # Overlap >= k holds iff target start <= query end - k + 1 and target end >= query start + k - 1
+    lo = np.searchsorted(sorted_starts, query_starts + k - max_length, side='left')
+    hi = np.searchsorted(sorted_starts, query_ends - k + 1, side='right')
+    
+    overlaps = []
+    for q_start, q_end, a, b in zip(query_starts, query_ends, lo, hi):
+        if np.isnan(q_start) or np.isnan(q_end) or q_end - q_start + 1 < k or a >= b:
+            overlaps.append(empty)
+            continue
+        hits = order[a:b][sorted_ends[a:b] >= q_start + k - 1]
+        overlaps.append(np.sort(hits))
+    
+    return overlaps
+
+def merge_overlapping_regions(regions_df):
+    """Merge transitively overlapping regions with a sort-then-sweep pass in O(R log R).
+    
+    Regions are swept in start order, and a region joins the current cluster whenever it starts at or
+    before the furthest end seen so far, so the cluster's extent grows as regions are absorbed. Within a
+    cluster, the highest-scoring region (ties broken by region_id) supplies the identifying and per-type
+    score fields; the merged region spans the union, sums the epitope counts and keeps the max score.
+    """
+    if len(regions_df) == 0:
+        return regions_df.copy()
+    
+    # Rank by score so that the first row of each cluster is its seed
+    ranked = regions_df.sort_values(['combined_score', 'region_id'], ascending=[False, True],
+                                    kind='mergesort').reset_index(drop=True)
+    starts = ranked['start'].to_numpy()
+    ends = ranked['end'].to_numpy()
+    
+    # Sweep by start; a new cluster begins where a region starts past every end seen so far
+    order = np.lexsort((np.arange(len(ranked)), starts))
+    reach = np.maximum.accumulate(ends[order])
+    new_cluster = np.ones(len(order), dtype=bool)
+    new_cluster[1:] = starts[order][1:] > reach[:-1]
+    cluster = np.empty(len(order), dtype=np.int64)
+    cluster[order] = np.cumsum(new_cluster) - 1
+    
+    # Each cluster keeps its seed's fields with the aggregated extent, counts and score
+    totals = ranked.groupby(cluster, sort=False).agg(
+        start=('start', 'min'),
+        end=('end', 'max'),
+        b_cell_count=('b_cell_count', 'sum'),
+        mhc_i_count=('mhc_i_count', 'sum'),
+        mhc_ii_count=('mhc_ii_count', 'sum'),
+        combined_score=('combined_score', 'max')
+    )
+    is_seed = ~pd.Series(cluster).duplicated().to_numpy()
+    merged = ranked[is_seed].set_index(cluster[is_seed])
+    merged[totals.columns] = totals
+    merged['length'] = merged['end'] - merged['start'] + 1
+    
+    return merged.reset_index(drop=True)
+
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Filter and select epitopes for vaccine design')
@@ -13,6 +97,7 @@ def main():
     parser.add_argument('--tcell-ii', required=True, help='T-cell MHC Class II epitopes CSV file')
     parser.add_argument('--protein-type', required=True, help='Protein type (e.g., hemagglutinin, neuraminidase)')
     parser.add_argument('--output', required=True, help='Output CSV file for filtered epitopes')
+    parser.add_argument('--output-format', choices=['csv', 'parquet'], help='Output table format (default: from the output extension, CSV unless .parquet)')
     parser.add_argument('--min-score-bcell', type=float, default=0.6, help='Minimum score for B-cell epitopes')
     parser.add_argument('--min-score-tcell', type=float, default=0.6, help='Minimum score for T-cell epitopes')
     parser.add_argument('--overlap-threshold', type=int, default=5, help='Minimum overlap between epitopes for clustering')
@@ -21,9 +106,9 @@ def main():
     
     # Read epitope prediction results
     try:
-        bcell_df = pd.read_csv(args.bcell)
-        tcell_i_df = pd.read_csv(args.tcell_i)
-        tcell_ii_df = pd.read_csv(args.tcell_ii)
+        bcell_df = read_table(args.bcell)
+        tcell_i_df = read_table(args.tcell_i)
+        tcell_ii_df = read_table(args.tcell_ii)
         
         print(f"Loaded {len(bcell_df)} B-cell epitopes")
         print(f"Loaded {len(tcell_i_df)} T-cell MHC Class I epitopes")
@@ -42,42 +127,44 @@ def main():
     print(f"  T-cell MHC Class I epitopes: {len(tcell_i_filtered)}")
     print(f"  T-cell MHC Class II epitopes: {len(tcell_ii_filtered)}")
     
-    # Function to check if two epitopes overlap
-    def check_overlap(epitope1, epitope2, threshold=args.overlap_threshold):
-        start1, end1 = epitope1['start'], epitope1['end']
-        start2, end2 = epitope2['start'], epitope2['end']
-        
-        # Check if epitopes overlap
-        if start1 <= end2 and start2 <= end1:
-            overlap = min(end1, end2) - max(start1, start2) + 1
-            return overlap >= threshold
-        return False
-    
     # Identify regions with both B-cell and T-cell epitopes
     combined_regions = []
     region_id = 1
     
-    # Check each B-cell epitope for overlapping T-cell epitopes
-    for _, b_epitope in bcell_filtered.iterrows():
-        # Find overlapping MHC Class I epitopes
-        overlapping_i = [t for _, t in tcell_i_filtered.iterrows() 
-                         if check_overlap(b_epitope, t)]
-        
-        # Find overlapping MHC Class II epitopes
-        overlapping_ii = [t for _, t in tcell_ii_filtered.iterrows() 
-                          if check_overlap(b_epitope, t)]
-        
+    b_starts = bcell_filtered['start'].to_numpy()
+    b_ends = bcell_filtered['end'].to_numpy()
+    b_scores = bcell_filtered['score'].to_numpy()
+    
+    # T-cell peptides repeat once per allele: join on each distinct (start, end) epitope once,
+    # then expand the hits back to their per-allele rows for counts and mean scores
+    ti_index = EpitopeIndex(tcell_i_filtered, keys=('start', 'end'))
+    ti_starts = ti_index.table['start'].to_numpy()
+    ti_ends = ti_index.table['end'].to_numpy()
+    ti_scores = tcell_i_filtered['score'].to_numpy()
+    tii_index = EpitopeIndex(tcell_ii_filtered, keys=('start', 'end'))
+    tii_starts = tii_index.table['start'].to_numpy()
+    tii_ends = tii_index.table['end'].to_numpy()
+    tii_scores = tcell_ii_filtered['score'].to_numpy()
+    
+    # Join every B-cell epitope against the MHC Class I and Class II epitopes it overlaps
+    overlaps_i = find_overlaps(b_starts, b_ends, ti_starts, ti_ends, args.overlap_threshold)
+    overlaps_ii = find_overlaps(b_starts, b_ends, tii_starts, tii_ends, args.overlap_threshold)
+    
+    for b, (overlapping_i, overlapping_ii) in enumerate(zip(overlaps_i, overlaps_ii)):
         # If we have B-cell and at least one T-cell epitope overlapping
-        if overlapping_i or overlapping_ii:
+        if len(overlapping_i) or len(overlapping_ii):
             # Determine the region span
-            all_epitopes = [b_epitope] + overlapping_i + overlapping_ii
-            start = min(e['start'] for e in all_epitopes)
-            end = max(e['end'] for e in all_epitopes)
+            start = min([b_starts[b]] + list(ti_starts[overlapping_i]) + list(tii_starts[overlapping_ii]))
+            end = max([b_ends[b]] + list(ti_ends[overlapping_i]) + list(tii_ends[overlapping_ii]))
             
             # Calculate combined score (weighted average)
-            b_score = b_epitope['score']
-            ti_score = np.mean([t['score'] for t in overlapping_i]) if overlapping_i else 0
-            tii_score = np.mean([t['score'] for t in overlapping_ii]) if overlapping_ii else 0
+            b_score = b_scores[b]
+            rows_i = ti_index.rows_of(overlapping_i)
+            rows_ii = tii_index.rows_of(overlapping_ii)
+            n_i = len(rows_i)
+            n_ii = len(rows_ii)
+            ti_score = np.mean(ti_scores[rows_i]) if n_i else 0
+            tii_score = np.mean(tii_scores[rows_ii]) if n_ii else 0
             
             # Weights for different epitope types
             w_b = 0.4  # B-cell weight
@@ -85,14 +172,12 @@ def main():
             w_tii = 0.3  # T-cell Class II weight
             
             # Calculate combined score with normalization
-            if overlapping_i and overlapping_ii:
+            if len(overlapping_i) and len(overlapping_ii):
                 combined_score = w_b * b_score + w_ti * ti_score + w_tii * tii_score
-            elif overlapping_i:
+            elif len(overlapping_i):
                 combined_score = (w_b * b_score + w_ti * ti_score) / (w_b + w_ti)
-            elif overlapping_ii:
-                combined_score = (w_b * b_score + w_tii * tii_score) / (w_b + w_tii)
             else:
-                combined_score = b_score
+                combined_score = (w_b * b_score + w_tii * tii_score) / (w_b + w_tii)
             
             # Add to combined regions
             combined_regions.append({
@@ -101,12 +186,12 @@ def main():
                 'end': end,
                 'length': end - start + 1,
                 'b_cell_score': b_score,
-                'mhc_i_score': ti_score if overlapping_i else None,
-                'mhc_ii_score': tii_score if overlapping_ii else None,
+                'mhc_i_score': ti_score if len(overlapping_i) else None,
+                'mhc_ii_score': tii_score if len(overlapping_ii) else None,
                 'combined_score': combined_score,
                 'b_cell_count': 1,
-                'mhc_i_count': len(overlapping_i),
-                'mhc_ii_count': len(overlapping_ii),
+                'mhc_i_count': n_i,
+                'mhc_ii_count': n_ii,
                 'protein_type': args.protein_type
             })
             
@@ -122,55 +207,15 @@ def main():
         regions_df = regions_df.sort_values('combined_score', ascending=False)
         
         # Merge overlapping regions
-        merged_regions = []
-        processed = set()
-        
-        for i, region in regions_df.iterrows():
-            if i in processed:
-                continue
-                
-            current_region = region.to_dict()
-            processed.add(i)
-            
-            # Check for overlapping regions to merge
-            for j, other_region in regions_df.iterrows():
-                if j in processed or i == j:
-                    continue
-                    
-                # Check if regions overlap
-                if (current_region['start'] <= other_region['end'] and 
-                    other_region['start'] <= current_region['end']):
-                    
-                    # Merge regions
-                    current_region['start'] = min(current_region['start'], other_region['start'])
-                    current_region['end'] = max(current_region['end'], other_region['end'])
-                    current_region['length'] = current_region['end'] - current_region['start'] + 1
-                    
-                    # Update counts and scores
-                    current_region['b_cell_count'] += other_region['b_cell_count']
-                    current_region['mhc_i_count'] += other_region['mhc_i_count']
-                    current_region['mhc_ii_count'] += other_region['mhc_ii_count']
-                    
-                    # Take the max score as the merged score
-                    current_region['combined_score'] = max(
-                        current_region['combined_score'], 
-                        other_region['combined_score']
-                    )
-                    
-                    processed.add(j)
-            
-            merged_regions.append(current_region)
-        
-        print(f"After merging overlapping regions: {len(merged_regions)} regions")
+        final_df = merge_overlapping_regions(regions_df)
         
-        # Create final DataFrame with merged regions
-        final_df = pd.DataFrame(merged_regions)
+        print(f"After merging overlapping regions: {len(final_df)} regions")
         
         # Sort by combined score in descending order
         final_df = final_df.sort_values('combined_score', ascending=False)
         
         # Save to CSV
-        final_df.to_csv(args.output, index=False)
+        write_table(final_df, args.output, args.output_format)
         print(f"Saved {len(final_df)} filtered epitope regions to {args.output}")
     else:
         # Create empty DataFrame if no regions found
@@ -179,7 +224,7 @@ def main():
                    'b_cell_count', 'mhc_i_count', 'mhc_ii_count', 'protein_type']
         
         final_df = pd.DataFrame(columns=columns)
-        final_df.to_csv(args.output, index=False)
+        write_table(final_df, args.output, args.output_format)
         print(f"No overlapping epitope regions found. Created empty output file.")
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+# iedb_client.py
+"""Shared HTTP client for the IEDB tools API: pooled session, per-host rate limiting, retries and caching."""
+
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def backoff_delay(attempt, base=5.0, cap=60.0):
+    """Exponential backoff with full jitter for the given (0-based) attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def text_response(text):
+    """True for a non-empty body that is not an HTML (error) page"""
+    body = (text or '').strip()
+    return bool(body) and not body.startswith('<')
+
+
+def tabular_response(text):
+    """True for a tab-separated table with a header line (MHC tool output)"""
+    return text_response(text) and '\t' in text.strip().split('\n', 1)[0]
+
+
+def json_response(text):
+    """True for a JSON array body (BepiPred output)"""
+    try:
+        return isinstance(json.loads(text), list)
+    except (TypeError, ValueError):
+        return False
+
+
+class RateLimiter:
+    """Spaces out requests to the same host by a minimum interval, across threads"""
+
+    def __init__(self, requests_per_second=2.0):
+        self.interval = 1.0 / requests_per_second if requests_per_second and requests_per_second > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class IEDBClient:
+    """Posts IEDB tool requests through one pooled session with bounded concurrency"""
+
+    def __init__(self, workers=4, rate_limit=2.0, max_retries=3, timeout=300, retry_delay=5.0,
+                 cache=None, offline=False):
+        self.workers = max(1, workers)
+        self.cache = cache
+        self.offline = offline
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.limiter = RateLimiter(rate_limit)
+
+        # One connection pool shared by every worker thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, url, data, label='', validate=text_response):
+        """POST a request with retries; returns the response text, or None if every attempt failed.
+
+        Only responses that pass `validate` are returned and cached; an HTTP 200 carrying an
+        error page or an empty body counts as a failed attempt.
+        """
+        host = urlparse(url).netloc
+        prefix = f"  [{label}] " if label else "  "
+
+        # Serve repeated requests from the persistent cache
+        if self.cache is not None:
+            cached = self.cache.get(url, data)
+            if cached is not None and validate(cached):
+                print(f"{prefix}Using cached IEDB response")
+                return cached
+            if cached is not None:
+                print(f"{prefix}Ignoring unusable cached IEDB response")
+
+        if self.offline:
+            print(f"{prefix}Offline mode: no cached IEDB response available")
+            return None
+
+        for attempt in range(self.max_retries):
+            try:
+                self.limiter.wait(host)
+                print(f"{prefix}Calling IEDB API (attempt {attempt+1}/{self.max_retries})...")
+                response = self.session.post(url, data=data, timeout=self.timeout)
+
+                if response.status_code == 200 and validate(response.text):
+                    if self.cache is not None:
+                        self.cache.put(url, data, response.text)
+                    return response.text
+
+                if response.status_code == 200:
+                    print(f"{prefix}API call returned an unusable response")
+                else:
+                    print(f"{prefix}API call failed with status code {response.status_code}")
+                print(f"{prefix}Response: {response.text[:500]}...")
+
+            except Exception as e:
+                print(f"{prefix}Error during API call: {e}")
+
+            # Wait before retry
+            if attempt < self.max_retries - 1:
+                delay = backoff_delay(attempt, self.retry_delay)
+                print(f"{prefix}Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+
+        return None
+
+    def post_all(self, url, payloads, labels=None, validate=text_response):
+        """POST every payload with up to `workers` requests in flight; results keep the input order"""
+        labels = labels or [''] * len(payloads)
+        if self.workers == 1 or len(payloads) <= 1:
+            return [self.post(url, data, label, validate) for data, label in zip(payloads, labels)]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(lambda job: self.post(url, *job, validate), zip(payloads, labels)))
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            print(self.cache.summary())
+            self.cache.close()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+# mhc_scoring.py
+"""Offline MHC binding prediction from per-allele position-specific scoring matrices."""
+
+import json
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+MATRIX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'matrices')
+
+# Background amino acid frequencies (UniProtKB/Swiss-Prot), for sampling random peptides
+BACKGROUND_FREQUENCIES = {
+    'A': 0.0825, 'R': 0.0553, 'N': 0.0406, 'D': 0.0546, 'C': 0.0138, 'Q': 0.0393, 'E': 0.0672,
+    'G': 0.0707, 'H': 0.0227, 'I': 0.0591, 'L': 0.0965, 'K': 0.0580, 'M': 0.0241, 'F': 0.0386,
+    'P': 0.0474, 'S': 0.0665, 'T': 0.0536, 'W': 0.0110, 'Y': 0.0292, 'V': 0.0686
+}
+
+# Predicted IC50 values are capped here, as the IEDB tools report
+MAX_IC50 = 50000.0
+
+
+def load_matrices(path):
+    """Read a matrix file: {allele: {length: (constant, L x 20 matrix)}} and the amino acid column order"""
+    with open(path) as f:
+        data = json.load(f)
+    amino_acids = data['amino_acids']
+    matrices = {
+        allele: {int(length): (float(entry['constant']), np.asarray(entry['matrix'], dtype=float))
+                 for length, entry in lengths.items()}
+        for allele, lengths in data['alleles'].items()
+    }
+    return matrices, amino_acids
+
+
+def encode(sequence):
+    return np.frombuffer(sequence.upper().encode('ascii', 'replace'), dtype=np.uint8)
+
+
+class MatrixScorer:
+    """Scores peptides of one length for several alleles at once.
+
+    The alleles' matrices are stacked into an A x L x 256 lookup tensor indexed by residue byte
+    (NaN for non-standard residues), so scoring all windows of a sequence is a single gather over
+    the W x L window index followed by a sum over positions.
+    """
+
+    def __init__(self, matrices, amino_acids, alleles, length):
+        self.alleles = list(alleles)
+        self.length = length
+        self.peptide_length = length
+        self.tensor = np.full((len(self.alleles), length, 256), np.nan)
+        self.constants = np.empty(len(self.alleles))
+        columns = np.frombuffer(amino_acids.encode('ascii'), dtype=np.uint8)
+        for a, allele in enumerate(self.alleles):
+            constant, matrix = matrices[allele][length]
+            self.tensor[a][:, columns] = matrix
+            self.constants[a] = constant
+        self._background = None
+
+    def score_windows(self, windows):
+        """log10(IC50) of every window (W x L uint8 codes) for every allele: A x W"""
+        if len(windows) == 0:
+            return np.empty((len(self.alleles), 0))
+        gathered = self.tensor[:, np.arange(self.length), windows]
+        return gathered.sum(axis=2) + self.constants[:, None]
+
+    def score_sequence(self, sequence):
+        """log10(IC50) of every length-L window of a sequence: A x (len - L + 1)"""
+        codes = encode(sequence)
+        if len(codes) < self.length:
+            return np.empty((len(self.alleles), 0))
+        return self.score_windows(sliding_window_view(codes, self.length))
+
+    def peptide_scores(self, peptides):
+        """log10(IC50) of whole peptides (P x peptide_length uint8 codes): A x P"""
+        return self.score_windows(peptides)
+
+    def background(self, n=10000, seed=0):
+        """Sorted log10(IC50) of random natural-frequency peptides per allele, for percentile ranks"""
+        if self._background is None:
+            rng = np.random.default_rng(seed)
+            residues = np.frombuffer(''.join(BACKGROUND_FREQUENCIES).encode('ascii'), dtype=np.uint8)
+            weights = np.array(list(BACKGROUND_FREQUENCIES.values()))
+            peptides = rng.choice(residues, size=(n, self.peptide_length), p=weights / weights.sum())
+            self._background = np.sort(self.peptide_scores(peptides), axis=1)
+        return self._background
+
+    def percentile_ranks(self, scores):
+        """Percent of random peptides predicted to bind at least as well (lower is better)"""
+        background = self.background()
+        ranks = np.empty_like(scores)
+        for a in range(len(self.alleles)):
+            ranks[a] = np.searchsorted(background[a], scores[a], side='right') * 100.0 / background.shape[1]
+        return ranks
+
+
+class CoreScorer(MatrixScorer):
+    """Scores longer (MHC-II) peptides by their best binding core.
+
+    The matrices cover the core (usually 9 residues); a peptide of `peptide_length` offers
+    peptide_length - length + 1 registers, and its score is the lowest core log10(IC50) among them.
+    """
+
+    def __init__(self, matrices, amino_acids, alleles, length, peptide_length):
+        super().__init__(matrices, amino_acids, alleles, length)
+        self.peptide_length = peptide_length
+        self.registers = peptide_length - length + 1
+
+    def best_registers(self, core_scores):
+        """Best core score and its offset for every peptide, from the scores of consecutive cores.
+
+        core_scores is A x (C + registers - 1) for C overlapping peptides; returns two A x C arrays.
+        A peptide with a non-standard residue in any register scores NaN.
+        """
+        registers = sliding_window_view(core_scores, self.registers, axis=1)
+        offsets = np.argmin(registers, axis=2)
+        return np.take_along_axis(registers, offsets[..., None], axis=2)[..., 0], offsets
+
+    def peptide_scores(self, peptides):
+        cores = sliding_window_view(peptides, self.length, axis=1)
+        scores = self.score_windows(cores.reshape(-1, self.length))
+        return scores.reshape(len(self.alleles), len(peptides), self.registers).min(axis=2)
+
+    def score_sequence(self, sequence):
+        """Best-core log10(IC50) and core offset of every peptide of the sequence: two A x P arrays.
+
+        Every core of the sequence is scored once; peptides then take the minimum over the
+        overlapping cores they contain.
+        """
+        core_scores = super().score_sequence(sequence)
+        if len(sequence) < self.peptide_length:
+            empty = np.empty((len(self.alleles), 0))
+            return empty, empty.astype(np.int64)
+        return self.best_registers(core_scores)
+
+
+def ic50_from_log(scores):
+    return np.minimum(10.0 ** scores, MAX_IC50)
+
+
+def binding_records(sequence, starts, length, allele, ic50, ranks, threshold, columns=None, **fields):
+    """Epitope rows in the predict_tcell_*.py layout for one allele's windows below the IC50 threshold.
+
+    `columns` maps extra column names to per-window arrays aligned with `starts`.
+    """
+    keep = ic50 <= threshold
+    columns = {name: np.asarray(values)[keep].tolist() for name, values in (columns or {}).items()}
+    return [
+        {
+            'sequence': sequence[start:start + length],
+            'start': start + 1,
+            'end': start + length,
+            'score': 1.0 - (min(value, 5000) / 5000),
+            'hla': allele,
+            'ic50': round(value, 2),
+            'percentile_rank': round(rank, 2),
+            **{name: values[i] for name, values in columns.items()},
+            **fields
+        }
+        for i, (start, value, rank) in enumerate(zip(starts[keep].tolist(), ic50[keep].tolist(), ranks[keep].tolist()))
+    ]
+
+
+_MATRICES = {}
+_SCORERS = {}
+
+
+def cached_matrices(path):
+    if path not in _MATRICES:
+        _MATRICES[path] = load_matrices(path)
+    return _MATRICES[path]
+
+
+def matrix_scorer(path, alleles, length, peptide_length=None):
+    """Cached scorer over the alleles that have a matrix of this length (None if none do).
+
+    With a peptide_length longer than the matrices, peptides are scored by their best core (CoreScorer).
+    """
+    matrices, amino_acids = cached_matrices(path)
+    usable = tuple(allele for allele in alleles if length in matrices.get(allele, {}))
+    if not usable:
+        return None
+    key = (path, usable, length, peptide_length)
+    if key not in _SCORERS:
+        if peptide_length and peptide_length != length:
+            _SCORERS[key] = CoreScorer(matrices, amino_acids, usable, length, peptide_length)
+        else:
+            _SCORERS[key] = MatrixScorer(matrices, amino_acids, usable, length)
+    return _SCORERS[key]
+
+
+def missing_matrices(path, alleles, lengths):
+    """(allele, length) pairs without a matrix in the file"""
+    matrices, _ = cached_matrices(path)
+    return [(allele, length) for allele in alleles for length in lengths if length not in matrices.get(allele, {})]
+
+
+def predict_mhc_i(sequence, alleles, lengths, threshold=500, matrix_file=None, **fields):
+    """Score every peptide of the given lengths against every allele with the local matrices.
+
+    Each length is one gather-and-sum over all alleles. Returns epitope rows (sequence, start, end,
+    score, hla, ic50, percentile_rank) for binders with IC50 <= threshold, ordered by allele, length
+    and position; windows with non-standard residues are skipped. Extra `fields` are added to every row.
+    """
+    path = matrix_file or os.path.join(MATRIX_DIR, 'mhc_i.json')
+    for allele, length in missing_matrices(path, alleles, lengths):
+        print(f"  No local {length}-mer MHC-I matrix for {allele}; skipping")
+
+    rows = {allele: [] for allele in alleles}
+    for length in lengths:
+        scorer = matrix_scorer(path, alleles, length)
+        if scorer is None:
+            continue
+        scores = scorer.score_sequence(sequence)
+        starts = np.flatnonzero(~np.isnan(scores).any(axis=0))
+        scores = scores[:, starts]
+        ic50 = ic50_from_log(scores)
+        ranks = scorer.percentile_ranks(scores)
+        for a, allele in enumerate(scorer.alleles):
+            rows[allele].extend(binding_records(sequence, starts, length, allele, ic50[a], ranks[a], threshold,
+                                                **fields))
+    return [row for allele in alleles for row in rows[allele]]
+
+
+def predict_mhc_ii(sequence, alleles, length=15, threshold=500, matrix_file=None, core_length=9, **fields):
+    """Score every peptide of the given length against every allele by its best binding core.
+
+    All cores of the sequence are scored in one gather over all alleles, and the best of each
+    peptide's registers is taken for all peptides at once. Rows are as predict_mhc_i's plus `core`
+    (the best-scoring core) and `core_offset` (its 0-based position within the peptide), ordered by
+    allele and position.
+    """
+    path = matrix_file or os.path.join(MATRIX_DIR, 'mhc_ii.json')
+    if length < core_length:
+        raise ValueError(f"MHC-II peptide length {length} is shorter than the {core_length}-residue binding core")
+    for allele, _ in missing_matrices(path, alleles, [core_length]):
+        print(f"  No local MHC-II core matrix for {allele}; skipping")
+
+    scorer = matrix_scorer(path, alleles, core_length, length)
+    if scorer is None:
+        return []
+    scores, offsets = scorer.score_sequence(sequence)
+    starts = np.flatnonzero(~np.isnan(scores).any(axis=0))
+    scores = scores[:, starts]
+    offsets = offsets[:, starts]
+    ic50 = ic50_from_log(scores)
+    ranks = scorer.percentile_ranks(scores)
+
+    rows = {allele: [] for allele in alleles}
+    for a, allele in enumerate(scorer.alleles):
+        cores = [sequence[start + offset:start + offset + core_length]
+                 for start, offset in zip(starts.tolist(), offsets[a].tolist())]
+        rows[allele] = binding_records(sequence, starts, length, allele, ic50[a], ranks[a], threshold,
+                                       columns={'core': cores, 'core_offset': offsets[a]}, **fields)
+    return [row for allele in alleles for row in rows[allele]]
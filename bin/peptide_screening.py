@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# peptide_screening.py
+"""Offline allergenicity/toxicity screening from z-scale auto-cross-covariance (ACC) descriptors."""
+
+import json
+
+import numpy as np
+
+# Hellberg z-scales (z1 hydrophilicity, z2 bulk, z3 electronic properties), as used by AllerTOP
+Z_SCALES = {
+    'A': (0.07, -1.73, 0.09), 'R': (2.88, 2.52, -3.44), 'N': (3.22, 1.45, 0.84),
+    'D': (3.64, 1.13, 2.36), 'C': (0.71, -0.97, 4.13), 'Q': (2.18, 0.53, -1.14),
+    'E': (3.08, 0.39, -0.07), 'G': (2.23, -5.36, 0.30), 'H': (2.41, 1.74, 1.11),
+    'I': (-4.44, -1.68, -1.03), 'L': (-4.19, -1.03, -0.98), 'K': (2.84, 1.41, -3.14),
+    'M': (-2.49, -0.27, -0.41), 'F': (-4.92, 1.30, 0.45), 'P': (-1.22, 0.88, 2.23),
+    'S': (1.96, -1.63, 0.57), 'T': (0.92, -2.09, -1.40), 'W': (-4.75, 3.65, 0.85),
+    'Y': (-1.39, 2.32, 0.01), 'V': (-2.69, -2.53, -1.29)
+}
+
+# Screening models are logistic scores over named descriptors (unlisted descriptors weigh 0), fitted
+# outside this pipeline and passed as JSON. No model is bundled: allergenicity and toxicity calls must
+# come from a trained model, never from hand-picked weights. Layout:
+#   {"name": "...", "max_lag": 5,
+#    "allergenicity": {"bias": b, "threshold": t, "labels": [negative, positive], "weights": {descriptor: w}},
+#    "toxicity": {...same keys...}}
+MODEL_ENDPOINTS = ('allergenicity', 'toxicity')
+ENDPOINT_KEYS = ('bias', 'threshold', 'labels', 'weights')
+
+
+def descriptor_names(max_lag):
+    """Names of the descriptor columns: mean z-scales, then ACC terms by lag"""
+    names = ['z1', 'z2', 'z3']
+    for lag in range(1, max_lag + 1):
+        names.extend(f"acc_z{j + 1}z{k + 1}_lag{lag}" for j in range(3) for k in range(3))
+    return names
+
+
+def z_scale_matrix(peptides):
+    """N x max_length x 3 z-scale array (zero-padded) and the peptide lengths.
+
+    Residues outside the 20 standard amino acids score 0 on every scale.
+    """
+    lookup = np.zeros((256, 3))
+    for aa, values in Z_SCALES.items():
+        lookup[ord(aa)] = values
+    lengths = np.array([len(p) for p in peptides], dtype=np.int64)
+    codes = np.zeros((len(peptides), int(lengths.max()) if len(peptides) else 0), dtype=np.uint8)
+    for i, peptide in enumerate(peptides):
+        codes[i, :lengths[i]] = np.frombuffer(peptide.upper().encode('ascii', 'replace'), dtype=np.uint8)
+    return lookup[codes], lengths
+
+
+def acc_descriptors(peptides, max_lag=5):
+    """N x (3 + 9 * max_lag) descriptor matrix for all peptides at once.
+
+    ACC_jk(lag) = sum_i z_j(i) * z_k(i + lag) / (length - lag); lags that do not fit a peptide are 0.
+    Padding is all-zero, so padded positions add nothing to the sums.
+    """
+    z, lengths = z_scale_matrix(peptides)
+    safe_lengths = np.maximum(lengths, 1)[:, None]
+    columns = [z.sum(axis=1) / safe_lengths]
+    for lag in range(1, max_lag + 1):
+        pairs = lengths - lag
+        if z.shape[1] > lag:
+            acc = np.einsum('nij,nik->njk', z[:, :-lag], z[:, lag:]).reshape(len(peptides), 9)
+        else:
+            acc = np.zeros((len(peptides), 9))
+        columns.append(np.where(pairs[:, None] > 0, acc / np.maximum(pairs, 1)[:, None], 0.0))
+    return np.hstack(columns)
+
+
+def load_model(path):
+    """The trained screening model from a JSON file, checked against the model layout"""
+    with open(path) as f:
+        model = json.load(f)
+    for endpoint in MODEL_ENDPOINTS:
+        missing = [key for key in ENDPOINT_KEYS if key not in model.get(endpoint, {})]
+        if missing:
+            raise ValueError(f"Screening model {path} lacks {endpoint} {', '.join(missing)}")
+    return model
+
+
+def score_peptides(peptides, model):
+    """Allergenicity and toxicity probabilities (logistic scores) for every peptide.
+
+    Returns {'allergenicity': array, 'toxicity': array}.
+    """
+    max_lag = int(model.get('max_lag', 5))
+    names = descriptor_names(max_lag)
+    features = acc_descriptors(list(peptides), max_lag)
+
+    scores = {}
+    for endpoint in MODEL_ENDPOINTS:
+        spec = model[endpoint]
+        unknown = set(spec['weights']) - set(names)
+        if unknown:
+            raise ValueError(f"Unknown descriptors in {endpoint} model: {', '.join(sorted(unknown))}")
+        weights = np.array([spec['weights'].get(name, 0.0) for name in names])
+        scores[endpoint] = 1.0 / (1.0 + np.exp(-(features @ weights + spec['bias'])))
+    return scores
+
+
+def classify(scores, model):
+    """Map endpoint probabilities to the model's class labels"""
+    labels = {}
+    for endpoint, values in scores.items():
+        spec = model[endpoint]
+        negative, positive = spec['labels']
+        labels[endpoint] = np.where(values >= spec['threshold'], positive, negative)
+    return labels
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+# physchem.py
+"""Vectorized ProtParam: physicochemical properties of many protein sequences at once."""
+
+import numpy as np
+from Bio.Data import IUPACData
+from Bio.SeqUtils import IsoelectricPoint, ProtParamData
+
+PROPERTY_NAMES = (
+    'length', 'molecular_weight', 'theoretical_pi', 'instability_index', 'gravy', 'aromaticity',
+    'helix_fraction', 'turn_fraction', 'sheet_fraction'
+)
+
+# Standard amino acids, in the order of composition columns
+AMINO_ACIDS = IUPACData.protein_letters
+
+# Average water mass lost per peptide bond (as in Bio.SeqUtils.molecular_weight)
+WATER = 18.0153
+
+# Residue groups used by ProteinAnalysis.aromaticity() and secondary_structure_fraction()
+AROMATIC = 'YWF'
+HELIX = 'EMALK'
+TURN = 'NPGSD'
+SHEET = 'VIYFWLT'
+
+# Ionizable groups in the order of IsoelectricPoint.charge_at_pH()
+POSITIVE_GROUPS = ('K', 'R', 'H')
+NEGATIVE_GROUPS = ('D', 'E', 'C', 'Y')
+
+
+def _byte_table(values, default=np.nan):
+    """256-entry lookup table indexed by residue byte"""
+    table = np.full(256, default)
+    for aa, value in values.items():
+        table[ord(aa)] = value
+    return table
+
+
+def _group_mask(residues):
+    mask = np.zeros(256)
+    for aa in residues:
+        mask[ord(aa)] = 1.0
+    return mask
+
+
+MASS_TABLE = _byte_table(IUPACData.protein_weights)
+KD_TABLE = _byte_table(ProtParamData.kd)
+
+# Dipeptide instability weights (DIWV) as a 256 x 256 table
+DIWV_TABLE = np.full((256, 256), np.nan)
+for _first, _row in ProtParamData.DIWV.items():
+    for _second, _value in _row.items():
+        DIWV_TABLE[ord(_first), ord(_second)] = _value
+
+# Terminal pKs depend on the first/last residue; everything else uses the default group pKs
+NTERM_PK = _byte_table(IsoelectricPoint.pKnterminal, IsoelectricPoint.positive_pKs['Nterm'])
+CTERM_PK = _byte_table(IsoelectricPoint.pKcterminal, IsoelectricPoint.negative_pKs['Cterm'])
+POSITIVE_PKS = np.array([IsoelectricPoint.positive_pKs[aa] for aa in POSITIVE_GROUPS])
+NEGATIVE_PKS = np.array([IsoelectricPoint.negative_pKs[aa] for aa in NEGATIVE_GROUPS])
+
+
+def encode_sequences(sequences):
+    """Concatenate upper-cased sequences into one byte array; returns (codes, sequence index per residue, lengths)"""
+    encoded = [str(sequence).upper().encode('ascii', 'replace') for sequence in sequences]
+    lengths = np.array([len(sequence) for sequence in encoded], dtype=np.int64)
+    codes = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    owners = np.repeat(np.arange(len(encoded)), lengths)
+    return codes, owners, lengths
+
+
+def residue_counts(codes, owners, n_sequences):
+    """N x 256 matrix of residue byte counts per sequence"""
+    flat = np.bincount(owners * 256 + codes, minlength=n_sequences * 256)
+    return flat.reshape(n_sequences, 256)
+
+
+def amino_acid_composition(sequences):
+    """N x 20 matrix of standard amino acid fractions (count / length), columns in AMINO_ACIDS order"""
+    sequences = list(sequences)
+    codes, owners, lengths = encode_sequences(sequences)
+    counts = residue_counts(codes, owners, len(sequences))[:, [ord(aa) for aa in AMINO_ACIDS]]
+    return counts / np.where(lengths > 0, lengths, 1)[:, None]
+
+
+def charge_at_ph(ph, positive_counts, negative_counts, nterm_pk, cterm_pk):
+    """Net charge of every sequence at its own pH (Henderson-Hasselbalch, as IsoelectricPoint)"""
+    ph = ph[:, None]
+    positive = (positive_counts / (10 ** (ph - POSITIVE_PKS) + 1.0)).sum(axis=1)
+    positive += 1.0 / (10 ** (ph[:, 0] - nterm_pk) + 1.0)
+    negative = (negative_counts / (10 ** (NEGATIVE_PKS - ph) + 1.0)).sum(axis=1)
+    negative += 1.0 / (10 ** (cterm_pk - ph[:, 0]) + 1.0)
+    return positive - negative
+
+
+def isoelectric_points(counts, first, last, low=4.05, high=12.0, tolerance=0.0001):
+    """Bisection over pH for every sequence at once, with the same steps as IsoelectricPoint.pi()"""
+    n = len(counts)
+    positive_counts = counts[:, [ord(aa) for aa in POSITIVE_GROUPS]].astype(float)
+    negative_counts = counts[:, [ord(aa) for aa in NEGATIVE_GROUPS]].astype(float)
+    nterm_pk = NTERM_PK[first]
+    cterm_pk = CTERM_PK[last]
+
+    low = np.full(n, low)
+    high = np.full(n, high)
+    ph = np.full(n, 7.775)
+    # Every interval halves at each step, so one width check covers all sequences
+    width = high[0] - low[0] if n else 0.0
+    while width > tolerance:
+        positive = charge_at_ph(ph, positive_counts, negative_counts, nterm_pk, cterm_pk) > 0.0
+        low = np.where(positive, ph, low)
+        high = np.where(positive, high, ph)
+        ph = (low + high) / 2
+        width /= 2
+    return ph
+
+
+def evaluate_sequences(sequences):
+    """ProtParam properties for every sequence, as a dict of arrays keyed by PROPERTY_NAMES.
+
+    Values match Bio.SeqUtils.ProtParam.ProteinAnalysis to floating point rounding. Where ProtParam
+    would raise (empty sequences; non-standard residues for weight, GRAVY and instability) the
+    value is NaN.
+    """
+    sequences = list(sequences)
+    n = len(sequences)
+    codes, owners, lengths = encode_sequences(sequences)
+    counts = residue_counts(codes, owners, n)
+    safe_lengths = np.where(lengths > 0, lengths, 1)
+    empty = lengths == 0
+
+    # Per-residue tables: any unknown residue makes the sum NaN, as ProtParam raises on it
+    mass = np.bincount(owners, weights=MASS_TABLE[codes], minlength=n) - (lengths - 1) * WATER
+    gravy = np.bincount(owners, weights=KD_TABLE[codes], minlength=n) / safe_lengths
+
+    # Dipeptides only pair residues within the same sequence
+    same = owners[1:] == owners[:-1]
+    pair_values = DIWV_TABLE[codes[:-1][same], codes[1:][same]]
+    instability = np.bincount(owners[1:][same], weights=pair_values, minlength=n) * (10.0 / safe_lengths)
+
+    fractions = {
+        name: counts @ _group_mask(residues) / safe_lengths
+        for name, residues in (('aromaticity', AROMATIC), ('helix_fraction', HELIX),
+                               ('turn_fraction', TURN), ('sheet_fraction', SHEET))
+    }
+
+    # Terminal residues for the pK tables (placeholders for empty sequences, masked below)
+    ends = np.cumsum(lengths)
+    padded = codes if len(codes) else np.zeros(1, dtype=np.uint8)
+    first = np.where(empty, 0, padded[np.minimum(ends - lengths, len(padded) - 1)])
+    last = np.where(empty, 0, padded[np.maximum(ends - 1, 0)])
+    pi = isoelectric_points(counts, first, last)
+
+    properties = {
+        'length': lengths,
+        'molecular_weight': mass,
+        'theoretical_pi': pi,
+        'instability_index': instability,
+        'gravy': gravy,
+        **fractions
+    }
+    for name in PROPERTY_NAMES[1:]:
+        properties[name] = np.where(empty, np.nan, properties[name])
+    return properties
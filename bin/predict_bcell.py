@@ -4,11 +4,16 @@ import sys
 import subprocess
 import argparse
 import os
-import requests
-import time
 import pandas as pd
 import numpy as np
 from Bio import SeqIO
+from delta_predict import add_delta_arguments, open_delta
+from iedb_client import IEDBClient
+from prediction_cache import add_cache_arguments, open_cache
+from score_tracks import propensity_windows, windows_above_threshold, window_records
+from table_io import TableWriter, write_table
+
+BCELL_COLUMNS = ['sequence', 'start', 'end', 'score', 'type', 'method', 'source']
 
 def main():
     # Parse command line arguments
@@ -20,10 +25,19 @@ def main():
                        help='Prediction method to use')
     parser.add_argument('--threshold', type=float, default=0.5, help='Score threshold (specificity)')
     parser.add_argument('--window-size', type=int, default=9, help='Window size for epitope prediction')
+    add_cache_arguments(parser)
+    add_delta_arguments(parser)
+    parser.add_argument('--batch', action='store_true',
+                       help='Predict every record in a multi-FASTA and write one table keyed by sequence_id')
     parser.add_argument('--output', required=True, help='Output CSV file')
+    parser.add_argument('--output-format', choices=['csv', 'parquet'], help='Output table format (default: from the output extension, CSV unless .parquet)')
     
     args = parser.parse_args()
     
+    if args.batch:
+        run_batch(args)
+        return
+    
     # Read the FASTA file
     try:
         record = next(SeqIO.parse(args.fasta, "fasta"))
@@ -37,6 +51,78 @@ def main():
     print(f"Predicting B-cell epitopes for {args.protein_type} using {args.method}...")
     print(f"Window size: {args.window_size}, Threshold: {args.threshold}")
     
+    client = IEDBClient(workers=1, cache=open_cache(args), offline=args.offline)
+    try:
+        results = predict_variant(sequence, args, client, open_delta(args))
+    finally:
+        client.close()
+    
+    # Convert results to DataFrame
+    if results:
+        epitope_df = pd.DataFrame(results)
+    else:
+        # Create empty DataFrame if no epitopes found
+        epitope_df = pd.DataFrame(columns=BCELL_COLUMNS)
+    
+    print(f"B-cell epitope prediction complete. Found {len(epitope_df)} epitopes.")
+    
+    # Save the table (CSV unless Parquet was requested)
+    write_table(epitope_df, args.output, args.output_format)
+
+def run_batch(args):
+    """Predict every record of a multi-FASTA in one process, streaming rows to a long-format CSV."""
+    print(f"Batch-predicting B-cell epitopes for {args.protein_type} using {args.method}...")
+    print(f"Window size: {args.window_size}, Threshold: {args.threshold}")
+    
+    columns = ['sequence_id'] + BCELL_COLUMNS
+    n_records = 0
+    n_epitopes = 0
+    failed = []
+    client = IEDBClient(workers=1, cache=open_cache(args), offline=args.offline)
+    delta = open_delta(args)
+    
+    with TableWriter(args.output, columns, args.output_format) as out:
+        
+        try:
+            for record in SeqIO.parse(args.fasta, "fasta"):
+                # Prediction errors are reported per record; only the FASTA iterator raises parse errors
+                try:
+                    sequence = str(record.seq)
+                    print(f"Processing {record.id} with length {len(sequence)}")
+                
+                    results = predict_variant(sequence, args, client, delta)
+                    if results:
+                        epitope_df = pd.DataFrame(results, columns=BCELL_COLUMNS)
+                        epitope_df.insert(0, 'sequence_id', record.id)
+                        out.write(epitope_df)
+                
+                    n_records += 1
+                    n_epitopes += len(results)
+                except Exception as e:
+                    # Skip the record and carry on; the run still exits non-zero at the end
+                    sys.stderr.write(f"ERROR: Prediction failed for {record.id}, skipping it: {type(e).__name__}: {e}\n")
+                    failed.append(record.id)
+        except Exception as e:
+            sys.stderr.write(f"ERROR: Could not parse FASTA file: {e}\n")
+            sys.exit(1)
+        finally:
+            client.close()
+    
+    print(f"B-cell epitope prediction complete. Found {n_epitopes} epitopes across {n_records} sequences.")
+    if failed:
+        sys.stderr.write(f"ERROR: Prediction failed for {len(failed)} of {n_records + len(failed)} records: {', '.join(failed)}\n")
+        sys.exit(1)
+
+def predict_variant(sequence, args, client, delta=None):
+    """Predict one sequence, re-scoring only the windows that differ from the delta reference if given."""
+    if delta is None:
+        return predict_sequence(sequence, args, client)
+    # Per-residue scores are smoothed over neighbouring residues, so one window of context is re-scored too
+    return delta.predict(sequence, lambda fragment: predict_sequence(fragment, args, client),
+                         [args.window_size], context=args.window_size)
+
+def predict_sequence(sequence, args, client):
+    """Predict B-cell epitopes for one sequence via the IEDB API, falling back to the local scale."""
     # Call IEDB API directly
     url = "http://tools-cluster-interface.iedb.org/tools_api/bcell/"
     
@@ -47,53 +133,19 @@ def main():
         'window_size': args.window_size
     }
     
-    # Try API call with error handling
-    max_retries = 3
-    retry_delay = 5
-    success = False
-    
-    for attempt in range(max_retries):
-        try:
-            print(f"Calling IEDB API (attempt {attempt+1}/{max_retries})...")
-            response = requests.post(url, data=params, timeout=300)
-            
-            if response.status_code == 200:
-                # Process successful response
-                results = process_iedb_response(response.text, sequence, args.window_size, args.threshold)
-                success = True
-                break
-            else:
-                print(f"API call failed with status code {response.status_code}")
-                print(f"Response: {response.text}")
-        
-        except Exception as e:
-            print(f"Error during API call: {e}")
-        
-        # Wait before retry
-        if attempt < max_retries - 1:
-            print(f"Retrying in {retry_delay} seconds...")
-            time.sleep(retry_delay)
+    # Cached responses are reused; otherwise the client retries with backoff
+    response_text = client.post(url, params)
     
-    if not success:
+    if response_text is None:
         print("All API call attempts failed. Using fallback method...")
-        results = predict_bcell_fallback(sequence, args.window_size, args.threshold)
+        return predict_bcell_fallback(sequence, args.window_size, args.threshold)
     
-    # Convert results to DataFrame
-    if results:
-        epitope_df = pd.DataFrame(results)
-    else:
-        # Create empty DataFrame if no epitopes found
-        epitope_df = pd.DataFrame(columns=['sequence', 'start', 'end', 'score', 'type', 'method', 'source'])
-    
-    print(f"B-cell epitope prediction complete. Found {len(epitope_df)} epitopes.")
-    
-    # Save to CSV
-    epitope_df.to_csv(args.output, index=False)
+    return process_iedb_response(response_text, sequence, args.window_size, args.threshold)
 
 def process_iedb_response(response_text, sequence, window_size=9, threshold=0.5):
     """Process the IEDB API response to extract epitopes of specified length."""
     try:
-        # Parse the response into a DataFrame for easier processing
+        # Parse the response into a per-residue score track
         lines = response_text.strip().split('\n')
         
         # Skip the header line and parse the data
@@ -113,30 +165,14 @@ def process_iedb_response(response_text, sequence, window_size=9, threshold=0.5)
             print("No data found in response")
             return []
         
-        # Convert to DataFrame
-        df = pd.DataFrame(data)
+        # Score every window in one pass over the per-residue track
+        positions = np.array([d['position'] for d in data])
+        residues = [d['residue'] for d in data]
+        scores = np.array([d['score'] for d in data])
+        offsets, means = windows_above_threshold(scores, window_size, threshold)
         
-        # Calculate window averages to find epitopes of specified length
-        epitopes = []
-        for i in range(len(df) - window_size + 1):
-            window_df = df.iloc[i:i+window_size]
-            avg_score = window_df['score'].mean()
-            
-            if avg_score >= threshold:
-                start_pos = int(window_df['position'].iloc[0])
-                end_pos = int(window_df['position'].iloc[-1])
-                # Extract sequence for this window
-                epitope_seq = ''.join(window_df['residue'].tolist())
-                
-                epitopes.append({
-                    'sequence': epitope_seq,
-                    'start': start_pos,
-                    'end': end_pos,
-                    'score': avg_score,
-                    'type': 'B-cell',
-                    'method': 'Bepipred',
-                    'source': 'IEDB API'
-                })
+        epitopes = window_records(residues, positions, offsets, means, window_size,
+                                  type='B-cell', method='Bepipred', source='IEDB API')
         
         print(f"Identified {len(epitopes)} potential B-cell epitopes")
         return epitopes
@@ -147,41 +183,13 @@ def process_iedb_response(response_text, sequence, window_size=9, threshold=0.5)
 
 def predict_bcell_fallback(seq, window_size=9, threshold=0.5):
     """Fallback method if IEDB API fails"""
-    # Amino acid propensity scales for B-cell epitope prediction
-    propensity = {
-        'A': 0.57, 'R': 1.87, 'N': 1.64, 'D': 1.46, 'C': 0.70,
-        'Q': 1.56, 'E': 1.31, 'G': 0.72, 'H': 1.22, 'I': 0.73,
-        'L': 0.76, 'K': 1.95, 'M': 0.85, 'F': 1.07, 'P': 1.95,
-        'S': 1.41, 'T': 1.19, 'W': 1.14, 'Y': 1.47, 'V': 0.66
-    }
+    # Halved mean propensity per window, normalized to the 0-1 score range;
+    # windows with unknown amino acids are skipped
+    offsets, scores = propensity_windows(seq, window_size, threshold)
     
-    results = []
-    
-    for i in range(len(seq) - window_size + 1):
-        window = seq[i:i+window_size]
-        
-        # Skip windows with unknown amino acids
-        if any(aa not in propensity for aa in window):
-            continue
-        
-        # Calculate propensity score
-        avg_propensity = sum(propensity.get(aa, 0.5) for aa in window) / window_size
-        
-        # Normalize score to 0-1 range
-        normalized_score = min(1.0, max(0.0, avg_propensity / 2.0))
-        
-        if normalized_score >= threshold:
-            results.append({
-                'sequence': window,
-                'start': i+1,
-                'end': i+window_size,
-                'score': normalized_score,
-                'type': 'B-cell',
-                'method': 'Fallback',
-                'source': 'Local'
-            })
-    
-    return results
+    positions = np.arange(1, len(seq) + 1)
+    return window_records(seq, positions, offsets, scores, window_size,
+                          type='B-cell', method='Fallback', source='Local')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,9 +2,11 @@
 
 import sys
 import subprocess
-import time
 import argparse
-import requests
+from delta_predict import add_delta_arguments, open_delta
+from iedb_client import IEDBClient, tabular_response
+from mhc_scoring import predict_mhc_ii
+from prediction_cache import add_cache_arguments, open_cache
 
 def main():
     # Parse command line arguments
@@ -17,7 +19,19 @@ def main():
     parser.add_argument('--threshold', type=float, default=500, help='IC50 threshold (nM)')
     parser.add_argument('--length', type=int, default=15, help='Peptide length for MHC Class II epitopes')
     parser.add_argument('--alleles', help='Comma-separated list of HLA alleles')
+    parser.add_argument('--workers', type=int, default=4, help='Number of allele requests kept in flight')
+    parser.add_argument('--rate-limit', type=float, default=2.0, help='Maximum IEDB requests per second per host')
+    parser.add_argument('--engine', choices=['iedb', 'local'], default='iedb',
+                       help='iedb: IEDB API; local: bundled approximate core matrices only, no network')
+    parser.add_argument('--fallback', choices=['none', 'local'], default='none',
+                       help='iedb engine: alleles whose requests all fail get no rows (none) or approximate local-pssm scores (local)')
+    parser.add_argument('--matrix-file', help='MHC-II core scoring matrix file for the local engine (default: bundled matrices)')
+    add_cache_arguments(parser)
+    add_delta_arguments(parser)
+    parser.add_argument('--batch', action='store_true',
+                       help='Predict every record in a multi-FASTA and write one table keyed by sequence_id')
     parser.add_argument('--output', required=True, help='Output CSV file')
+    parser.add_argument('--output-format', choices=['csv', 'parquet'], help='Output table format (default: from the output extension, CSV unless .parquet)')
     
     args = parser.parse_args()
     
@@ -32,12 +46,15 @@ def main():
         subprocess.check_call([sys.executable, '-m', 'pip', 'install', '--user', 'pandas', 'biopython', 'requests'])
         import pandas as pd
         from Bio import SeqIO
+    from table_io import TableWriter
     
-    # Read the FASTA file
+    # Read the FASTA file (lazily in batch mode, so records stream through one at a time)
     try:
-        record = next(SeqIO.parse(args.fasta, "fasta"))
-        sequence = str(record.seq)
-        print(f"Successfully loaded sequence with length {len(sequence)}")
+        records = SeqIO.parse(args.fasta, "fasta")
+        if not args.batch:
+            record = next(records)
+            records = [record]
+            print(f"Successfully loaded sequence with length {len(record.seq)}")
     except Exception as e:
         sys.stderr.write(f"ERROR: Could not parse FASTA file: {e}\n")
         sys.exit(1)
@@ -56,66 +73,121 @@ def main():
     # IEDB MHC-II API URL
     url = "http://tools-cluster-interface.iedb.org/tools_api/mhcii/"
     
-    # Process all alleles
-    all_results = []
+    # The binding core columns come last, so readers of the original columns are unaffected
+    columns = ['sequence', 'start', 'end', 'score', 'hla', 'ic50', 'percentile_rank', 'type', 'method', 'source',
+               'core', 'core_offset']
+    if args.batch:
+        columns = ['sequence_id'] + columns
     
-    for allele in alleles:
-        print(f"Processing allele: {allele}")
-        
-        # Prepare API request data
-        data = {
-            'method': args.method,
-            'sequence_text': sequence,
-            'allele': allele,
-            'length': args.length
-        }
-        
-        # Make API call with retry mechanism
-        max_retries = 3
-        retry_delay = 5
+    n_records = 0
+    n_epitopes = 0
+    failed = []
+    client = IEDBClient(workers=args.workers, rate_limit=args.rate_limit,
+                        cache=open_cache(args), offline=args.offline)
+    delta = open_delta(args)
+    
+    with TableWriter(args.output, columns, args.output_format) as out:
         
-        for attempt in range(max_retries):
-            try:
-                print(f"  Calling IEDB API (attempt {attempt+1}/{max_retries})...")
-                response = requests.post(url, data=data, timeout=300)
+        try:
+            for record in records:
+                # Prediction errors are reported per record; only the FASTA iterator raises parse errors
+                try:
+                    sequence = str(record.seq)
+                    if args.batch:
+                        print(f"Processing {record.id} with length {len(sequence)}")
                 
-                if response.status_code == 200:
-                    try:
-                        # Process the response
-                        predictions = process_iedb_response(response.text, allele, args.threshold, sequence)
-                        all_results.extend(predictions)
-                        break
-                    except Exception as e:
-                        print(f"  Error processing response: {e}")
-                else:
-                    print(f"  API call failed with status code {response.status_code}")
-                    print(f"  Response: {response.text[:500]}...")
-            
-            except Exception as e:
-                print(f"  Error during API call: {e}")
-            
-            # Wait before retry
-            if attempt < max_retries - 1:
-                print(f"  Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-    
-    print(f"Total epitopes found: {len(all_results)}")
-    
-    # Create DataFrame with results
-    if all_results:
-        epitope_df = pd.DataFrame(all_results)
-        epitope_df['type'] = 'MHC-II'
-        epitope_df['method'] = args.method
-        epitope_df['source'] = args.protein_type
-        
-        # Save to CSV
-        epitope_df.to_csv(args.output, index=False)
-        print(f"T-cell MHC-II epitope prediction complete. Found {len(epitope_df)} epitopes.")
+                    all_results = predict_variant(sequence, alleles, url, args, client, delta)
+                    print(f"Total epitopes found: {len(all_results)}")
+                
+                    # Append this sequence's results to the output table
+                    if all_results:
+                        epitope_df = pd.DataFrame(all_results)
+                        epitope_df['type'] = 'MHC-II'
+                        # Rows from the local matrices carry their own method label
+                        epitope_df['method'] = epitope_df['method'].fillna(args.method) if 'method' in epitope_df else args.method
+                        epitope_df['source'] = args.protein_type
+                        # Cores are blank where the IEDB method does not report one
+                        epitope_df['core'] = epitope_df['core'].fillna('') if 'core' in epitope_df else ''
+                        offsets = epitope_df['core_offset'] if 'core_offset' in epitope_df else None
+                        epitope_df['core_offset'] = pd.array(offsets if offsets is not None else [None] * len(epitope_df),
+                                                             dtype='Int64')
+                        if args.batch:
+                            epitope_df['sequence_id'] = record.id
+                        out.write(epitope_df[columns])
+                
+                    n_records += 1
+                    n_epitopes += len(all_results)
+                except Exception as e:
+                    # Skip the record and carry on; the run still exits non-zero at the end
+                    sys.stderr.write(f"ERROR: Prediction failed for {record.id}, skipping it: {type(e).__name__}: {e}\n")
+                    failed.append(record.id)
+        except Exception as e:
+            sys.stderr.write(f"ERROR: Could not parse FASTA file: {e}\n")
+            sys.exit(1)
+        finally:
+            client.close()
+    
+    if n_epitopes:
+        suffix = f" across {n_records} sequences" if args.batch else ""
+        print(f"T-cell MHC-II epitope prediction complete. Found {n_epitopes} epitopes{suffix}.")
     else:
-        # Create empty DataFrame if no epitopes found
-        epitope_df = pd.DataFrame(columns=['sequence', 'start', 'end', 'score', 'hla', 'ic50', 'percentile_rank', 'type', 'method', 'source'])
-        epitope_df.to_csv(args.output, index=False)
         print(f"T-cell MHC-II epitope prediction complete. No epitopes found below threshold {args.threshold}.")
+    if failed:
+        sys.stderr.write(f"ERROR: Prediction failed for {len(failed)} of {n_records + len(failed)} records: {', '.join(failed)}\n")
+        sys.exit(1)
+
+def predict_local(sequence, alleles, args):
+    """Score the sequence with the local MHC-II core matrices (no network)."""
+    return predict_mhc_ii(sequence, alleles, args.length, args.threshold, args.matrix_file, method='local-pssm')
+
+def predict_variant(sequence, alleles, url, args, client, delta=None):
+    """Predict one sequence, re-scoring only the peptides that differ from the delta reference if given."""
+    if delta is None:
+        return predict_sequence(sequence, alleles, url, args, client)
+    order = {allele: i for i, allele in enumerate(alleles)}
+    return delta.predict(sequence, lambda fragment: predict_sequence(fragment, alleles, url, args, client),
+                         [args.length],
+                         sort_key=lambda row: (order.get(row['hla'], len(order)), row['end'] - row['start'], row['start']))
+
+def predict_sequence(sequence, alleles, url, args, client):
+    """Predict epitopes for one sequence across all alleles, with allele requests run concurrently."""
+    if args.engine == 'local':
+        return predict_local(sequence, alleles, args)
+    
+    # Prepare one API request per allele
+    payloads = [{
+        'method': args.method,
+        'sequence_text': sequence,
+        'allele': allele,
+        'length': args.length
+    } for allele in alleles]
+    
+    print(f"Processing {len(alleles)} alleles with up to {client.workers} requests in flight")
+    responses = client.post_all(url, payloads, labels=alleles, validate=tabular_response)
+    
+    # Alleles whose requests all failed get no rows unless the approximate local core matrices are opted in;
+    # their local-pssm scores are not comparable to IEDB's, so every such allele is flagged
+    failed = [allele for allele, response_text in zip(alleles, responses) if response_text is None]
+    fallback = {}
+    for allele in failed:
+        if args.fallback == 'local':
+            print(f"  WARNING: All API call attempts failed for {allele}; scoring it with the approximate local core matrices (method local-pssm)")
+        else:
+            print(f"  WARNING: All API call attempts failed for {allele}; no predictions for it (--fallback local scores it with the approximate local core matrices)")
+    if failed and args.fallback == 'local':
+        for row in predict_local(sequence, failed, args):
+            fallback.setdefault(row['hla'], []).append(row)
+    
+    # Merge results in allele order regardless of completion order
+    all_results = []
+    for allele, response_text in zip(alleles, responses):
+        if response_text is None:
+            all_results.extend(fallback.get(allele, []))
+            continue
+        predictions = process_iedb_response(response_text, allele, args.threshold, sequence)
+        all_results.extend(predictions)
+    
+    return all_results
 
 def process_iedb_response(response_text, allele, threshold, sequence):
     """Process the IEDB API response to extract epitopes."""
@@ -133,13 +205,16 @@ def process_iedb_response(response_text, allele, threshold, sequence):
         peptide_col = header.index('peptide') if 'peptide' in header else 1
         ic50_col = -1
         rank_col = -1
+        core_col = -1
         
-        # Find IC50 and percentile rank columns
+        # Find IC50, percentile rank and binding core columns
         for i, col in enumerate(header):
             if 'ic50' in col.lower():
                 ic50_col = i
             elif 'rank' in col.lower():
                 rank_col = i
+            elif 'core' in col.lower() and core_col == -1:
+                core_col = i
         
         # Use default positions if columns not found
         if ic50_col == -1:
@@ -191,6 +266,12 @@ def process_iedb_response(response_text, allele, threshold, sequence):
                         if pos != -1:
                             result['start'] = pos + 1  # 1-based indexing
                             result['end'] = pos + len(peptide)
+                        
+                        # Binding core, where the method reports one
+                        core = parts[core_col] if 0 <= core_col < len(parts) else ''
+                        if core and peptide.find(core) != -1:
+                            result['core'] = core
+                            result['core_offset'] = peptide.find(core)
                             
                         results.append(result)
                 except (ValueError, IndexError) as e:
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+# prediction_cache.py
+"""Persistent content-addressed cache for IEDB tool responses, stored in SQLite."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Request fields that identify a prediction; anything else in the payload is ignored
+KEY_FIELDS = ('method', 'allele', 'length', 'window_size', 'sequence_text')
+
+
+def cache_key(endpoint, params):
+    """Hash of (endpoint, method, allele, length, window, sequence) for a request payload"""
+    identity = [endpoint.rstrip('/')] + [str(params.get(field, '')) for field in KEY_FIELDS]
+    return hashlib.sha256(json.dumps(identity).encode('utf-8')).hexdigest()
+
+
+class PredictionCache:
+    """On-disk response cache with TTL and size-based (least recently used) eviction"""
+
+    def __init__(self, cache_dir, ttl_days=30.0, max_size_mb=1024.0):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'iedb_cache.sqlite')
+        self.ttl = ttl_days * 86400 if ttl_days and ttl_days > 0 else None
+        self.max_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb and max_size_mb > 0 else None
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        # Worker threads share one connection; the lock serializes access to it
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            endpoint TEXT,
+            created REAL,
+            accessed REAL,
+            size INTEGER,
+            body TEXT
+        )''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self._db.commit()
+        self._expire()
+
+    def get(self, endpoint, params):
+        """Return the cached response text for a request, or None on a miss"""
+        key = cache_key(endpoint, params)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT created, body FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[0] > self.ttl:
+                self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._db.commit()
+                self.evictions += 1
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._db.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[1]
+
+    def put(self, endpoint, params, body):
+        """Store a response text, then evict old entries if the cache is over its size limit"""
+        key = cache_key(endpoint, params)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses (key, endpoint, created, accessed, size, body) VALUES (?, ?, ?, ?, ?, ?)',
+                (key, endpoint, now, now, len(body.encode('utf-8')), body)
+            )
+            self._db.commit()
+            self.stores += 1
+            self._evict_to_size()
+
+    def _expire(self):
+        if self.ttl is None:
+            return
+        with self._lock:
+            cursor = self._db.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.ttl,))
+            self._db.commit()
+            self.evictions += max(cursor.rowcount, 0)
+
+    def _evict_to_size(self):
+        if self.max_bytes is None:
+            return
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Drop least recently used entries until the cache fits again
+        rows = self._db.execute('SELECT key, size FROM responses ORDER BY accessed ASC').fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._db.executemany('DELETE FROM responses WHERE key = ?', stale)
+        self._db.commit()
+        self.evictions += len(stale)
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0
+        return (f"IEDB cache: {self.hits} hits, {self.misses} misses ({rate:.0%} hit rate), "
+                f"{self.stores} stored, {self.evictions} evicted [{self.path}]")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def add_cache_arguments(parser):
+    """Register the shared --cache-dir/--offline options on a script's argument parser"""
+    parser.add_argument('--cache-dir', help='Directory for the persistent IEDB response cache (disabled if not set)')
+    parser.add_argument('--cache-ttl-days', type=float, default=30.0, help='Days before cached responses expire')
+    parser.add_argument('--cache-max-mb', type=float, default=1024.0, help='Maximum cache size in MB before LRU eviction')
+    parser.add_argument('--offline', action='store_true', help='Never call the IEDB API; use cached responses only')
+
+
+def open_cache(args):
+    """Open the cache configured by add_cache_arguments, or return None if caching is disabled"""
+    if not args.cache_dir:
+        return None
+    return PredictionCache(args.cache_dir, ttl_days=args.cache_ttl_days, max_size_mb=args.cache_max_mb)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+# report_writer.py
+"""Streaming HTML report writer with a machine-readable JSON/Parquet sidecar."""
+
+import html
+import json
+import math
+from string import Template
+
+PAGE_HEADER = Template('''<!DOCTYPE html>
+<html>
+<head>
+    <title>$title</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; }
+        h1, h2 { color: #2c3e50; }
+        table { border-collapse: collapse; width: 100%; }
+        th, td { padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }
+        th { background-color: #f2f2f2; }
+        .sequence { font-family: monospace; word-break: break-all; }
+        .stats { margin: 20px 0; padding: 10px; background-color: #f8f9fa; border-radius: 5px; }
+        .warning { color: #e74c3c; }
+    </style>
+</head>
+<body>
+    <h1>$heading</h1>
+    <p>Generated on $generated</p>
+''')
+
+PAGE_FOOTER = '''</body>
+</html>
+'''
+
+
+def jsonable(value):
+    """Convert numpy scalars and NaN/inf to plain JSON values"""
+    if hasattr(value, 'item') and not isinstance(value, (list, dict, str)):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def format_cell(value, digits=3):
+    """Escaped table cell text: floats rounded, missing values as N/A, anything else as text"""
+    value = jsonable(value)
+    if value is None:
+        return 'N/A'
+    if isinstance(value, float):
+        return f"{value:.{digits}f}"
+    return html.escape(str(value))
+
+
+class HtmlReport:
+    """Writes an HTML report section by section, so tables can be streamed one row at a time"""
+
+    def __init__(self, path, title, heading, generated):
+        self._file = open(path, 'w')
+        self._file.write(PAGE_HEADER.substitute(title=html.escape(title), heading=html.escape(heading),
+                                                generated=html.escape(generated)))
+        self._columns = None
+
+    def heading(self, text):
+        self._file.write(f"    <h2>{html.escape(text)}</h2>\n")
+
+    def paragraph(self, text, css_class=None):
+        css = f' class="{css_class}"' if css_class else ''
+        self._file.write(f"    <p{css}>{html.escape(text)}</p>\n")
+
+    def stats(self, title, items, warning=None):
+        """A stats box of (label, value) lines, with an optional warning line"""
+        self._file.write(f'    <div class="stats">\n        <h2>{html.escape(title)}</h2>\n')
+        for label, value in items:
+            self._file.write(f"        <p><strong>{html.escape(label)}:</strong> {format_cell(value)}</p>\n")
+        if warning:
+            self._file.write(f'        <p class="warning"><strong>Warning:</strong> {html.escape(warning)}</p>\n')
+        self._file.write('    </div>\n')
+
+    def start_table(self, columns, sequence_columns=()):
+        """Open a table; `sequence_columns` are rendered in the monospace sequence style"""
+        self._columns = [(column, column in sequence_columns) for column in columns]
+        header = ''.join(f"<th>{html.escape(column)}</th>" for column in columns)
+        self._file.write(f"    <table>\n        <tr>{header}</tr>\n")
+
+    def row(self, values):
+        """Write one table row from a sequence of values, or a dict keyed by column"""
+        if isinstance(values, dict):
+            values = [values.get(column) for column, _ in self._columns]
+        cells = ''.join(
+            f'<td class="sequence">{format_cell(value)}</td>' if is_sequence else f"<td>{format_cell(value)}</td>"
+            for value, (_, is_sequence) in zip(values, self._columns)
+        )
+        self._file.write(f"        <tr>{cells}</tr>\n")
+
+    def empty_row(self, message):
+        self._file.write(f'        <tr><td colspan="{len(self._columns)}">{html.escape(message)}</td></tr>\n')
+
+    def end_table(self):
+        self._file.write("    </table>\n")
+        self._columns = None
+
+    def close(self):
+        if not self._file.closed:
+            self._file.write(PAGE_FOOTER)
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Sidecar:
+    """Structured copy of a report: summary fields plus a table of rows.
+
+    A `.parquet` path writes the rows as a Parquet table (summary fields become constant columns);
+    anything else streams a JSON document {"summary": {...}, "rows": [...]} row by row.
+    """
+
+    def __init__(self, path, summary=None):
+        self.path = path
+        self.summary = {key: jsonable(value) for key, value in (summary or {}).items()}
+        self.parquet = path.endswith('.parquet')
+        self._rows = []
+        self._count = 0
+        self._file = None
+        self._closed = False
+        if not self.parquet:
+            self._file = open(path, 'w')
+            self._file.write('{"summary": ' + json.dumps(self.summary) + ', "rows": [\n')
+
+    def row(self, values):
+        values = {key: jsonable(value) for key, value in values.items()}
+        if self.parquet:
+            self._rows.append(values)
+        else:
+            self._file.write((',\n' if self._count else '') + json.dumps(values))
+        self._count += 1
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self.parquet:
+            import pandas as pd
+            table = pd.DataFrame(self._rows)
+            for key, value in self.summary.items():
+                if key not in table.columns:
+                    table[key] = value
+            try:
+                table.to_parquet(self.path, index=False)
+                return
+            except ImportError:
+                # Parquet needs pyarrow (or fastparquet); keep the data as JSON rather than losing it
+                self.path = self.path[:-len('.parquet')] + '.json'
+                print(f"Parquet support not available, writing report data to {self.path} instead")
+                self._file = open(self.path, 'w')
+                self._file.write('{"summary": ' + json.dumps(self.summary) + ', "rows": [\n')
+                self._file.write(',\n'.join(json.dumps(row) for row in self._rows))
+        self._file.write('\n]}\n')
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
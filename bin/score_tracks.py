@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# score_tracks.py
+"""Vectorized helpers for per-residue score tracks produced by the predictors."""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Amino acid propensity scale used by the local B-cell fallback
+BCELL_PROPENSITY = {
+    'A': 0.57, 'R': 1.87, 'N': 1.64, 'D': 1.46, 'C': 0.70,
+    'Q': 1.56, 'E': 1.31, 'G': 0.72, 'H': 1.22, 'I': 0.73,
+    'L': 0.76, 'K': 1.95, 'M': 0.85, 'F': 1.07, 'P': 1.95,
+    'S': 1.41, 'T': 1.19, 'W': 1.14, 'Y': 1.47, 'V': 0.66
+}
+
+
+def propensity_track(sequence, scale=BCELL_PROPENSITY):
+    """Map a sequence onto a per-residue score array (NaN for residues not in the scale)"""
+    lookup = np.full(256, np.nan)
+    for aa, value in scale.items():
+        lookup[ord(aa)] = value
+    codes = np.frombuffer(sequence.encode('ascii', 'replace'), dtype=np.uint8)
+    return lookup[codes]
+
+
+def window_sums(scores, window_size, ordered=False):
+    """Sum of every contiguous window of `window_size` scores.
+
+    Each window is summed on its own, so a window's sum does not depend on where it sits in the
+    track (differences of a cumulative sum drift by ~1e-16, enough to drop a window whose mean sits
+    exactly on a threshold). By default rows are reduced like numpy/pandas sum a single window;
+    `ordered` adds each window's scores strictly left to right, like Python's sum().
+    """
+    scores = np.asarray(scores, dtype=float)
+    if window_size <= 0 or len(scores) < window_size:
+        return np.empty(0, dtype=float)
+    if not ordered:
+        return sliding_window_view(scores, window_size).sum(axis=1)
+    n_windows = len(scores) - window_size + 1
+    sums = np.zeros(n_windows)
+    for k in range(window_size):
+        sums += scores[k:k + n_windows]
+    return sums
+
+
+def window_means(scores, window_size, ordered=False):
+    """Mean score of every contiguous window (length L - window_size + 1)"""
+    return window_sums(scores, window_size, ordered) / window_size if window_size > 0 else np.empty(0)
+
+
+def windows_above_threshold(scores, window_size, threshold, ordered=False):
+    """Return (offsets, means) of every window whose mean score is >= threshold.
+
+    Windows that contain a NaN score are skipped.
+    """
+    scores = np.asarray(scores, dtype=float)
+    invalid = np.isnan(scores)
+    means = window_means(np.where(invalid, 0.0, scores), window_size, ordered)
+    if len(means) == 0:
+        return np.empty(0, dtype=np.int64), means
+
+    keep = means >= threshold
+    if invalid.any():
+        keep &= window_sums(invalid, window_size) == 0
+
+    offsets = np.flatnonzero(keep)
+    return offsets, means[offsets]
+
+
+def propensity_windows(sequence, window_size, threshold, scale=BCELL_PROPENSITY):
+    """Return (offsets, scores) of the windows the local B-cell fallback calls epitopes.
+
+    A window's score is its mean propensity halved and clipped to 0-1; windows with residues
+    outside the scale are skipped.
+    """
+    offsets, means = windows_above_threshold(propensity_track(sequence, scale), window_size, -np.inf, ordered=True)
+    scores = np.clip(means / 2.0, 0.0, 1.0)
+    keep = scores >= threshold
+    return offsets[keep], scores[keep]
+
+
+def segment_regions(scores, threshold=0.5, min_length=1, positions=None):
+    """Return (starts, ends, means) of every run of consecutive scores above threshold.
+
+    Runs are found from the edges of the threshold mask and averaged with one reduceat over the
+    run boundaries. starts/ends are inclusive `positions` (1-based residue numbers by default);
+    runs spanning fewer than `min_length` positions are dropped. NaN scores end a run.
+    """
+    scores = np.asarray(scores, dtype=float)
+    positions = np.arange(1, len(scores) + 1) if positions is None else np.asarray(positions)
+    above = scores > threshold
+    edges = np.diff(np.concatenate(([0], above.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_stops = np.flatnonzero(edges == -1)
+    if len(run_starts) == 0:
+        return positions[:0], positions[:0], np.empty(0, dtype=float)
+
+    # Sum each [start, stop) slice; the padding keeps a stop at the end of the track a valid index
+    bounds = np.column_stack((run_starts, run_stops)).ravel()
+    sums = np.add.reduceat(np.append(scores, 0.0), bounds)[::2]
+    means = sums / (run_stops - run_starts)
+
+    starts = positions[run_starts]
+    ends = positions[run_stops - 1]
+    keep = ends - starts + 1 >= min_length
+    return starts[keep], ends[keep], means[keep]
+
+
+def window_records(sequence, positions, offsets, means, window_size, **fields):
+    """Build epitope records for the given window offsets over a residue string or list"""
+    return [
+        {
+            'sequence': ''.join(sequence[i:i+window_size]),
+            'start': int(positions[i]),
+            'end': int(positions[i+window_size-1]),
+            'score': float(score),
+            **fields
+        }
+        for i, score in zip(offsets.tolist(), means.tolist())
+    ]
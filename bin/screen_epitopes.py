@@ -2,24 +2,42 @@
 
 # screen_epitopes.py
 import argparse
+import csv
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 
+from epitope_index import EpitopeIndex
+from peptide_screening import classify, load_model, score_peptides
+from table_io import read_table, write_table
 
-def load_epitopes_from_csv(file):
-    df = pd.read_csv(file)
-    return df['sequence'].dropna().astype(str).unique().tolist()
 
+ALLERTOP_URL = "https://www.ddgpharmfac.net/allertop_test/"
+TOXINPRED_URL = "https://webs.iiitd.edu.in/raghava/toxinpred/multi_submit.html"
 
-def submit_to_allertop(sequence, driver):
-    driver.get("https://www.ddgpharmfac.net/allertop_test/")
+# Every screening table records which engine and model produced its labels
+RESULT_COLUMNS = ["Epitope", "Allergenicity", "Toxicity", "Method", "Model"]
+
+CHECKPOINT_COLUMNS = ["Epitope", "Allergenicity", "Toxicity", "Allergenicity_Seconds", "Toxicity_Seconds"]
+
+
+def load_epitope_index(files):
+    """Canonical peptide table over the prediction rows of all files (one row per peptide and allele)"""
+    rows = pd.concat([read_table(file, columns=['sequence']) for file in files], ignore_index=True)
+    rows = rows.dropna().astype(str)
+    index = EpitopeIndex(rows)
+    print(f"Loaded {len(rows)} prediction rows covering {len(index)} unique epitopes")
+    return index
+
+
+def submit_to_allertop(sequence, driver, url=ALLERTOP_URL):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    driver.get(url)
 
 
     # Add fallback delay in case the site is slow
@@ -45,8 +63,12 @@ def submit_to_allertop(sequence, driver):
     return result.strip()
 
 
-def submit_to_toxinpred(epitope, driver):
-    driver.get("https://webs.iiitd.edu.in/raghava/toxinpred/multi_submit.html")
+def submit_to_toxinpred(epitope, driver, url=TOXINPRED_URL):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    driver.get(url)
     textarea = driver.find_element(By.NAME, "sequence")
     textarea.clear()
     textarea.send_keys(epitope)
@@ -65,36 +87,230 @@ def submit_to_toxinpred(epitope, driver):
         return "Error"
 
 
+class Checkpoint:
+    """Screening results appended one epitope at a time, so a restarted run can skip finished epitopes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            for row in pd.read_csv(path, dtype=str, keep_default_na=False).to_dict('records'):
+                # Failed lookups and rows cut short by a crash are retried on the next run
+                if self.finished(row):
+                    self.done[row["Epitope"]] = row
+        self._lock = threading.Lock()
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        # A crash can leave the last line without its newline; start appending on a fresh line
+        needs_newline = False
+        if not new_file:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        self._file = open(path, 'a', newline='')
+        if needs_newline:
+            self._file.write('\n')
+        self._writer = csv.DictWriter(self._file, fieldnames=CHECKPOINT_COLUMNS)
+        if new_file:
+            self._writer.writeheader()
+            self._file.flush()
+
+    @staticmethod
+    def finished(row):
+        """True if both lookups of a checkpoint row produced a result"""
+        values = (row.get("Allergenicity"), row.get("Toxicity"))
+        return all(isinstance(value, str) and value.strip() and value != "Error" for value in values)
+
+    def append(self, row):
+        with self._lock:
+            self._writer.writerow(row)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class BrowserPool:
+    """One headless Chrome per worker thread, restarted after a crash, with a concurrency limit per site"""
+
+    def __init__(self, site_limits):
+        self._local = threading.local()
+        self._drivers = []
+        self._lock = threading.Lock()
+        self.sites = {site: threading.BoundedSemaphore(limit) for site, limit in site_limits.items()}
+
+    def driver(self):
+        if getattr(self._local, 'driver', None) is None:
+            from selenium import webdriver
+            from selenium.webdriver.chrome.options import Options
+
+            options = Options()
+            options.add_argument("--headless")
+            self._local.driver = webdriver.Chrome(options=options)
+            with self._lock:
+                self._drivers.append(self._local.driver)
+        return self._local.driver
+
+    def discard(self):
+        """Drop this worker's driver (e.g. after a crash); the next call starts a fresh one"""
+        driver = getattr(self._local, 'driver', None)
+        self._local.driver = None
+        if driver is not None:
+            with self._lock:
+                self._drivers.remove(driver)
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def submit(self, site, function, epitope, url, delay):
+        """Run one site query under the site's concurrency limit; returns (result, seconds)"""
+        with self.sites[site]:
+            started = time.monotonic()
+            try:
+                result = function(epitope, self.driver(), url)
+            except Exception as e:
+                print(f"{site} failed for {epitope}: {e}")
+                self.discard()
+                result = "Error"
+            elapsed = time.monotonic() - started
+            # Pause before releasing the slot, to stay polite to the server
+            time.sleep(delay)
+        return result, elapsed
+
+    def close(self):
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+
+def report_web_stats(rows):
+    """Print per-site latency and failure counts for the epitopes screened in this run"""
+    if not rows:
+        return
+    table = pd.DataFrame(rows)
+    for site, column in (("AllerTOP", "Allergenicity"), ("ToxinPred", "Toxicity")):
+        seconds = table[f"{column}_Seconds"].astype(float)
+        failures = int((table[column] == "Error").sum())
+        print(f"{site}: {len(table)} queries, {failures} failed, latency mean {seconds.mean():.1f}s, "
+              f"median {seconds.median():.1f}s, max {seconds.max():.1f}s")
+
+
+def screen_web(epitopes, workers=2, allertop_limit=1, toxinpred_limit=1, checkpoint_file=None,
+               allertop_url=ALLERTOP_URL, toxinpred_url=TOXINPRED_URL, delay=2.0):
+    """Submit epitopes to the AllerTOP and ToxinPred web servers from a pool of browser workers.
+
+    Each finished epitope is appended to the checkpoint file, and epitopes already in it are skipped.
+    """
+    checkpoint = Checkpoint(checkpoint_file) if checkpoint_file else None
+    done = dict(checkpoint.done) if checkpoint else {}
+    pending = [ep for ep in epitopes if ep not in done]
+    if done:
+        print(f"Resuming from checkpoint: {len(epitopes) - len(pending)} epitopes already screened")
+
+    pool = BrowserPool({"AllerTOP": allertop_limit, "ToxinPred": toxinpred_limit})
+    screened = []
+
+    def screen_one(ep):
+        allergen, allergen_seconds = pool.submit("AllerTOP", submit_to_allertop, ep, allertop_url, delay)
+        toxin, toxin_seconds = pool.submit("ToxinPred", submit_to_toxinpred, ep, toxinpred_url, delay)
+        row = {
+            "Epitope": ep,
+            "Allergenicity": allergen,
+            "Toxicity": toxin,
+            "Allergenicity_Seconds": round(allergen_seconds, 2),
+            "Toxicity_Seconds": round(toxin_seconds, 2)
+        }
+        if checkpoint:
+            checkpoint.append(row)
+        return row
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for i, row in enumerate(executor.map(screen_one, pending), 1):
+                screened.append(row)
+                done[row["Epitope"]] = row
+                if i % 50 == 0:
+                    print(f"Screened {i}/{len(pending)} epitopes")
+    finally:
+        pool.close()
+        if checkpoint:
+            checkpoint.close()
+
+    report_web_stats(screened)
+    return pd.DataFrame(
+        [{"Epitope": ep, "Allergenicity": done[ep]["Allergenicity"], "Toxicity": done[ep]["Toxicity"],
+          "Method": "web", "Model": "AllerTOP/ToxinPred"} for ep in epitopes],
+        columns=RESULT_COLUMNS
+    )
+
+
+def screen_local(epitopes, model_file, with_scores=False):
+    """Score all epitopes at once with a trained offline ACC descriptor model"""
+    model = load_model(model_file)
+    scores = score_peptides(epitopes, model)
+    labels = classify(scores, model)
+    table = pd.DataFrame({
+        "Epitope": epitopes,
+        "Allergenicity": labels['allergenicity'],
+        "Toxicity": labels['toxicity'],
+        "Method": "local",
+        "Model": model.get('name') or os.path.basename(model_file)
+    }, columns=RESULT_COLUMNS)
+    if with_scores:
+        table["Allergenicity_Score"] = scores['allergenicity'].round(4)
+        table["Toxicity_Score"] = scores['toxicity'].round(4)
+    return table
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--bcell")
     parser.add_argument("--tcelli")
     parser.add_argument("--tcellii")
     parser.add_argument("--output")
+    parser.add_argument("--output-format", choices=["csv", "parquet"],
+                        help="Output table format (default: from the output extension, CSV unless .parquet)")
+    parser.add_argument("--engine", choices=["local", "web"], default="web",
+                        help="web: AllerTOP/ToxinPred via headless Chrome; local: offline ACC descriptor model "
+                             "(requires --model)")
+    parser.add_argument("--model", help="Trained screening model JSON for the local engine (required with --engine local)")
+    parser.add_argument("--with-scores", action="store_true",
+                        help="Add the local engine's probability columns to the table")
+    parser.add_argument("--workers", type=int, default=2, help="Web engine: number of browser workers")
+    parser.add_argument("--allertop-concurrency", type=int, default=1,
+                        help="Web engine: maximum simultaneous AllerTOP queries")
+    parser.add_argument("--toxinpred-concurrency", type=int, default=1,
+                        help="Web engine: maximum simultaneous ToxinPred queries")
+    parser.add_argument("--checkpoint", help="Web engine: CSV that records finished epitopes, so a rerun resumes")
+    parser.add_argument("--allertop-url", default=ALLERTOP_URL, help="Web engine: AllerTOP submission page")
+    parser.add_argument("--toxinpred-url", default=TOXINPRED_URL, help="Web engine: ToxinPred submission page")
+    parser.add_argument("--delay", type=float, default=2.0,
+                        help="Web engine: pause in seconds after each query to a site")
     args = parser.parse_args()
 
+    # No model is bundled, so local screening only runs with a trained one
+    if args.engine == "local" and not args.model:
+        parser.error("--engine local requires --model with a trained screening model")
+
     if not args.output:
         print("Output file is required.")
         return
 
-    epitopes = set()
-    for file in [args.bcell, args.tcelli, args.tcellii]:
-        epitopes.update(load_epitopes_from_csv(file))
-
-    options = Options()
-    options.add_argument("--headless")
-    driver = webdriver.Chrome(options=options)
+    # Each unique peptide is screened once, however many alleles predicted it
+    epitopes = sorted(load_epitope_index([args.bcell, args.tcelli, args.tcellii]).peptides)
 
-    results = []
-    for ep in epitopes:
-        allergen = submit_to_allertop(ep, driver)
-        time.sleep(2)
-        toxin = submit_to_toxinpred(ep, driver)
-        time.sleep(2)
-        results.append({"Epitope": ep, "Allergenicity": allergen, "Toxicity": toxin})
+    if args.engine == "web":
+        results = screen_web(epitopes, args.workers, args.allertop_concurrency, args.toxinpred_concurrency,
+                             args.checkpoint, args.allertop_url, args.toxinpred_url, args.delay)
+    else:
+        results = screen_local(epitopes, args.model, args.with_scores)
 
-    driver.quit()
-    pd.DataFrame(results).to_csv(args.output, index=False)
+    write_table(results, args.output, args.output_format)
+    print(f"Screened {len(results)} epitopes with the {args.engine} engine")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+# table_io.py
+"""Epitope table interchange between pipeline stages: CSV (default) or Parquet with dictionary-encoded labels."""
+
+import argparse
+import subprocess
+import sys
+
+import pandas as pd
+
+TABLE_FORMATS = ('csv', 'parquet')
+
+# Low-cardinality label columns, stored as dictionaries (categoricals) in Parquet
+CATEGORICAL_COLUMNS = ('hla', 'type', 'method', 'source', 'sequence_id')
+
+# Score columns are always floating point, so every Parquet row group shares one schema
+FLOAT_COLUMNS = ('score', 'ic50', 'percentile_rank', 'consensus_score')
+
+PARQUET_MAGIC = b'PAR1'
+
+
+def import_arrow():
+    """pyarrow and pyarrow.parquet, installed on first use like the scripts' other dependencies"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        subprocess.check_call([sys.executable, '-m', 'pip', 'install', '--user', 'pyarrow'])
+        import pyarrow
+        import pyarrow.parquet
+    return pyarrow, pyarrow.parquet
+
+
+def table_format(path, fmt=None):
+    """Explicit format if given, otherwise inferred from the file extension (CSV unless .parquet/.pq)"""
+    if fmt:
+        if fmt not in TABLE_FORMATS:
+            raise ValueError(f"Unknown table format '{fmt}' (expected one of {', '.join(TABLE_FORMATS)})")
+        return fmt
+    return 'parquet' if str(path).lower().endswith(('.parquet', '.pq')) else 'csv'
+
+
+def is_parquet(path):
+    """True if the file is Parquet, judged by its magic bytes rather than its name"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(4) == PARQUET_MAGIC
+    except OSError:
+        return False
+
+
+def encode_columns(df):
+    """Cast label columns to categoricals and score columns to float, for a compact, stable Parquet schema"""
+    df = df.copy()
+    for column in df.columns:
+        if column in CATEGORICAL_COLUMNS:
+            df[column] = df[column].astype('category')
+        elif column in FLOAT_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(float)
+    return df
+
+
+def read_table(path, columns=None):
+    """Read an epitope table written as CSV or Parquet; label columns come back as plain strings"""
+    if not is_parquet(path):
+        return pd.read_csv(path, usecols=columns)
+    import_arrow()
+    df = pd.read_parquet(path, columns=columns)
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+    return df
+
+
+def write_table(df, path, fmt=None):
+    """Write a whole table as CSV or Parquet"""
+    if table_format(path, fmt) == 'csv':
+        df.to_csv(path, index=False)
+        return
+    import_arrow()
+    encode_columns(df).to_parquet(path, index=False)
+
+
+class TableWriter:
+    """Appends chunks of rows to a CSV or Parquet table with a fixed column list.
+
+    CSV chunks are appended as text; Parquet chunks become row groups, all cast to the schema
+    of the first chunk.
+    """
+
+    def __init__(self, path, columns, fmt=None):
+        self.path = path
+        self.columns = list(columns)
+        self.format = table_format(path, fmt)
+        self.rows = 0
+        self._file = None
+        self._writer = None
+        self._schema = None
+        if self.format == 'csv':
+            self._file = open(path, 'w')
+            pd.DataFrame(columns=self.columns).to_csv(self._file, index=False)
+            self._file.flush()
+
+    def write(self, df):
+        df = df[self.columns]
+        if self.format == 'csv':
+            df.to_csv(self._file, index=False, header=False)
+            self._file.flush()
+        else:
+            pa, pq = import_arrow()
+            if self._writer is None:
+                table = pa.Table.from_pandas(encode_columns(df), preserve_index=False)
+                self._schema = table.schema
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            else:
+                table = pa.Table.from_pandas(encode_columns(df), schema=self._schema, preserve_index=False)
+            self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        elif self.format == 'parquet':
+            if self._writer is None:
+                # No rows: still leave a valid, empty table with the expected columns
+                write_table(pd.DataFrame(columns=self.columns), self.path, 'parquet')
+            else:
+                self._writer.close()
+                self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concatenate or convert epitope tables (CSV/Parquet)')
+    parser.add_argument('inputs', nargs='+', help='Input tables (CSV or Parquet)')
+    parser.add_argument('--output', required=True, help='Output table')
+    parser.add_argument('--output-format', choices=TABLE_FORMATS, help='Output format (default: from the extension)')
+    args = parser.parse_args()
+
+    tables = [read_table(path) for path in args.inputs]
+    combined = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+    write_table(combined, args.output, args.output_format)
+    print(f"Wrote {len(combined)} rows from {len(tables)} tables to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
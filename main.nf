@@ -59,6 +59,7 @@ include { combineEpitopes as combinedEpitopes } from './modules/designVaccine'
 include { designVaccineConstruct as designVaccine1 } from './modules/designVaccine'
 include { designVaccineConstruct as designVaccine2 } from './modules/designVaccine'
 include { designVaccineConstruct as designCombinedVaccine } from './modules/designVaccine'
+include { designVaccineSweep as sweepCombinedVaccine } from './modules/designVaccine'
 include { evaluateVaccineConstruct as evaluateVaccine1 } from './modules/evaluateVaccine'
 include { evaluateVaccineConstruct as evaluateVaccine2 } from './modules/evaluateVaccine'
 include { evaluateVaccineConstruct as evaluateCombinedVaccine } from './modules/evaluateVaccine'
@@ -113,6 +114,11 @@ if (!params.accession1 || !params.accession2) {
     exit 1
 }
 
+if (params.screening_engine == 'local' && !params.screening_model) {
+    log.error "ERROR: --screening_engine local requires --screening_model with a trained screening model"
+    exit 1
+}
+
 if (!params.ncbi_api_key) {
     log.warn "WARNING: No NCBI API key provided. This may limit sequence retrieval capabilities."
 }
@@ -160,6 +166,10 @@ workflow {
     all_epitopes = all_epitopes.mix(first_combined.combined_epitopes, second_combined.combined_epitopes)
     combined_vaccine = designCombinedVaccine(all_epitopes.collect(), 'combined')
 
+    if (params.sweep_linkers || params.sweep_max_epitopes || params.sweep_similarity_thresholds) {
+        sweepCombinedVaccine(all_epitopes.collect(), 'combined')
+    }
+
     eval1 = evaluateVaccine1(vaccine1.vaccine, 'accession1')
     eval2 = evaluateVaccine2(vaccine2.vaccine, 'accession2')
     combined_eval = evaluateCombinedVaccine(combined_vaccine.vaccine, 'combined')
@@ -4,6 +4,35 @@
  * Module for vaccine design processes
  */
 
+// Extension of the epitope tables passed between stages ("csv" or "parquet")
+def tableExt() {
+    return params.table_format == 'parquet' ? 'parquet' : 'csv'
+}
+
+// Concatenate several epitope tables into one (keeping a single header for CSV)
+def concatTables(files, output) {
+    if (params.table_format == 'parquet') {
+        return "python ${workflow.projectDir}/bin/table_io.py ${files.join(' ')} --output=${output}"
+    }
+    return """head -n 1 ${files[0]} > ${output}
+    for f in ${files.join(" ")}; do
+        tail -n +2 \$f >> ${output}
+    done"""
+}
+
+// Epitope selection engine and ordering options for design_vaccine.py
+def selectionArgs() {
+    def args = "--selection-engine=${params.selection_engine ?: 'greedy'}"
+    if (params.selection_engine == 'exact') {
+        args += " --time-budget=${params.selection_time_budget ?: 10}"
+        args += params.max_construct_length ? " --max-length=${params.max_construct_length}" : ''
+        args += params.selection_type_max ? " --type-max=${params.selection_type_max}" : ''
+        args += params.selection_type_min ? " --type-min=${params.selection_type_min}" : ''
+    }
+    args += " --ordering=${params.construct_ordering ?: 'score'}"
+    return args
+}
+
 // Combine epitopes from different prediction methods
 process combineEpitopes {
     tag "${protein_type}:combine_epitopes"
@@ -16,7 +45,7 @@ process combineEpitopes {
     val protein_type
     
     output:
-    path "${protein_type}_combined_epitopes.csv", emit: combined_epitopes
+    path "${protein_type}_combined_epitopes.${tableExt()}", emit: combined_epitopes
     
     script:
     """
@@ -25,7 +54,7 @@ process combineEpitopes {
         --tcell-i=${tcell_i_epitopes} \\
         --tcell-ii=${tcell_ii_epitopes} \\
         --protein-type=${protein_type} \\
-        --output=${protein_type}_combined_epitopes.csv
+        --output=${protein_type}_combined_epitopes.${tableExt()}
     """
 }
 
@@ -41,20 +70,18 @@ process designVaccineConstruct {
     output:
     path "${protein_type}_vaccine_construct.fasta", emit: vaccine
     path "${protein_type}_vaccine_report.html", emit: report
+    path "${protein_type}_vaccine_report.json", emit: report_data
     
     script:
     // If multiple files are provided, create a single combined file first
     if (combined_epitopes instanceof List && combined_epitopes.size() > 1) {
         """
         # First, concatenate the epitope files
-        head -n 1 ${combined_epitopes[0]} > combined_epitopes_all.csv
-        for f in ${combined_epitopes.join(" ")}; do
-            tail -n +2 \$f >> combined_epitopes_all.csv
-        done
+        ${concatTables(combined_epitopes, "combined_epitopes_all.${tableExt()}")}
         
         # Now run with the combined file
         python ${workflow.projectDir}/bin/design_vaccine.py \
-            --combined-epitopes=combined_epitopes_all.csv \
+            --combined-epitopes=combined_epitopes_all.${tableExt()} \
             --protein-type=${protein_type} \
             --linker=${params.linker ?: 'GPGPG'} \
             --max-epitopes=${params.max_epitopes ?: 10} \
@@ -62,6 +89,7 @@ process designVaccineConstruct {
             --leading-seq=${params.leading_seq ?: ''} \
             --trailing-seq=${params.trailing_seq ?: ''} \
             --similarity-threshold=${params.similarity_threshold ?: 0.7} \
+            ${selectionArgs()} \
             --output-fasta=${protein_type}_vaccine_construct.fasta \
             --output-report=${protein_type}_vaccine_report.html
         """
@@ -77,8 +105,49 @@ process designVaccineConstruct {
             --leading-seq=${params.leading_seq ?: ''} \
             --trailing-seq=${params.trailing_seq ?: ''} \
             --similarity-threshold=${params.similarity_threshold ?: 0.7} \
+            ${selectionArgs()} \
             --output-fasta=${protein_type}_vaccine_construct.fasta \
             --output-report=${protein_type}_vaccine_report.html
         """
     }
-}
\ No newline at end of file
+}
+
+// Design a grid of constructs (linker x max epitopes x similarity threshold) in one task
+process designVaccineSweep {
+    tag "${protein_type}:design_sweep"
+    publishDir "${params.experiment_output}/vaccine/${protein_type}/sweep", mode: params.publish_dir_mode, overwrite: true
+    
+    input:
+    path combined_epitopes
+    val protein_type
+    
+    output:
+    path "${protein_type}_sweep_constructs.fasta", emit: constructs
+    path "${protein_type}_sweep_report.html", emit: report
+    path "${protein_type}_sweep_comparison.csv", emit: comparison
+    path "${protein_type}_sweep_report.json", emit: report_data
+    
+    script:
+    def epitopeFiles = combined_epitopes instanceof List ? combined_epitopes : [combined_epitopes]
+    """
+    # Concatenate the epitope files (keeping a single header)
+    ${concatTables(epitopeFiles, "sweep_epitopes_all.${tableExt()}")}
+    
+    python ${workflow.projectDir}/bin/design_vaccine.py \
+        --combined-epitopes=sweep_epitopes_all.${tableExt()} \
+        --protein-type=${protein_type} \
+        --linker=${params.linker ?: 'GPGPG'} \
+        --max-epitopes=${params.max_epitopes ?: 10} \
+        --min-epitopes=${params.min_epitopes ?: 1} \
+        --leading-seq=${params.leading_seq ?: ''} \
+        --trailing-seq=${params.trailing_seq ?: ''} \
+        --similarity-threshold=${params.similarity_threshold ?: 0.7} \
+        ${selectionArgs()} \
+        --sweep-linkers=${params.sweep_linkers ?: ''} \
+        --sweep-max-epitopes=${params.sweep_max_epitopes ?: ''} \
+        --sweep-similarity-thresholds=${params.sweep_similarity_thresholds ?: ''} \
+        --sweep-table=${protein_type}_sweep_comparison.csv \
+        --output-fasta=${protein_type}_sweep_constructs.fasta \
+        --output-report=${protein_type}_sweep_report.html
+    """
+}
@@ -25,13 +25,15 @@ process evaluateVaccineConstruct {
         --protein-type=${protein_type} \\
         --linker=${params.linker ?: 'GPGPG'} \\
         --iedb-api-url=${params.iedb_api_url ?: 'http://tools-api.iedb.org/tools_api/'} \\
+        ${params.iedb_cache_dir ? "--cache-dir=${params.iedb_cache_dir}" : ''} \\
+        ${params.iedb_offline ? '--offline' : ''} \\
         --output-evaluation=${protein_type}_vaccine_evaluation.txt \\
         --output-properties=${protein_type}_vaccine_properties.csv \\
         --output-colabfold=${protein_type}_vaccine_for_colabfold.fasta
     """
 }
 
-// Evaluate allergenicity using AllerTop and toxicity using ToxinPred
+// Screen epitopes for allergenicity and toxicity (offline ACC model, or AllerTop/ToxinPred web servers)
 process screenEpitopeAllergenToxic {
     tag "${protein_type}:screen_epitopes"
     publishDir "${params.experiment_output}/evaluation/${protein_type}", mode: params.publish_dir_mode, overwrite: true
@@ -46,11 +48,15 @@ process screenEpitopeAllergenToxic {
     path "${protein_type}_epitope_screening.csv", emit: screening_table
 
     script:
+    def model_arg = params.screening_model ? "--model ${params.screening_model}" : ""
+    def checkpoint_arg = params.screening_checkpoint_dir ? "--checkpoint ${params.screening_checkpoint_dir}/${protein_type}_screening_checkpoint.csv" : ""
     """
     python ${workflow.projectDir}/bin/screen_epitopes.py \\
       --bcell ${bcell_epitopes} \\
       --tcelli ${tcell_i_epitopes} \\
       --tcellii ${tcell_ii_epitopes} \\
+      --engine ${params.screening_engine} ${model_arg} \\
+      --workers ${params.screening_workers} ${checkpoint_arg} \\
       --output ${protein_type}_epitope_screening.csv
     """
 }
@@ -4,6 +4,17 @@
  * Optimized for in silico vaccine design
  */
 
+// Shared IEDB cache options (empty when caching is disabled)
+def iedbCacheArgs() {
+    def cacheArgs = params.iedb_cache_dir ? "--cache-dir=${params.iedb_cache_dir}" : ''
+    return params.iedb_offline ? "${cacheArgs} --offline" : cacheArgs
+}
+
+// Extension of the epitope tables passed between stages ("csv" or "parquet")
+def tableExt() {
+    return params.table_format == 'parquet' ? 'parquet' : 'csv'
+}
+
 // Utility function to safely parse alleles
 def parseAlleles(allelesToParse) {
     def parsedAlleles = []
@@ -35,7 +46,7 @@ process predictBCellEpitopes {
     val protein_type
     
     output:
-    path "${protein_type}_${fasta.baseName}_bcell_epitopes.csv", emit: bcell_epitopes optional true
+    path "${protein_type}_${fasta.baseName}_bcell_epitopes.${tableExt()}", emit: bcell_epitopes optional true
     
     script:
     // Define B-cell prediction parameters with safer defaults for H5N1
@@ -52,7 +63,9 @@ process predictBCellEpitopes {
         --method=${method} \\
         --threshold=${threshold} \\
         --window-size=${window_size} \\
-        --output=${protein_type}_${fasta.baseName}_bcell_epitopes.csv || touch ${protein_type}_${fasta.baseName}_bcell_epitopes.csv
+        ${params.predict_batch ? '--batch' : ''} \\
+        ${iedbCacheArgs()} \\
+        --output=${protein_type}_${fasta.baseName}_bcell_epitopes.${tableExt()} || touch ${protein_type}_${fasta.baseName}_bcell_epitopes.${tableExt()}
     """
 }
 
@@ -66,7 +79,7 @@ process predictTCellEpitopesI {
     val protein_type
     
     output:
-    path "${protein_type}_${fasta.baseName}_tcell_i_epitopes.csv", emit: tcell_i_epitopes
+    path "${protein_type}_${fasta.baseName}_tcell_i_epitopes.${tableExt()}", emit: tcell_i_epitopes
     
     script:
     // Convert alleles to a comma-separated string
@@ -86,7 +99,13 @@ process predictTCellEpitopesI {
         --threshold=${threshold} \\
         --length=${length} \\
         --alleles='${alleleString}' \\
-        --output=${protein_type}_${fasta.baseName}_tcell_i_epitopes.csv
+        --workers=${params.iedb_workers ?: 4} \\
+        --engine=${params.mhci_engine ?: 'iedb'} \\
+        --fallback=${params.mhci_fallback ?: 'none'} \\
+        ${params.mhci_local_lengths ? "--local-lengths=${params.mhci_local_lengths}" : ''} \\
+        ${params.predict_batch ? '--batch' : ''} \\
+        ${iedbCacheArgs()} \\
+        --output=${protein_type}_${fasta.baseName}_tcell_i_epitopes.${tableExt()}
     """
 }
 
@@ -100,7 +119,7 @@ process predictTCellEpitopesII {
     val protein_type
     
     output:
-    path "${protein_type}_${fasta.baseName}_tcell_ii_epitopes.csv", emit: tcell_ii_epitopes
+    path "${protein_type}_${fasta.baseName}_tcell_ii_epitopes.${tableExt()}", emit: tcell_ii_epitopes
     
     script:
     // Convert alleles to a comma-separated string
@@ -120,7 +139,12 @@ process predictTCellEpitopesII {
         --threshold=${threshold} \\
         --length=${length} \\
         --alleles='${alleleString}' \\
-        --output=${protein_type}_${fasta.baseName}_tcell_ii_epitopes.csv
+        --workers=${params.iedb_workers ?: 4} \\
+        --engine=${params.mhcii_engine ?: 'iedb'} \\
+        --fallback=${params.mhcii_fallback ?: 'none'} \\
+        ${params.predict_batch ? '--batch' : ''} \\
+        ${iedbCacheArgs()} \\
+        --output=${protein_type}_${fasta.baseName}_tcell_ii_epitopes.${tableExt()}
     """
 }
 
@@ -136,7 +160,7 @@ process filterEpitopes {
     val protein_type
     
     output:
-    path "${protein_type}_filtered_epitopes.csv", emit: filtered_epitopes
+    path "${protein_type}_filtered_epitopes.${tableExt()}", emit: filtered_epitopes
     
     script:
     """
@@ -145,7 +169,7 @@ process filterEpitopes {
         --tcell-i=${tcell_i_epitopes} \\
         --tcell-ii=${tcell_ii_epitopes} \\
         --protein-type=${protein_type} \\
-        --output=${protein_type}_filtered_epitopes.csv
+        --output=${protein_type}_filtered_epitopes.${tableExt()}
     """
 }
 
@@ -160,7 +184,7 @@ process analyzeConservation {
     val protein_type
     
     output:
-    path "${protein_type}_conserved_epitopes.csv", emit: conserved_epitopes
+    path "${protein_type}_conserved_epitopes.${tableExt()}", emit: conserved_epitopes
     
     script:
     """
@@ -169,6 +193,8 @@ process analyzeConservation {
         --alignment=${alignment} \\
         --protein-type=${protein_type} \\
         --threshold=${params.conservation_threshold ?: 0.9} \\
-        --output=${protein_type}_conserved_epitopes.csv
+        --workers=${task.cpus} \\
+        ${params.alignment_store_dir ? "--store-dir=${params.alignment_store_dir}" : ''} \\
+        --output=${protein_type}_conserved_epitopes.${tableExt()}
     """
 }
\ No newline at end of file
@@ -0,0 +1,117 @@
+import html
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+ALLERTOP_FORM = """<html><body>
+<form method="post" action="/allertop/">
+<textarea id="id_protein" name="protein"></textarea>
+<button type="submit">Submit</button>
+</form>
+</body></html>"""
+
+TOXINPRED_FORM = """<html><body>
+<form method="post" action="/toxinpred/result">
+<textarea name="sequence"></textarea>
+<input type="submit" name="submit" value="Submit">
+</form>
+</body></html>"""
+
+
+class MockScreeningServers:
+    """Canned AllerTOP and ToxinPred pages on localhost.
+
+    Records every submitted peptide per site and the highest number of submissions that were
+    being answered at the same time. Peptides in `failing` get a page without a result.
+    """
+
+    def __init__(self, latency=0.1):
+        self.latency = latency
+        self.failing = set()
+        self.allergens = set()
+        self.toxins = set()
+        self.submitted = {'AllerTOP': [], 'ToxinPred': []}
+        self.peak = {'AllerTOP': 0, 'ToxinPred': 0}
+        self._active = {'AllerTOP': 0, 'ToxinPred': 0}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.allertop_url = f"{self.base_url}/allertop/"
+        self.toxinpred_url = f"{self.base_url}/toxinpred/multi_submit.html"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def answer(self, site, peptide):
+        """Result page for one submission, held open for `latency` seconds"""
+        with self._lock:
+            self.submitted[site].append(peptide)
+            self._active[site] += 1
+            self.peak[site] = max(self.peak[site], self._active[site])
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self._active[site] -= 1
+
+        if peptide in self.failing:
+            return "<html><body><p>Server busy, try again later</p></body></html>"
+        if site == 'AllerTOP':
+            call = "PROBABLE ALLERGEN" if peptide in self.allergens else "PROBABLE NON-ALLERGEN"
+            return f"<html><body><pre>{call}</pre></body></html>"
+        call = "Toxic" if peptide in self.toxins else "Non-Toxic"
+        return (f"<html><body><table><tr><th>Peptide</th><th>Prediction</th></tr>"
+                f"<tr><td>{html.escape(peptide)}</td><td>{call}</td></tr></table></body></html>")
+
+    def _handler(self):
+        servers = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/allertop/'):
+                    self._send(ALLERTOP_FORM)
+                elif self.path.startswith('/toxinpred/'):
+                    self._send(TOXINPRED_FORM)
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                form = parse_qs(self.rfile.read(length).decode('utf-8'))
+                if self.path.startswith('/allertop/'):
+                    self._send(servers.answer('AllerTOP', form.get('protein', [''])[0].strip()))
+                elif self.path.startswith('/toxinpred/'):
+                    self._send(servers.answer('ToxinPred', form.get('sequence', [''])[0].strip()))
+                else:
+                    self.send_error(404)
+
+            def _send(self, body):
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def screening_servers():
+    """Mock AllerTOP and ToxinPred web servers, for screen_epitopes.py --allertop-url/--toxinpred-url"""
+    servers = MockScreeningServers().start()
+    yield servers
+    servers.stop()
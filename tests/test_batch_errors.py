@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin'))
+
+import predict_bcell
+
+
+def test_failed_record_is_skipped_and_the_batch_exits_nonzero(tmp_path, monkeypatch, capsys):
+    fasta = tmp_path / 'batch.fa'
+    fasta.write_text(">first\nKRNDPKRNDPQE\n>broken\nKRNDPKRNDPQE\n>last\nKRNDPKRNDPQE\n")
+    output = tmp_path / 'bcell.csv'
+
+    predict_sequence = predict_bcell.predict_sequence
+
+    def flaky(sequence, args, client):
+        if flaky.calls == 1:
+            flaky.calls += 1
+            raise RuntimeError("server returned garbage")
+        flaky.calls += 1
+        return predict_sequence(sequence, args, client)
+    flaky.calls = 0
+
+    monkeypatch.setattr(predict_bcell, 'predict_sequence', flaky)
+    monkeypatch.setattr(sys, 'argv', ['predict_bcell.py', '--fasta', str(fasta), '--protein-type', 'ha',
+                                      '--batch', '--offline', '--cache-dir', str(tmp_path / 'cache'),
+                                      '--output', str(output)])
+
+    with pytest.raises(SystemExit) as exit_info:
+        predict_bcell.main()
+
+    assert exit_info.value.code == 1
+    assert set(pd.read_csv(output)['sequence_id']) == {'first', 'last'}
+    errors = capsys.readouterr().err
+    assert "Prediction failed for broken" in errors
+    assert "1 of 3 records: broken" in errors
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin'))
+
+from analyze_conservation import column_conservation, column_counts
+
+
+def matrix_of(rows):
+    return np.array([np.frombuffer(row.encode('ascii'), dtype=np.uint8) for row in rows])
+
+
+def test_lowercase_residues_are_counted_as_themselves():
+    rows = ['ACDE-', 'ACDK-', 'AWDKQ', 'GCDKQ']
+
+    upper = column_conservation(column_counts(matrix_of(rows)))
+    lower = column_conservation(column_counts(matrix_of([row.lower() for row in rows])))
+
+    assert upper.tolist() == [0.75, 0.75, 1.0, 0.75, 1.0]
+    assert lower.tolist() == upper.tolist()
+
+
+def test_soft_masked_residue_matches_its_uppercase_form():
+    conservation = column_conservation(column_counts(matrix_of(['K', 'k', 'R', 'K'])))
+    assert conservation.tolist() == [0.75]
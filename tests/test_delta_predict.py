@@ -0,0 +1,49 @@
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin'))
+
+import predict_bcell
+from delta_predict import DeltaReference
+from score_tracks import BCELL_PROPENSITY
+
+
+class OfflineClient:
+    """IEDB client that never answers, so every prediction uses the local B-cell scale"""
+
+    def post(self, url, data, label='', validate=None):
+        return None
+
+
+def mutate(sequence, rng, substitutions=3, insertion='', deletion=0):
+    residues = list(sequence)
+    for position in rng.sample(range(len(residues)), substitutions):
+        residues[position] = rng.choice(sorted(BCELL_PROPENSITY))
+    if insertion:
+        at = rng.randrange(len(residues))
+        residues[at:at] = insertion
+    if deletion:
+        at = rng.randrange(len(residues) - deletion)
+        del residues[at:at + deletion]
+    return ''.join(residues)
+
+
+def test_delta_bcell_matches_full_prediction():
+    rng = random.Random(3)
+    alphabet = sorted(BCELL_PROPENSITY)
+    reference = ''.join(rng.choice(alphabet) for _ in range(600))
+    args = argparse.Namespace(method='Bepipred', window_size=9, threshold=0.6)
+    client = OfflineClient()
+    delta = DeltaReference(reference, predict_bcell.predict_sequence(reference, args, client))
+
+    variants = [
+        mutate(reference, rng),
+        mutate(reference, rng, substitutions=8),
+        mutate(reference, rng, insertion='KFCM'),
+        mutate(reference, rng, deletion=5),
+    ]
+    for variant in variants:
+        full = predict_bcell.predict_sequence(variant, args, client)
+        assert predict_bcell.predict_variant(variant, args, client, delta) == full
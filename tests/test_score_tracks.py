@@ -0,0 +1,39 @@
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin'))
+
+from score_tracks import BCELL_PROPENSITY, propensity_windows, windows_above_threshold
+
+
+def exact_fallback_starts(sequence, window_size, threshold):
+    """Window starts whose halved mean propensity is >= threshold, in exact integer arithmetic"""
+    hundredths = [round(BCELL_PROPENSITY[aa] * 100) for aa in sequence]
+    limit = round(threshold * 100) * 2 * window_size
+    return [i for i in range(len(sequence) - window_size + 1) if sum(hundredths[i:i + window_size]) >= limit]
+
+
+def test_window_exactly_on_threshold_is_kept():
+    rng = random.Random(7)
+    sequence = ''.join(rng.choice(sorted(BCELL_PROPENSITY)) for _ in range(2000))
+    expected = exact_fallback_starts(sequence, 9, 0.6)
+
+    offsets, scores = propensity_windows(sequence, 9, 0.6)
+
+    on_threshold = [i for i, score in zip(offsets.tolist(), scores.tolist()) if score == 0.6]
+    assert on_threshold, "the sequence should contain windows scoring exactly 0.6"
+    assert offsets.tolist() == expected
+
+
+def test_window_sum_does_not_depend_on_position():
+    # The same window scored at the start of a track and after a long prefix
+    window = np.array([0.3, 0.3, 0.3])
+    track = np.concatenate((window, np.full(1000, 0.7), window))
+
+    offsets, means = windows_above_threshold(track, 3, 0.3)
+
+    assert offsets[0] == 0 and offsets[-1] == len(track) - 3
+    assert means[0] == means[-1]
@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin'))
+
+import screen_epitopes
+
+
+def fake_screening(monkeypatch, calls):
+    """Replace the browser and both web servers with recorders that always answer"""
+    monkeypatch.setattr(screen_epitopes.BrowserPool, 'driver', lambda self: None)
+
+    def allertop(epitope, driver, url):
+        calls.append(('AllerTOP', epitope))
+        return "PROBABLE NON-ALLERGEN"
+
+    def toxinpred(epitope, driver, url):
+        calls.append(('ToxinPred', epitope))
+        return "Non-Toxic"
+
+    monkeypatch.setattr(screen_epitopes, 'submit_to_allertop', allertop)
+    monkeypatch.setattr(screen_epitopes, 'submit_to_toxinpred', toxinpred)
+
+
+def test_truncated_checkpoint_row_is_screened_again(tmp_path, monkeypatch):
+    checkpoint = tmp_path / 'checkpoint.csv'
+    # The run crashed while writing the second row: no Toxicity value and no newline
+    checkpoint.write_text(
+        "Epitope,Allergenicity,Toxicity,Allergenicity_Seconds,Toxicity_Seconds\n"
+        "AAAAAAAAA,PROBABLE NON-ALLERGEN,Non-Toxic,1.0,1.0\n"
+        "CCCCCCCCC,PROBABLE ALLERGEN"
+    )
+    calls = []
+    fake_screening(monkeypatch, calls)
+
+    results = screen_epitopes.screen_web(['AAAAAAAAA', 'CCCCCCCCC'], workers=1,
+                                         checkpoint_file=str(checkpoint), delay=0)
+
+    assert calls == [('AllerTOP', 'CCCCCCCCC'), ('ToxinPred', 'CCCCCCCCC')]
+    assert results.set_index('Epitope').loc['CCCCCCCCC', 'Toxicity'] == "Non-Toxic"
+
+    # The retried row starts on its own line, so the next run finds every epitope finished
+    assert set(screen_epitopes.Checkpoint(str(checkpoint)).done) == {'AAAAAAAAA', 'CCCCCCCCC'}
+
+
+def test_error_and_empty_rows_are_not_finished():
+    finished = screen_epitopes.Checkpoint.finished
+    assert finished({"Allergenicity": "PROBABLE ALLERGEN", "Toxicity": "Toxic"})
+    assert not finished({"Allergenicity": "Error", "Toxicity": "Toxic"})
+    assert not finished({"Allergenicity": "PROBABLE ALLERGEN", "Toxicity": ""})
+    assert not finished({"Allergenicity": float('nan'), "Toxicity": float('nan')})
@@ -0,0 +1,152 @@
+import os
+import re
+import sys
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin'))
+
+import screen_epitopes
+
+
+def http_allertop(sequence, driver, url):
+    """submit_to_allertop over plain HTTP: load the form, post it, read the <pre> result"""
+    urlopen(url).read()
+    page = urlopen(url, data=urlencode({'protein': sequence}).encode()).read().decode()
+    match = re.search(r'<pre>(.*?)</pre>', page, re.S)
+    if match is None:
+        # The browser version times out waiting for the result
+        raise TimeoutError("no AllerTOP result")
+    return match.group(1).strip()
+
+
+def http_toxinpred(epitope, driver, url):
+    """submit_to_toxinpred over plain HTTP, with the same row matching"""
+    urlopen(url).read()
+    page = urlopen(url.rsplit('/', 1)[0] + '/result', data=urlencode({'sequence': epitope}).encode()).read().decode()
+    if 'Peptide' not in page:
+        return "Error"
+    for row in re.findall(r'<tr>(.*?)</tr>', page, re.S):
+        text = re.sub(r'<[^>]+>', ' ', row)
+        if epitope in text:
+            return "Non-Toxic" if "non-toxic" in text.lower() else "Toxic"
+    return "Not Found"
+
+
+@pytest.fixture
+def http_screening(monkeypatch):
+    """Run screen_web against the mock servers without a browser"""
+    monkeypatch.setattr(screen_epitopes.BrowserPool, 'driver', lambda self: None)
+    monkeypatch.setattr(screen_epitopes, 'submit_to_allertop', http_allertop)
+    monkeypatch.setattr(screen_epitopes, 'submit_to_toxinpred', http_toxinpred)
+
+
+def screen(servers, epitopes, **options):
+    return screen_epitopes.screen_web(epitopes, allertop_url=servers.allertop_url,
+                                      toxinpred_url=servers.toxinpred_url, delay=0, **options)
+
+
+EPITOPES = ['AAAAAAAAA', 'CCCCCCCCC', 'DDDDDDDDD', 'EEEEEEEEE', 'FFFFFFFFF', 'GGGGGGGGG']
+
+
+def test_per_site_concurrency_is_capped(screening_servers, http_screening):
+    results = screen(screening_servers, EPITOPES, workers=4, allertop_limit=1, toxinpred_limit=2)
+
+    assert screening_servers.peak['AllerTOP'] == 1
+    assert screening_servers.peak['ToxinPred'] <= 2
+    assert sorted(screening_servers.submitted['AllerTOP']) == EPITOPES
+    assert (results['Allergenicity'] == "PROBABLE NON-ALLERGEN").all()
+
+
+def test_workers_share_a_site_up_to_its_limit(screening_servers, http_screening):
+    screen(screening_servers, EPITOPES, workers=4, allertop_limit=4, toxinpred_limit=4)
+
+    assert screening_servers.peak['AllerTOP'] > 1
+
+
+def test_results_follow_the_server_calls(screening_servers, http_screening):
+    screening_servers.allergens.add('CCCCCCCCC')
+    screening_servers.toxins.add('DDDDDDDDD')
+
+    results = screen(screening_servers, EPITOPES[:3], workers=2).set_index('Epitope')
+
+    assert results.loc['CCCCCCCCC', 'Allergenicity'] == "PROBABLE ALLERGEN"
+    assert results.loc['DDDDDDDDD', 'Toxicity'] == "Toxic"
+    assert results.loc['AAAAAAAAA', 'Toxicity'] == "Non-Toxic"
+    assert set(results['Method']) == {"web"}
+
+
+def test_failed_and_truncated_rows_are_screened_again(tmp_path, screening_servers, http_screening):
+    checkpoint = tmp_path / 'checkpoint.csv'
+    screening_servers.failing.add('CCCCCCCCC')
+
+    first = screen(screening_servers, EPITOPES[:3], workers=2, checkpoint_file=str(checkpoint)).set_index('Epitope')
+    assert first.loc['CCCCCCCCC', 'Allergenicity'] == "Error"
+    assert first.loc['CCCCCCCCC', 'Toxicity'] == "Error"
+
+    # Simulate a crash part-way through writing the DDDDDDDDD row
+    lines = checkpoint.read_text().splitlines()
+    kept = [line for line in lines if not line.startswith('DDDDDDDDD')]
+    checkpoint.write_text('\n'.join(kept) + '\nDDDDDDDDD,PROBABLE NON-ALLERGEN')
+
+    screening_servers.failing.clear()
+    for site in screening_servers.submitted:
+        screening_servers.submitted[site].clear()
+
+    second = screen(screening_servers, EPITOPES[:3], workers=2, checkpoint_file=str(checkpoint)).set_index('Epitope')
+
+    assert sorted(screening_servers.submitted['AllerTOP']) == ['CCCCCCCCC', 'DDDDDDDDD']
+    assert sorted(screening_servers.submitted['ToxinPred']) == ['CCCCCCCCC', 'DDDDDDDDD']
+    assert second.loc['CCCCCCCCC', 'Allergenicity'] == "PROBABLE NON-ALLERGEN"
+    assert second.loc['DDDDDDDDD', 'Toxicity'] == "Non-Toxic"
+
+    # Every epitope now has a finished row, so a third run submits nothing
+    for site in screening_servers.submitted:
+        screening_servers.submitted[site].clear()
+    screen(screening_servers, EPITOPES[:3], workers=2, checkpoint_file=str(checkpoint))
+    assert screening_servers.submitted == {'AllerTOP': [], 'ToxinPred': []}
+    assert pd.read_csv(checkpoint)['Epitope'].str.len().eq(9).all()
+
+
+def test_stats_report_latency_and_failures(screening_servers, http_screening, capsys):
+    screening_servers.failing.add('EEEEEEEEE')
+
+    screen(screening_servers, EPITOPES[:5], workers=2)
+
+    output = capsys.readouterr().out
+    allertop = re.search(r"AllerTOP: (\d+) queries, (\d+) failed, latency mean ([\d.]+)s, "
+                         r"median ([\d.]+)s, max ([\d.]+)s", output)
+    toxinpred = re.search(r"ToxinPred: (\d+) queries, (\d+) failed", output)
+    assert allertop and toxinpred
+    assert allertop.group(1, 2) == ('5', '1')
+    assert toxinpred.group(1, 2) == ('5', '1')
+    # Every query is held open for the server latency
+    assert float(allertop.group(4)) >= screening_servers.latency - 0.05
+
+
+@pytest.fixture
+def chrome():
+    """Skip unless Selenium can start headless Chrome here"""
+    pytest.importorskip('selenium')
+    pool = screen_epitopes.BrowserPool({})
+    try:
+        pool.driver()
+    except Exception as e:
+        pytest.skip(f"headless Chrome unavailable: {e}")
+    finally:
+        pool.close()
+
+
+def test_browser_screening_against_mock_servers(tmp_path, screening_servers, chrome):
+    screening_servers.allergens.add('CCCCCCCCC')
+    checkpoint = tmp_path / 'checkpoint.csv'
+
+    results = screen(screening_servers, EPITOPES[:2], workers=2, checkpoint_file=str(checkpoint)).set_index('Epitope')
+
+    assert results.loc['AAAAAAAAA', 'Allergenicity'] == "PROBABLE NON-ALLERGEN"
+    assert results.loc['CCCCCCCCC', 'Allergenicity'] == "PROBABLE ALLERGEN"
+    assert (results['Toxicity'] == "Non-Toxic").all()
+    assert len(pd.read_csv(checkpoint)) == 2